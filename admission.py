@@ -0,0 +1,200 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+# Kontrola przyjmowania zdarzeń Socket.IO, zanim trafią do kolejki pokoju: kubełki żetonów na połączenie
+# (sid) i na pokój, osobno dla każdego typu zdarzenia, oraz odrzucanie powtórzonego żądania, gdy identyczne
+# (to samo zdarzenie z tymi samymi danymi) od tego klienta jeszcze czeka lub się wykonuje - inne akcje, np. ruch
+# po rzucie, przechodzą. Odrzucony klient dostaje 'error' (najwyżej jeden na ERROR_INTERVAL sekund);
+# liczba odrzuceń jest w /metrics (pgame_shed_events_total).
+# Zmienne środowiskowe:
+#   PGAME_RATE_LIMIT   0 wyłącza kontrolę (domyślnie włączona)
+#   PGAME_RATE_LIMITS  zmiana limitów, np. "player_action=10/20,room:player_action=40/80"
+#                      (zdarzeń na sekundę / pojemność kubełka; prefiks room: - limit wspólny dla pokoju)
+
+# Zdarzenie -> (zdarzeń na sekundę, pojemność kubełka); zdarzeń spoza tabel nie ograniczamy
+SID_LIMITS = {
+    'player_action': (5, 10),
+    'field_action': (2, 5),
+    'confrontation_roll': (2, 4),
+    'get_items': (1, 3),
+    'get_games_list': (1, 3),
+    'get_game_state': (1, 3),
+    'set_protocol': (1, 3),
+    'create_game': (0.2, 2),
+    'join_game': (0.5, 3),
+    'resume_game': (0.5, 3),
+    'start_game': (0.5, 2),
+}
+ROOM_LIMITS = {
+    'player_action': (20, 40),
+    'field_action': (10, 20),
+    'confrontation_roll': (10, 20),
+    'get_items': (4, 12),
+    'get_game_state': (4, 12),
+}
+
+ERROR_INTERVAL = 1.0
+ERROR_MESSAGES = {
+    'duplicate': 'To żądanie jest już obsługiwane!',
+}
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def full(self, now):
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+def request_key(sid, event, args):
+    # Identyczne żądania mają ten sam klucz: zdarzenie i skrót danych (np. typ akcji z jej parametrami)
+    try:
+        payload = json.dumps(args, sort_keys=True, default=str)
+    except (TypeError, ValueError):
+        payload = repr(args)
+    return sid, event, hash(payload)
+
+
+def parse_limits(spec):
+    # "player_action=10/20,room:get_items=4/12" -> ({zdarzenie: (tempo, pojemność)}, {...dla pokoju})
+    sid_limits, room_limits = {}, {}
+    for part in filter(None, (part.strip() for part in (spec or '').split(','))):
+        name, _, value = part.partition('=')
+        rate, _, capacity = value.partition('/')
+        limits = sid_limits
+        if name.startswith('room:'):
+            name, limits = name[len('room:'):], room_limits
+        limits[name] = (float(rate), float(capacity or rate))
+    return sid_limits, room_limits
+
+
+class AdmissionControl:
+    def __init__(self, socketio, room_of, enabled=True, sid_limits=SID_LIMITS, room_limits=ROOM_LIMITS):
+        self.socketio = socketio
+        # sid -> kod pokoju (albo None); limity pokoju dotyczą tylko graczy, którzy są już w grze
+        self.room_of = room_of
+        self.enabled = enabled
+        self.sid_limits = sid_limits
+        self.room_limits = room_limits
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.in_flight = set()
+        self.last_error = {}
+        self.shed = Counter()
+        self.prune_at = 1024
+
+    @classmethod
+    def from_env(cls, socketio, room_of):
+        sid_limits, room_limits = parse_limits(os.environ.get('PGAME_RATE_LIMITS'))
+        return cls(
+            socketio, room_of,
+            enabled=os.environ.get('PGAME_RATE_LIMIT', '1') != '0',
+            sid_limits={**SID_LIMITS, **sid_limits},
+            room_limits={**ROOM_LIMITS, **room_limits},
+        )
+
+    def instrument_socketio(self, socketio):
+        # Owija zarejestrowane handlery; wywołać na końcu, żeby odrzucone zdarzenia nie czekały w kolejce pokoju
+        if not self.enabled:
+            return
+        for namespace_handlers in socketio.server.handlers.values():
+            for event, handler in list(namespace_handlers.items()):
+                if event in self.sid_limits or event in self.room_limits:
+                    namespace_handlers[event] = self.admitted(event, handler)
+
+    def admitted(self, event, handler):
+        @functools.wraps(handler)
+        def wrapper(sid, *args):
+            request = request_key(sid, event, args)
+            reason = self.admit(sid, event, request)
+            if reason:
+                self.reject(sid, event, reason)
+                return None
+            try:
+                return handler(sid, *args)
+            finally:
+                with self.lock:
+                    self.in_flight.discard(request)
+        return wrapper
+
+    def admit(self, sid, event, request=None):
+        # None, gdy zdarzenie przyjęte; inaczej powód odrzucenia. request - klucz żądania (request_key)
+        now = time.monotonic()
+        request = request or request_key(sid, event, ())
+        code = self.room_of(sid) if event in self.room_limits else None
+        with self.lock:
+            if request in self.in_flight:
+                return 'duplicate'
+            if event in self.sid_limits and not self.bucket(sid, event, self.sid_limits, now).take(now):
+                return 'sid'
+            if code and not self.bucket(('room', code), event, self.room_limits, now).take(now):
+                return 'room'
+            self.in_flight.add(request)
+            if len(self.buckets) > self.prune_at:
+                self.prune(now)
+        return None
+
+    def bucket(self, scope, event, limits, now):
+        key = (scope, event)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            rate, capacity = limits[event]
+            bucket = self.buckets[key] = TokenBucket(rate, capacity, now)
+        return bucket
+
+    def prune(self, now):
+        # Pełny kubełek niczym nie różni się od nowego - usuwamy je, żeby słownik nie rósł bez końca
+        self.buckets = {key: bucket for key, bucket in self.buckets.items() if not bucket.full(now)}
+        self.last_error = {sid: at for sid, at in self.last_error.items() if now - at < ERROR_INTERVAL}
+        self.prune_at = max(1024, 2 * len(self.buckets))
+
+    def reject(self, sid, event, reason):
+        now = time.monotonic()
+        with self.lock:
+            self.shed[(event, reason)] += 1
+            last = self.last_error.get(sid)
+            if last is not None and now - last < ERROR_INTERVAL:
+                return
+            self.last_error[sid] = now
+        message = ERROR_MESSAGES.get(reason, 'Zbyt wiele żądań - zwolnij!')
+        self.socketio.emit('error', {'message': message, 'event': event, 'reason': reason}, to=sid)
+
+    def forget(self, sid):
+        with self.lock:
+            for event in self.sid_limits:
+                self.buckets.pop((sid, event), None)
+            self.last_error.pop(sid, None)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'enabled': self.enabled,
+                'buckets': len(self.buckets),
+                'in_flight': len(self.in_flight),
+                'shed': {f'{event}/{reason}': count for (event, reason), count in sorted(self.shed.items())},
+            }
+
+    def prometheus(self):
+        with self.lock:
+            lines = ['# TYPE pgame_shed_events_total counter']
+            lines.extend(f'pgame_shed_events_total{{event="{event}",reason="{reason}"}} {count}'
+                         for (event, reason), count in sorted(self.shed.items()))
+        return '\n'.join(lines) + '\n'
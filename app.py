@@ -1,54 +1,208 @@
-from flask import Flask, render_template, session, request
+from flask import Flask, Response, abort, render_template, session, request
 from flask_socketio import SocketIO, emit, join_room, leave_room
-from game_logic import GameEngine, Player, Field, FieldAction
+from itsdangerous import BadSignature, URLSafeSerializer
+from game_logic import GameEngine, RulesFile, current_rules, rules_for_payload
+from game_room import GameRoom
+from storage import StaleRoomError, create_store
+from admission import AdmissionControl
+from batching import OutboundBatcher
+from room_queue import RoomQueues, serialized_by_room
+from sharding import CodeAllocator
+from lobby import LobbyIndex, LOBBY_ROOM
+from lifecycle import RoomLifecycle
+from log_setup import configure_logging, log_context
+from metrics import Metrics
+from timer_wheel import TimerWheel
+from wire import encode_game_update, protocol_available, protocol_room
+import os
 import random
-import string
 import logging
+import secrets
+import time
 
 
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+configure_logging()
+logger = logging.getLogger('pgame.app')
 
 app = Flask(__name__)
-app.config['SECRET_KEY'] = 'tajny_klucz_sejmowy_123'
-socketio = SocketIO(app, cors_allowed_origins="*", logger=True, engineio_logger=True)
-
-active_games = {}
-players = {}
-
-class GameRoom:  
-    def __init__(self, code, host_name):  
-        self.code = code  
-        self.players = []  
-        self.game_engine = GameEngine()  
-        self.status = "lobby"  
-        self.host_name = host_name  
-        self.host_id = None  
-        self.current_player_index = 0  
-
-    @property  
-    def current_player(self):  
-        if self.players:  
-            return self.players[self.current_player_index % len(self.players)]  
-        return None  
-
-    def next_turn(self):  
-        if self.players:  
-            self.current_player_index = (self.current_player_index + 1) % len(self.players)  
-        # Nie ustawiamy current_player bezpośrednio, używamy property  
-
-    def add_player(self, player_id, name, avatar):  
-        player = Player(player_id, name, avatar)  
-        self.game_engine.add_player(player)  
-        self.players.append(player_id)  
-
-        if name == self.host_name and not self.host_id:  
-            self.host_id = player_id  
-
-        return player
-    
+# Klucz podpisu sesji i tokenów powrotu (PGAME_SECRET_KEY). Bez niego każdy proces losuje własny klucz:
+# tokeny nie przetrwają restartu i nie działają między workerami, ale nikt nie może ich podrobić
+app.config['SECRET_KEY'] = os.environ.get('PGAME_SECRET_KEY')
+if not app.config['SECRET_KEY']:
+    app.config['SECRET_KEY'] = secrets.token_hex(32)
+    logger.warning("Brak PGAME_SECRET_KEY - losowy klucz tego procesu, tokeny powrotu nie przetrwają restartu")
+# Podpisane tokeny sesji gracza pozwalają wrócić do gry po zerwaniu połączenia
+session_tokens = URLSafeSerializer(app.config['SECRET_KEY'], salt='pgame-reconnect')
+RECONNECT_GRACE = float(os.environ.get('PGAME_RECONNECT_GRACE', 60))
+# Czas na rzuty w konfrontacji; po nim brakujące rzuty wykonuje serwer
+CONFRONTATION_TIMEOUT = float(os.environ.get('PGAME_CONFRONTATION_TIMEOUT', 15))
+# Czas na turę; po nim serwer kończy turę za gracza (0 - bez limitu). Pokój może ustawić własne limity
+TURN_TIMEOUT = float(os.environ.get('PGAME_TURN_TIMEOUT', 120))
+# Po tylu turach z rzędu zakończonych przez upływ czasu gra jest zamykana jako porzucona (0 - bez limitu)
+MAX_TURN_TIMEOUTS = int(os.environ.get('PGAME_MAX_TURN_TIMEOUTS', 10))
+MAX_ROOM_TIMEOUT = 3600
+# Kolejka wiadomości (np. redis://) pozwala rozsyłać zdarzenia do klientów podłączonych do innych workerów
+MESSAGE_QUEUE = os.environ.get('PGAME_MESSAGE_QUEUE')
+socketio = SocketIO(app, cors_allowed_origins="*",
+                    logger=logging.getLogger('socketio'), engineio_logger=logging.getLogger('engineio'),
+                    message_queue=MESSAGE_QUEUE)
+
+# Pomiary handlerów i silnika gry; handlery Socket.IO są owijane na końcu modułu
+metrics = Metrics.from_env()
+metrics.instrument_class(GameEngine)
+
+# Plansza i katalog przedmiotów są wspólne dla wszystkich pokoi; PGAME_RULES wskazuje plik zasad,
+# który jest przeładowywany bez restartu (nowe pokoje dostają nową wersję)
+rules_file = RulesFile.from_env()
+
+def room_rules():
+    return rules_file.current() if rules_file else current_rules()
+
+# Pokoje i przypisania sid -> kod gry; backend wybiera zmienna PGAME_STORE (domyślnie pamięć procesu)
+store = create_store()
+
+def find_player(player_id):
+    # Zwraca (kod gry, pokój, gracz) dla połączenia; brakujące elementy jako None
+    game_code = store.get_player(player_id)
+    room = store.get_room(game_code) if game_code else None
+    player = room.game_engine.players.get(player_id) if room else None
+    return game_code, room, player
+
+# Zdarzenia jednego pokoju wykonują się po kolei, różne pokoje - równolegle
+room_queues = RoomQueues()
+
+def player_room_code(*args):
+    return store.get_player(request.sid)
+
+def requested_room_code(data=None, *args):
+    try:
+        return data['game_code'].upper().strip()
+    except (KeyError, TypeError, AttributeError):
+        return None
+
+def session_token(room, player_id):
+    return session_tokens.dumps({'g': room.code, 'k': room.session_keys[player_id]})
+
+def read_session_token(token):
+    # Zwraca (kod gry, klucz sesji); (None, None) dla tokenu podrobionego lub uszkodzonego
+    try:
+        data = session_tokens.loads(token)
+        return data['g'], data['k']
+    except (BadSignature, TypeError, KeyError):
+        return None, None
+
+def resume_room_code(data=None, *args):
+    try:
+        return read_session_token(data['token'])[0]
+    except (KeyError, TypeError):
+        return None
+
+serialized_by_player_room = serialized_by_room(room_queues, player_room_code)
+
+# Format game_update wybrany przez klienta (set_protocol): sid -> 'msgpack'; bez wpisu JSON
+client_protocols = {}
+
+# Wiadomości z jednego zdarzenia pokoju wychodzą do klienta w jednej kopercie 'batch' (batching.py)
+outbound = OutboundBatcher(enabled=not MESSAGE_QUEUE)
+
+# Limity zdarzeń na połączenie i na pokój (admission.py); handlery są owijane na końcu modułu
+admission = AdmissionControl.from_env(socketio, store.get_player)
+
+def join_game_room(game_code):
+    join_room(game_code)
+    join_room(protocol_room(game_code, client_protocols.get(request.sid, 'json')))
+
+def broadcast_game_update(room, update, skip_sid=None):
+    # Ten sam stan w dwóch formatach: JSON dla starszych klientów, MessagePack dla tych, które o niego poprosiły
+    socketio.emit('game_update', update, to=protocol_room(room.code, 'json'), skip_sid=skip_sid)
+    # Bez kolejki wiadomości wszyscy klienci są w tym procesie - kodujemy tylko, gdy ktoś wybrał MessagePack
+    if protocol_available('msgpack') and (client_protocols or MESSAGE_QUEUE):
+        socketio.emit('game_update', encode_game_update(room, update), to=protocol_room(room.code, 'msgpack'),
+                      skip_sid=skip_sid)
+
+# Wszystkie terminy (tury, konfrontacje, powroty rozłączonych) obsługuje jedno koło czasowe procesu
+timers = TimerWheel(socketio=socketio)
+# kod gry -> ((numer tury, gracz), timer) - termin bieżącej tury w każdym pokoju
+turn_timers = {}
+
+def room_timeout(value):
+    # Limit pokoju z create_game: liczba sekund 0..MAX_ROOM_TIMEOUT; None (brak, błędna wartość) - domyślny serwera
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return min(max(value, 0), MAX_ROOM_TIMEOUT) if value == value else None
+
+def turn_timeout(room):
+    return TURN_TIMEOUT if room.turn_timeout is None else room.turn_timeout
+
+def confrontation_timeout(room):
+    # Konfrontacja zawsze ma termin - 0 oznacza domyślny serwera
+    return room.confrontation_timeout or CONFRONTATION_TIMEOUT
+
+def watch_turn(room):
+    # Po każdym zapisie: nowa tura dostaje nowy termin, stary anulujemy (oba w O(1))
+    key = (room.turn_number, room.current_player) if room.status == 'in_progress' else None
+    watched = turn_timers.get(room.code)
+    if watched and watched[0] == key:
+        return
+    if watched:
+        watched[1].cancel()
+        del turn_timers[room.code]
+    timeout = turn_timeout(room)
+    if key and timeout > 0:
+        turn_timers[room.code] = (key, timers.schedule(timeout, expire_turn, room.code, key))
+
+def expire_turn(game_code, key):
+    # Ta sama ścieżka co akcja 'end_turn' gracza, w kolejce pokoju
+    with room_queues.serialized(game_code), outbound.batch():
+        watched = turn_timers.get(game_code)
+        if watched and watched[0] == key:
+            del turn_timers[game_code]
+        room = store.get_room(game_code)
+        if not room or room.status != 'in_progress' or (room.turn_number, room.current_player) != key:
+            return
+        if room.game_engine.confrontation:
+            # Konfrontację rozstrzyga jej własny termin; tura dostaje nowy czas po niej
+            turn_timers[game_code] = (key, timers.schedule(turn_timeout(room), expire_turn, game_code, key))
+            return
+        room.timed_out_turns += 1
+        if MAX_TURN_TIMEOUTS and room.timed_out_turns >= MAX_TURN_TIMEOUTS:
+            # Nikt już nie gra - zamykamy grę zamiast przekazywać tury bez końca
+            lifecycle.evict(room, 'abandoned')
+            return
+        logger.info("Koniec czasu na turę", extra=log_context('expire_turn', game_code))
+        end_turn(room, 'timeout', touch=False)
+
+def end_turn(room, reason=None, touch=True):
+    room.next_turn()
+    save_room(room, touch)
+    ended = {'next_player': room.current_player}
+    if reason:
+        ended['reason'] = reason
+    socketio.emit('turn_ended', ended, to=room.code)
+
+# Lista gier w lobby: utrzymywany indeks zamiast przeglądania wszystkich pokoi przy każdej zmianie
+lobby_index = LobbyIndex(socketio)
+lobby_index.load(store.iter_rooms())
+
+# Ostatnia aktywność pokoi, usuwanie pustych i porzuconych gier, limit liczby pokoi
+lifecycle = RoomLifecycle.from_env(store, room_queues, socketio, lobby_index)
+lifecycle.load(store.iter_rooms())
+
+def save_room(room, touch=True):
+    # touch=False - zapis z terminu (koło czasowe), nie akcja gracza: nie liczy się jako aktywność pokoju
+    if touch:
+        room.timed_out_turns = 0
+    lifecycle.touch(room, touch)
+    try:
+        store.save_room(room)
+    except StaleRoomError:
+        # Pokój zmienił w międzyczasie inny worker - zdarzenie jest odrzucane, nic nie zostaje nadpisane
+        logger.warning("Konflikt zapisu pokoju", extra=log_context('save_room', room.code))
+        raise
+    watch_turn(room)
+
 @app.route('/')
 def lobby():
     return render_template('lobby.html')
@@ -57,73 +211,116 @@ def lobby():
 def game(game_code):
     return render_template('game.html', game_code=game_code)
 
-def generate_game_code(length=6):
-    return ''.join(random.choices(string.ascii_uppercase, k=length))
+def static_response(payload):
+    # Adres z ?v=<etag> wskazuje konkretną wersję, więc przeglądarka może trzymać ją długo;
+    # bez wersji klient sprawdza aktualność przez If-None-Match
+    response = Response(payload.body, mimetype='application/json')
+    response.set_etag(payload.etag)
+    response.cache_control.public = True
+    if request.args.get('v') == payload.etag:
+        response.cache_control.max_age = 365 * 24 * 3600
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route('/api/board')
+def board_data():
+    # Trwające gry mogą mieć starszą wersję zasad - wybieramy ją po hashu
+    rules = rules_for_payload('board_static', request.args.get('v')) or room_rules()
+    return static_response(rules.board_static)
+
+@app.route('/api/items')
+def items_data():
+    rules = rules_for_payload('items_static', request.args.get('v')) or room_rules()
+    return static_response(rules.items_static)
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.prometheus() + lifecycle.prometheus() + admission.prometheus() + timers.prometheus(),
+                    mimetype='text/plain; version=0.0.4')
+
+@app.route('/debug/metrics')
+def debug_metrics():
+    # Strona diagnostyczna tylko z maszyny lokalnej
+    if request.remote_addr not in ('127.0.0.1', '::1'):
+        abort(404)
+    return render_template('metrics.html', metrics=metrics.summary(), rooms=lifecycle.stats(),
+                           admission=admission.stats(), timers=timers.stats())
+
+# Kody gier i ziarna losowości pokoi; PGAME_SEED czyni je powtarzalnymi (testy wydajności, odtwarzanie)
+room_seeds = random.Random(int(os.environ['PGAME_SEED'])) if os.environ.get('PGAME_SEED') else random.SystemRandom()
+
+# Kody są niepowtarzalne i wskazują shard tego procesu (PGAME_SHARD/PGAME_SHARDS, router.py)
+game_codes = CodeAllocator.from_env(room_seeds, store.has_room)
 
 @socketio.on('connect')
 def handle_connect():
-    print(f"Client connected: {request.sid}")
+    lifecycle.start()
+    logger.debug("Połączono klienta %s", request.sid, extra=log_context('connect'))
+
+@socketio.on('set_protocol')
+def handle_set_protocol(data=None):
+    # Wywoływane przed join_game/resume_game; odpowiedź (ack) to format i koperty, których serwer będzie używał
+    data = data or {}
+    protocol = data.get('protocol', 'json')
+    if not protocol_available(protocol):
+        protocol = 'json'
+    if protocol == 'json':
+        client_protocols.pop(request.sid, None)
+    else:
+        client_protocols[request.sid] = protocol
+    return {'protocol': protocol, 'batch': outbound.accept(request.sid, data.get('batch'))}
 
 @socketio.on('get_games_list')
 def handle_get_games_list():
-    games_list = [
-        {
-            'code': game.code,
-            'players': len(game.players)
-        }
-        for game in active_games.values()
-        if game.status == 'lobby'
-    ]
-    print(f"Sending games list: {games_list}")
-    emit('games_list', games_list)
-
-def broadcast_games_list():
-    games_list = [
-        {
-            'code': game.code,
-            'players': len(game.players)
-        }
-        for game in active_games.values()
-        if game.status == 'lobby'
-    ]
-    print(f"Broadcasting games list: {games_list}")
-    socketio.emit('games_list', games_list)
+    # Pełna lista raz, potem klient w pokoju 'lobby' dostaje już tylko zmiany
+    join_room(LOBBY_ROOM)
+    emit('games_list', lobby_index.snapshot())
 
 @socketio.on('create_game')
+@outbound.batched
 def handle_create_game(data):
     try:
-        game_code = generate_game_code()
+        if not lifecycle.ensure_capacity():
+            emit('error', {'message': 'Serwer jest pełny, spróbuj później!'})
+            return
         host_name = data['name'].strip()
         host_avatar = data['avatar']
-        room = GameRoom(game_code, host_name)
-        active_games[game_code] = room
-
-        player_id = request.sid
-        player = room.add_player(player_id, host_name, host_avatar)
-        players[player_id] = (game_code, player)
-
-        join_room(game_code)
+        game_code = game_codes.allocate()
+        try:
+            room = GameRoom(game_code, host_name, room_rules(), seed=room_seeds.getrandbits(64),
+                            turn_timeout=room_timeout(data.get('turn_timeout')),
+                            confrontation_timeout=room_timeout(data.get('confrontation_timeout')))
+            player_id = request.sid
+            room.add_player(player_id, host_name, host_avatar)
+            save_room(room)
+        finally:
+            # Zapisany pokój sam zajmuje swój kod
+            game_codes.release(game_code)
+        store.set_player(player_id, game_code)
+
+        leave_room(LOBBY_ROOM)
+        join_game_room(game_code)
         session['game_code'] = game_code
 
+        emit('session_token', {'game_code': game_code, 'token': session_token(room, player_id)})
         emit('game_created', {'game_code': game_code})
 
         emit('room_state', {
-            'status': room.status,
-            'players': [{
-                **player.serialize(),
-                'is_host': True
-            }],
-            'board': [field.serialize() for field in room.game_engine.board],
-            'game_code': game_code
+            **room.full_state(),
+            'is_host': True
         }, room=player_id)
 
-        logging.info(f"Gra utworzona: {game_code} przez {host_name}")
-        broadcast_games_list()
+        logger.info("Gra utworzona przez %s", host_name, extra=log_context('create_game', game_code))
+        lobby_index.update(room)
     except Exception as e:
-        logging.error(f"Błąd tworzenia gry: {str(e)}")
+        logger.exception("Błąd tworzenia gry: %s", e, extra=log_context('create_game'))
         emit('error', {'message': 'Błąd tworzenia gry!'})
 
 @socketio.on('join_game')
+@serialized_by_room(room_queues, requested_room_code)
+@outbound.batched
 def handle_join_game(data):
     try:
         game_code = data['game_code'].upper().strip()
@@ -137,54 +334,39 @@ def handle_join_game(data):
             emit('error', {'message': 'Podaj swoją nazwę!'})
             return
 
-        if game_code not in active_games:
+        room = store.get_room(game_code)
+        if not room and not game_codes.owns(game_code):
+            # Połączenie trafiło do innego procesu niż właściciel gry - klient powinien wejść przez /game/<kod>
+            emit('error', {'message': 'Gra działa na innym serwerze!', 'game_code': game_code})
+            return
+        if not room:
             emit('error', {'message': 'Nieprawidłowy kod gry!'})
             return
 
-        room = active_games[game_code]
         player_id = request.sid
 
-        existing_player = next(
-            (p for p in room.game_engine.players.values() if p.name == name), 
-            None
-        )
-
-        if existing_player:
-            old_id = existing_player.id
-            existing_player.id = player_id
-
-            if existing_player.name == room.host_name:
-                room.host_id = player_id
+        # Powrót do gry odbywa się przez resume_game z tokenem sesji, nie po nazwie
+        if any(p.name == name for p in room.game_engine.players.values()):
+            emit('error', {'message': 'Gracz o tej nazwie już jest w grze!'})
+            return
+        if len(room.players) >= 6:
+            emit('error', {'message': 'Gra jest pełna!'})
+            return
+        room.add_player(player_id, name, avatar)
 
-            if old_id in room.players:
-                room.players.remove(old_id)
-            room.players.append(player_id)
+        save_room(room)
+        store.set_player(player_id, game_code)
 
-            if old_id in players:
-                del players[old_id]
-            players[player_id] = (game_code, existing_player)
-            player = existing_player
-        else:
-            if len(room.players) >= 6:
-                emit('error', {'message': 'Gra jest pełna!'})
-                return
-            player = room.add_player(player_id, name, avatar)
-            players[player_id] = (game_code, player)
-
-        join_room(game_code)
+        leave_room(LOBBY_ROOM)
+        join_game_room(game_code)
         session['game_code'] = game_code
 
         is_host = (name == room.host_name)
 
+        emit('session_token', {'game_code': game_code, 'token': session_token(room, player_id)})
         emit('room_state', {
-            'status': room.status,
-            'players': [{
-                **p.serialize(),
-                'is_host': (p.name == room.host_name)
-            } for p in room.game_engine.players.values()],
-            'board': [field.serialize() for field in room.game_engine.board],
-            'is_host': is_host,
-            'game_code': game_code
+            **room.full_state(),
+            'is_host': is_host
         }, room=player_id)
 
         emit('players_update', {
@@ -197,57 +379,103 @@ def handle_join_game(data):
         }, room=game_code)
 
         emit('game_joined', {'game_code': game_code})
-        socketio.start_background_task(broadcast_games_list)
+        lobby_index.update(room)
+
+    except Exception as e:
+        logger.exception("Błąd dołączania: %s", e, extra=log_context('join_game'))
+        emit('error', {'message': 'Błąd systemowy!'})
+
+@socketio.on('resume_game')
+@serialized_by_room(room_queues, resume_room_code)
+@outbound.batched
+def handle_resume_game(data):
+    try:
+        game_code, key = read_session_token(data.get('token'))
+        room = store.get_room(game_code) if game_code else None
+        old_id = room.player_for_session(key) if room else None
+        if not old_id:
+            emit('resume_failed', {'message': 'Sesja wygasła, dołącz do gry ponownie.'})
+            return
+
+        player_id = request.sid
+        if old_id != player_id:
+            room.rebind_player(old_id, player_id)
+            store.delete_player(old_id)
+        update = room.game_update()
+        save_room(room)
+        store.set_player(player_id, game_code)
+
+        leave_room(LOBBY_ROOM)
+        join_game_room(game_code)
+        session['game_code'] = game_code
+
+        # Klient dostaje tylko zmiany od ostatniej znanej mu wersji; bez tej historii - pełny stan
+        player = room.game_engine.players[player_id]
+        resumed = {'is_host': player.name == room.host_name}
+        delta = room.delta_since(data.get('version'))
+        if delta is None:
+            resumed.update(room.full_state(), full=True)
+        else:
+            changed, removed = delta
+            resumed.update(
+                full=False,
+                status=room.status,
+                version=room.state_version,
+                players=changed,
+                removed=removed,
+                current_player=room.current_player,
+                seats=room.seat_map(),
+                game_code=game_code
+            )
+        emit('game_resumed', resumed)
+        broadcast_game_update(room, update, skip_sid=player_id)
+        lobby_index.update(room)
 
     except Exception as e:
-        logging.error(f"Błąd dołączania: {str(e)}")
+        logger.exception("Błąd wznawiania gry: %s", e, extra=log_context('resume_game'))
         emit('error', {'message': 'Błąd systemowy!'})
 
 @socketio.on('start_game')
+@serialized_by_player_room
+@outbound.batched
 def handle_start_game():
     try:
         player_id = request.sid
-        if player_id not in players:
+        game_code, room, player = find_player(player_id)
+        if not player:
             emit('error', {'message': 'Nie jesteś w grze!'})
             return
 
-        game_code, player = players[player_id]
-        room = active_games.get(game_code)
-
         if not room or player.name != room.host_name:
             emit('error', {'message': 'Tylko host może rozpocząć grę!'})
             return
 
-        room.status = "in_progress"
-        room.game_engine.initialize_game()
+        if room.status != 'lobby':
+            # Ponowny start zresetowałby rzut, kolejkę tur i konfrontację trwającej gry
+            emit('error', {'message': 'Gra już się rozpoczęła!'})
+            return
 
-        emit('game_started', {
-            'status': 'in_progress',
-            'board': [field.serialize() for field in room.game_engine.board],
-            'players': [{
-                **p.serialize(),
-                'is_host': (p.name == room.host_name)
-            } for p in room.game_engine.players.values()],
-            'current_player': room.current_player
-        }, room=game_code)
+        room.start_game()
+        save_room(room)
+
+        # Planszę klienci pobierają przez /api/board, więc wysyłamy tylko jej hash
+        emit('game_started', room.full_state(), room=game_code)
 
-        broadcast_games_list()
+        lobby_index.update(room)
 
     except Exception as e:
-        logging.error(f"Błąd startu gry: {str(e)}")
+        logger.exception("Błąd startu gry: %s", e, extra=log_context('start_game'))
         emit('error', {'message': 'Błąd inicjalizacji gry!'})
 
 @socketio.on('get_items')
 def handle_get_items():
     try:
         player_id = request.sid
-        if player_id not in players:
+        game_code, room, player = find_player(player_id)
+        if not player:
             emit('error', {'message': 'Nie znaleziono gracza!'})
             return
 
-        game_code, player = players[player_id]
-        room = active_games.get(game_code)
-
         if not room:
             emit('error', {'message': 'Nie znaleziono gry!'})
             return
@@ -256,20 +484,20 @@ def handle_get_items():
         emit('item_list', {'items': items})
 
     except Exception as e:
-        logging.error(f"Błąd pobierania przedmiotów: {str(e)}")
+        logger.exception("Błąd pobierania przedmiotów: %s", e, extra=log_context('get_items'))
         emit('error', {'message': 'Błąd podczas pobierania listy przedmiotów!'})
         
 @socketio.on('player_action')
+@serialized_by_player_room
+@outbound.batched
 def handle_player_action(data):
     try:
         player_id = request.sid
-        if player_id not in players:
+        game_code, room, player = find_player(player_id)
+        if not player:
             emit('error', {'message': 'Nie znaleziono gracza!'})
             return
 
-        game_code, player = players[player_id]
-        room = active_games.get(game_code)
-
         if not room or room.status != "in_progress":
             emit('error', {'message': 'Gra nie jest aktywna!'})
             return
@@ -279,99 +507,121 @@ def handle_player_action(data):
             return
 
         action_type = data.get('type')
-        logging.info(f"Otrzymano akcję: {action_type}")
+        logger.debug("Otrzymano akcję: %s", action_type, extra=log_context('player_action', game_code))
 
-        if action_type == 'roll_dice':
-            steps = random.randint(1, 6)
-            board_size = len(room.game_engine.board)
-            current_position = player.position
+        if room.game_engine.confrontation and action_type != 'get_items':
+            emit('error', {'message': 'Trwa konfrontacja!'})
+            return
 
-            forward_position = (current_position + steps) % board_size
-            backward_position = (current_position - steps) % board_size
+        if action_type == 'roll_dice':
+            # Rzut zostaje na serwerze do czasu ruchu; ponowna prośba zwraca ten sam wynik
+            repeated = room.game_engine.pending_roll is not None
+            roll = room.roll_dice(player_id)
+            if roll is None:
+                emit('error', {'message': 'Już rzucałeś kością w tej turze!'})
+                return
+            steps, positions = roll
+            save_room(room)
 
             emit('choose_move', {
                 'steps': steps,
-                'possible_positions': [forward_position, backward_position]
+                'possible_positions': list(positions)
             }, room=player_id)
 
-            emit('player_rolled', {
-                'player_name': player.name,
-                'steps': steps
-            }, room=game_code, include_self=False)
+            if not repeated:
+                emit('player_rolled', {
+                    'player_name': player.name,
+                    'steps': steps
+                }, room=game_code, include_self=False)
 
         elif action_type == 'move':
             new_position = data.get('new_position')
 
-            if new_position is None or not isinstance(new_position, int):
+            if type(new_position) is not int:
                 emit('error', {'message': 'Nieprawidłowe dane ruchu!'})
                 return
 
-            player.position = new_position
-            effect = room.game_engine.handle_field_effect(player)
+            if room.game_engine.pending_roll is None:
+                emit('error', {'message': 'Najpierw rzuć kością!'})
+                return
+
+            moved, effect = room.move_player(player_id, new_position)
+            if not moved:
+                # Przypominamy dozwolone pola, żeby klient mógł poprawić wybór
+                steps = room.game_engine.pending_roll
+                emit('error', {'message': 'Na to pole nie możesz się ruszyć!'})
+                emit('choose_move', {
+                    'steps': steps,
+                    'possible_positions': list(room.game_engine.reachable[player.position][steps])
+                }, room=player_id)
+                return
 
             players_on_field = [p for p in room.game_engine.players.values() if p.position == new_position and p.id != player_id]
 
-            emit('game_update', {
-                'players': [{
-                    **p.serialize(),
-                    'is_host': (p.name == room.host_name)
-                } for p in room.game_engine.players.values()],
-                'effect': f"Ruszyłeś się na pole {new_position + 1}. {effect}",
-                'current_player': room.current_player,
-                'board': [field.serialize() for field in room.game_engine.board],
-                'just_moved': True,
-                'can_perform_action': True
-            }, room=game_code)
+            update = room.game_update(
+                effect=f"Ruszyłeś się na pole {new_position + 1}. {effect}",
+                just_moved=True,
+                can_perform_action=True
+            )
+            save_room(room)
+            broadcast_game_update(room, update)
 
             if players_on_field:
                 emit('confrontation_available', {
                     'players': [p.name for p in players_on_field]
                 }, room=player_id)
 
-            field = room.game_engine.board[new_position]
-            emit('field_actions', {
-                'fieldType': field.type,
-                'actions': [action.serialize() for action in field.actions]
-            }, room=player_id)
+            if client_protocols.get(player_id) == 'msgpack':
+                # Klient ma planszę z /api/board - wystarczy numer pola
+                emit('field_actions', {'position': new_position}, room=player_id)
+            else:
+                field = room.game_engine.board_payload[new_position]
+                emit('field_actions', {
+                    'fieldType': field['type'],
+                    'actions': field['actions']
+                }, room=player_id)
 
         elif action_type == 'field_action':
             field_action_type = data.get('action_type')
-            logging.info(f"Akcja pola: {field_action_type}")
+            logger.debug("Akcja pola: %s", field_action_type, extra=log_context('player_action', game_code))
 
             if field_action_type == 'buy_item':
                 item_name = data.get('item_name')
                 if not item_name:
                     emit('error', {'message': 'Nie wybrano przedmiotu!'})
                     return
-                response = room.game_engine.buy_item(player_id, item_name)
+                response = room.buy_item(player_id, item_name)
             else:
-                response = room.game_engine.handle_field_action(player, field_action_type)
-
-            emit('game_update', {
-                'players': [{
-                    **p.serialize(),
-                    'is_host': (p.name == room.host_name)
-                } for p in room.game_engine.players.values()],
-                'effect': response,
-                'current_player': room.current_player,
-                'board': [field.serialize() for field in room.game_engine.board],
-                'just_moved': False,
-                'can_perform_action': False
-            }, room=game_code)
+                response = room.field_action(player_id, field_action_type)
 
+            update = room.game_update(
+                effect=response,
+                just_moved=False,
+                can_perform_action=False
+            )
             room.next_turn()
+            save_room(room)
+
+            broadcast_game_update(room, update)
             emit('turn_ended', {'next_player': room.current_player}, room=game_code)
 
         elif action_type == 'start_confrontation':
-            players_on_field = [p for p in room.game_engine.players.values() if p.position == player.position]
-            for p in players_on_field:
-                emit('start_confrontation', {
-                    'players': [{'id': pl.id, 'name': pl.name} for pl in players_on_field]
-                }, room=p.id)
+            # Serwer trzyma konfrontację do kompletu rzutów albo do upływu czasu konfrontacji pokoju
+            timeout = confrontation_timeout(room)
+            deadline = time.time() + timeout
+            participants = room.start_confrontation(player_id, deadline)
+            if not participants:
+                emit('error', {'message': 'Konfrontacja nie jest teraz możliwa!'})
+                return
+            save_room(room)
+            emit('start_confrontation', {
+                'players': [{'id': pid, 'name': room.game_engine.players[pid].name} for pid in participants],
+                'timeout': timeout
+            }, to=participants)
+            timers.schedule(timeout, expire_confrontation, game_code, deadline)
 
         elif action_type == 'end_turn':
-            room.next_turn()
-            emit('turn_ended', {'next_player': room.current_player}, room=game_code)
+            end_turn(room)
 
         elif action_type == 'get_items':
             items = room.game_engine.items
@@ -381,161 +631,185 @@ def handle_player_action(data):
             emit('error', {'message': 'Nieznana akcja!'})
 
     except Exception as e:
-        logging.error(f"Błąd akcji: {str(e)}")
+        logger.exception("Błąd akcji: %s", e, extra=log_context('player_action'))
         emit('error', {'message': 'Błąd wykonania akcji!'})
         
 @socketio.on('confrontation_roll')
+@serialized_by_player_room
+@outbound.batched
 def handle_confrontation_roll():
     try:
         player_id = request.sid
-        print(f"Confrontation roll received from player {player_id}")
-        if player_id not in players:
-            print(f"Player {player_id} not found")
+        game_code, room, player = find_player(player_id)
+        if not player:
             emit('error', {'message': 'Nie znaleziono gracza!'})
             return
 
-        game_code, player = players[player_id]
-        print(f"Player {player.name} in game {game_code}")
-        room = active_games.get(game_code)
-
         if not room or room.status != "in_progress":
-            print(f"Game {game_code} is not active")
             emit('error', {'message': 'Gra nie jest aktywna!'})
             return
 
-        roll = random.randint(1, 6)
-        print(f"Player {player.name} rolled {roll}")
+        roll = room.confrontation_roll(player_id)
+        if roll is None:
+            emit('error', {'message': 'Nie masz rzutu w konfrontacji!'})
+            return
+        logger.debug("Gracz %s wyrzucił %d w konfrontacji", player.name, roll,
+                     extra=log_context('confrontation_roll', game_code))
+        # Rzut widzi tylko rzucający; wszystkie rzuty przychodzą razem w confrontation_result
         emit('confrontation_roll_result', {
             'player_id': player_id,
             'player_name': player.name,
-            'roll': roll,
-            'popularity': player.popularity,
-            'influence': player.influence
-        }, room=game_code)
-        print(f"Confrontation roll result sent for player {player.name}")
+            'roll': roll
+        })
+        if room.game_engine.confrontation_ready():
+            finish_confrontation(room)
+        else:
+            save_room(room)
 
     except Exception as e:
-        logging.error(f"Błąd rzutu w konfrontacji: {str(e)}")
+        logger.exception("Błąd rzutu w konfrontacji: %s", e, extra=log_context('confrontation_roll'))
         emit('error', {'message': 'Błąd wykonania akcji!'})
 
-@socketio.on('end_confrontation')
-def handle_end_confrontation(data):
+def finish_confrontation(room, touch=True):
+    # Jedno zdarzenie z rzutami, wynikami i zwycięzcą zamiast rozgłaszania każdego rzutu osobno
+    result = room.resolve_confrontation()
+    update = room.game_update()
+    save_room(room, touch)
+    socketio.emit('confrontation_result', {**result, 'next_player': room.current_player}, to=room.code)
+    broadcast_game_update(room, update)
+
+def expire_confrontation(game_code, deadline):
+    with room_queues.serialized(game_code), outbound.batch():
+        room = store.get_room(game_code)
+        duel = room.game_engine.confrontation if room else None
+        if duel and duel['deadline'] == deadline:
+            finish_confrontation(room, touch=False)
+
+@socketio.on('field_action')
+@serialized_by_player_room
+@outbound.batched
+def handle_field_action(data):
     try:
         player_id = request.sid
-        if player_id not in players:
+        game_code, room, player = find_player(player_id)
+        if not player:
             emit('error', {'message': 'Nie znaleziono gracza!'})
             return
 
-        game_code, player = players[player_id]
-        room = active_games.get(game_code)
-
         if not room or room.status != "in_progress":
             emit('error', {'message': 'Gra nie jest aktywna!'})
             return
 
-        winner_id = data.get('winner_id')
-        loser_id = data.get('loser_id')
-
-        winner = room.game_engine.players.get(winner_id)
-        loser = room.game_engine.players.get(loser_id)
-
-        if winner and loser:
-            winner.popularity += 10
-            winner.influence += 5
-            loser.popularity = max(0, loser.popularity - 10)
-            loser.influence = max(0, loser.influence - 5)
+        action_type = data.get('action_type')
 
-        emit('confrontation_result', {
-            'winner': winner.name,
-            'loser': loser.name
-        }, room=game_code)
+        if action_type == "buy_item":
+            item_name = data.get("item_name")
+            response = room.buy_item(player_id, item_name)
+            update = room.game_update(effect=response)
+            save_room(room)
+            broadcast_game_update(room, update)
+            return
 
-        # Zmiana tury po konfrontacji
-        room.current_player_index = (room.current_player_index + 1) % len(room.players)
+        effect = room.field_action(player_id, action_type)
+        update = room.game_update(effect=effect, just_moved=False)
+        save_room(room)
 
-        emit('game_update', {
-            'players': [{
-                **p.serialize(),
-                'is_host': (p.name == room.host_name)
-            } for p in room.game_engine.players.values()],
-            'board': [field.serialize() for field in room.game_engine.board],
-            'current_player': room.current_player
-        }, room=game_code)
+        broadcast_game_update(room, update)
 
     except Exception as e:
-        logging.error(f"Błąd zakończenia konfrontacji: {str(e)}")
+        logger.exception("Błąd akcji pola: %s", e, extra=log_context('field_action'))
         emit('error', {'message': 'Błąd wykonania akcji!'})
 
-@socketio.on('field_action')
-def handle_field_action(data):
+@socketio.on('get_game_state')
+@serialized_by_player_room
+def handle_get_game_state(data=None):
     try:
         player_id = request.sid
-        if player_id not in players:
+        game_code, room, player = find_player(player_id)
+        if not player:
             emit('error', {'message': 'Nie znaleziono gracza!'})
             return
 
-        game_code, player = players[player_id]
-        room = active_games.get(game_code)
-
-        if not room or room.status != "in_progress":
-            emit('error', {'message': 'Gra nie jest aktywna!'})
-            return
-
-        action_type = data.get('action_type')
-
-        if action_type == "buy_item":
-            item_name = data.get("item_name")
-            response = room.game_engine.buy_item(player_id, item_name)
-            emit('game_update', {
-                'effect': response,
-                'players': [{
-                    **p.serialize(),
-                    'is_host': (p.name == room.host_name)
-                } for p in room.game_engine.players.values()],
-                'current_player': room.current_player,
-                'board': [field.serialize() for field in room.game_engine.board]
-            }, room=game_code)
+        if not room:
+            emit('error', {'message': 'Nie znaleziono gry!'})
             return
 
-        effect = room.game_engine.handle_field_action(player, action_type)
-
-        emit('game_update', {
-            'players': [{
-                **p.serialize(),
-                'is_host': (p.name == room.host_name)
-            } for p in room.game_engine.players.values()],
-            'effect': effect,
-            'current_player': room.current_player,
-            'board': [field.serialize() for field in room.game_engine.board],
-            'just_moved': False
-        }, room=game_code)
+        # Resynchronizacja po wykryciu luki w wersjach; planszę wysyłamy tylko, gdy klient ma inną
+        data = data or {}
+        include_board = data.get('board_hash') != room.game_engine.board_hash
+        emit('game_state', room.full_state(include_board=include_board))
 
     except Exception as e:
-        logging.error(f"Błąd akcji pola: {str(e)}")
-        emit('error', {'message': 'Błąd wykonania akcji!'})
+        logger.exception("Błąd pobierania stanu gry: %s", e, extra=log_context('get_game_state'))
+        emit('error', {'message': 'Błąd pobierania stanu gry!'})
 
 @socketio.on('disconnect')
+@serialized_by_player_room
+@outbound.batched
 def handle_disconnect():
     player_id = request.sid
-    if player_id in players:
-        game_code, _ = players[player_id]
-        room = active_games.get(game_code)
-        if room:
-            if player_id in room.game_engine.players:
-                del room.game_engine.players[player_id]
-            if player_id in room.players:
-                room.players.remove(player_id)
+    client_protocols.pop(player_id, None)
+    outbound.forget(player_id)
+    admission.forget(player_id)
+    game_code = store.get_player(player_id)
+    if game_code:
+        store.delete_player(player_id)
+        room = store.get_room(game_code)
+        if room and player_id in room.game_engine.players:
             leave_room(game_code)
-            del players[player_id]
-            emit('players_update', {
-                'players': [{
-                    'id': p.id, 
-                    'name': p.name, 
-                    'is_host': (p.name == room.host_name)
-                } for p in room.game_engine.players.values()],
-                'game_code': game_code
-            }, room=game_code)
-            broadcast_games_list()
+            if RECONNECT_GRACE <= 0:
+                remove_disconnected(room, player_id)
+                return
+            # Miejsce i tura czekają na powrót gracza (resume_game) przez RECONNECT_GRACE sekund
+            room.mark_disconnected(player_id, time.time() + RECONNECT_GRACE)
+            update = room.game_update()
+            save_room(room)
+            broadcast_game_update(room, update)
+            timers.schedule(RECONNECT_GRACE, expire_disconnected, game_code, player_id)
+
+def expire_disconnected(game_code, player_id):
+    with room_queues.serialized(game_code), outbound.batch():
+        room = store.get_room(game_code)
+        deadline = room.disconnected.get(player_id) if room else None
+        if deadline is not None and deadline <= time.time():
+            remove_disconnected(room, player_id, touch=False)
+
+def remove_disconnected(room, player_id, touch=True):
+    if room.status != 'lobby' and len(room.players) == 1 and player_id in room.players:
+        # Ostatni gracz opuszcza rozpoczętą grę - zapisujemy wynik, zanim pokój opustoszeje
+        lifecycle.archive(room, 'abandoned')
+    room.remove_player(player_id)
+    update = room.game_update()
+    save_room(room, touch)
+    socketio.emit('players_update', {
+        'players': [{
+            'id': p.id, 
+            'name': p.name, 
+            'is_host': (p.name == room.host_name)
+        } for p in room.game_engine.players.values()],
+        'game_code': room.code
+    }, to=room.code)
+    broadcast_game_update(room, update)
+    lobby_index.update(room)
+
+def rearm_timers(room):
+    # Pokój z trwałego magazynu po restarcie: tura dostaje termin od nowa, konfrontacja i powroty
+    # rozłączonych - pozostały czas do zapisanych terminów
+    watch_turn(room)
+    now = time.time()
+    duel = room.game_engine.confrontation
+    if duel:
+        timers.schedule(max(duel['deadline'] - now, 0), expire_confrontation, room.code, duel['deadline'])
+    for player_id, deadline in room.disconnected.items():
+        timers.schedule(max(deadline - now, 0), expire_disconnected, room.code, player_id)
+
+# Gry trwające w trwałym magazynie dostają terminy od nowa (po definicjach obsługi terminów)
+for room in store.iter_rooms():
+    rearm_timers(room)
+
+metrics.instrument_socketio(socketio)
+admission.instrument_socketio(socketio)
+outbound.install(socketio.server)
 
 if __name__ == '__main__':
     socketio.run(app, debug=True)
\ No newline at end of file
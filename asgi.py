@@ -0,0 +1,138 @@
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import socketio
+from asgiref.wsgi import WsgiToAsgi
+
+from app import MESSAGE_QUEUE, app, game_codes, metrics, outbound, socketio as app_socketio
+from sharding import session_id
+
+# Tryb asyncio: te same handlery i logika gry co w app.py, ale na python-socketio AsyncServer pod
+# serwerem ASGI - połączenie nie zajmuje wątku, więc bezczynni klienci kosztują tylko pamięć gniazda.
+# Strony i /api/* obsługuje dalej Flask (przez adapter WSGI). Uruchomienie (pip install uvicorn asgiref):
+#   python asgi.py                albo   uvicorn asgi:application --host 0.0.0.0 --port 5000
+# Zmienne: PGAME_HOST (domyślnie 127.0.0.1), PGAME_PORT (domyślnie 5000); PGAME_MESSAGE_QUEUE - tylko redis://;
+# PGAME_ASGI_THREADS - wątki wykonujące handlery (domyślnie 32)
+
+logger = logging.getLogger('pgame.asgi')
+
+# Wiadomości wysłane przez aktualnie wykonywany handler; wysyłamy je po jego zakończeniu
+outbox = contextvars.ContextVar('outbox', default=None)
+
+
+class AsyncBridge:
+    # Podstawiany jako socketio.server obiektu Flask-SocketIO: handlery z app.py wykonują się w puli wątków
+    # (czekają na kolejkę pokoju, którą trzymają też wątki timerów i porządkowania pokoi, więc nie mogą
+    # blokować pętli), a emit i close_room trafiają do AsyncServer po zakończeniu handlera. Zdarzenia
+    # jednego połączenia obsługujemy po kolei (async_handlers=False). Wątki tła przekazują wysyłkę do pętli
+    # przez kolejkę, w kolejności wywołań.
+
+    def __init__(self, sio, handlers, threads=32):
+        self.sio = sio
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='handler')
+        # Lista uczestników pokoi dla łączenia wiadomości (batching.py)
+        self.manager = sio.manager
+        self.loop = None
+        self.pending = None
+        for namespace, namespace_handlers in handlers.items():
+            for event, handler in namespace_handlers.items():
+                sio.on(event, self.coroutine(event, handler), namespace=namespace)
+
+    def start(self):
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+            self.pending = asyncio.Queue()
+            self.loop.create_task(self.deliver())
+
+    def coroutine(self, event, handler):
+        async def run(sid, *args):
+            self.start()
+            if event == 'connect':
+                # Flask-SocketIO tworzy kontekst żądania z environ połączenia
+                args[0]['flask.app'] = app
+            messages = []
+            token = outbox.set(messages)
+            try:
+                # Kopia kontekstu przenosi outbox do wątku handlera
+                context = contextvars.copy_context()
+                return await self.loop.run_in_executor(self.executor, context.run, handler, sid, *args)
+            finally:
+                outbox.reset(token)
+                for message in messages:
+                    await message
+        return run
+
+    async def deliver(self):
+        while True:
+            message = await self.pending.get()
+            try:
+                await message
+            except Exception:
+                logger.exception("Błąd wysyłki z wątku tła")
+
+    def submit(self, message):
+        messages = outbox.get()
+        if messages is not None:
+            messages.append(message)
+        elif self.loop is None:
+            message.close()
+        else:
+            self.loop.call_soon_threadsafe(self.pending.put_nowait, message)
+
+    # Metody serwera używane przez Flask-SocketIO
+
+    def emit(self, event, data=None, to=None, room=None, skip_sid=None, namespace=None, callback=None, **kwargs):
+        self.submit(self.sio.emit(event, data, to=to, room=room, skip_sid=skip_sid, namespace=namespace,
+                                  callback=callback))
+
+    def enter_room(self, sid, room, namespace=None):
+        self.sio.enter_room(sid, room, namespace=namespace)
+
+    def leave_room(self, sid, room, namespace=None):
+        self.sio.leave_room(sid, room, namespace=namespace)
+
+    def close_room(self, room, namespace=None):
+        self.submit(self.sio.close_room(room, namespace=namespace))
+
+    def rooms(self, sid, namespace=None):
+        return self.sio.rooms(sid, namespace=namespace)
+
+    def disconnect(self, sid, namespace=None):
+        self.submit(self.sio.disconnect(sid, namespace=namespace))
+
+    def get_environ(self, sid, namespace=None):
+        return self.sio.get_environ(sid, namespace=namespace)
+
+    def start_background_task(self, target, *args, **kwargs):
+        # Rzadkie zadania tła (flush lobby, porządkowanie pokoi) zostają w wątkach demona
+        thread = threading.Thread(target=target, args=args, kwargs=kwargs, daemon=True)
+        thread.start()
+        return thread
+
+    def sleep(self, seconds=0):
+        time.sleep(seconds)
+
+
+sio = socketio.AsyncServer(
+    async_mode='asgi', cors_allowed_origins='*', async_handlers=False,
+    client_manager=socketio.AsyncRedisManager(MESSAGE_QUEUE) if MESSAGE_QUEUE else None,
+    logger=logging.getLogger('socketio'), engineio_logger=logging.getLogger('engineio'))
+# Sesja Engine.IO niesie numer shardu tego workera - po nim router kieruje kolejne zapytania long-polling
+generate_id = sio.eio.generate_id
+sio.eio.generate_id = lambda: session_id(generate_id(), game_codes.shard)
+bridge = AsyncBridge(sio, app_socketio.server.handlers, threads=int(os.environ.get('PGAME_ASGI_THREADS', 32)))
+app_socketio.server = bridge
+metrics.instrument_emit(bridge)
+outbound.install(bridge)
+
+application = socketio.ASGIApp(sio, WsgiToAsgi(app), on_startup=bridge.start)
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(application, host=os.environ.get('PGAME_HOST', '127.0.0.1'),
+                port=int(os.environ.get('PGAME_PORT', 5000)), log_config=None)
@@ -0,0 +1,94 @@
+import contextvars
+import functools
+from contextlib import contextmanager
+
+# Łączenie wiadomości wychodzących: emity wykonane podczas obsługi jednego zdarzenia pokoju zbieramy
+# i po jego zakończeniu każdy odbiorca dostaje jedną ramkę 'batch' z listą [zdarzenie, dane] zamiast
+# kilku osobnych. Koperty dostają tylko klienci, którzy o nie poprosili (set_protocol z batch: true);
+# pozostali - te same wiadomości osobno, jak dotąd. Odbiorców ustalamy w chwili emitu (jak zrobiłby to
+# sam emit), więc późniejsze wyjście z pokoju czy close_room nie gubią wiadomości. Z kolejką wiadomości
+# (PGAME_MESSAGE_QUEUE) części odbiorców nie widać w tym procesie - wtedy wysyłamy bez łączenia.
+
+BATCH_EVENT = 'batch'
+
+pending = contextvars.ContextVar('pending_emits', default=None)
+
+
+class OutboundBatcher:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.server = None
+        self.server_emit = None
+        # sid klientów przyjmujących koperty
+        self.clients = set()
+
+    def install(self, server):
+        # Owija server.emit; wywołać po instrumentacji metryk, żeby liczyły faktycznie wysłane ramki
+        self.server = server
+        self.server_emit = server.emit
+        if self.enabled:
+            server.emit = self.emit
+
+    def accept(self, sid, batch):
+        # Zwraca, czy klient będzie dostawał koperty
+        if batch and self.enabled:
+            self.clients.add(sid)
+            return True
+        self.clients.discard(sid)
+        return False
+
+    def forget(self, sid):
+        self.clients.discard(sid)
+
+    def emit(self, event, data=None, to=None, room=None, skip_sid=None, namespace=None, callback=None, **kwargs):
+        messages = pending.get()
+        target = to or room
+        if messages is None or target is None or callback is not None:
+            return self.server_emit(event, data, to=target, skip_sid=skip_sid, namespace=namespace,
+                                    callback=callback, **kwargs)
+        namespace = namespace or '/'
+        skip = skip_sid if isinstance(skip_sid, list) else [skip_sid]
+        sids = [sid for sid, _ in self.server.manager.get_participants(namespace, target) if sid not in skip]
+        messages.append((event, data, namespace, sids))
+
+    @contextmanager
+    def batch(self):
+        if pending.get() is not None:
+            # Zagnieżdżone wywołanie dołącza do trwającej paczki
+            yield
+            return
+        messages = []
+        token = pending.set(messages)
+        try:
+            yield
+        finally:
+            pending.reset(token)
+            self.flush(messages)
+
+    def batched(self, handler):
+        # Dekorator handlera; stosować pod serialized_by_room, żeby wysyłka była jeszcze w kolejce pokoju
+        @functools.wraps(handler)
+        def wrapper(*args, **kwargs):
+            with self.batch():
+                return handler(*args, **kwargs)
+        return wrapper
+
+    def flush(self, messages):
+        if not messages:
+            return
+        # Kolejne wiadomości każdego odbiorcy; odbiorców z tym samym ciągiem obsługujemy jednym emitem
+        sequences = {}
+        for index, (event, data, namespace, sids) in enumerate(messages):
+            for sid in sids:
+                sequences.setdefault((namespace, sid), []).append(index)
+        groups = {}
+        for (namespace, sid), indices in sequences.items():
+            envelope = len(indices) > 1 and sid in self.clients
+            groups.setdefault((namespace, tuple(indices), envelope), []).append(sid)
+        for (namespace, indices, envelope), sids in groups.items():
+            if envelope:
+                self.server_emit(BATCH_EVENT, [[messages[i][0], messages[i][1]] for i in indices],
+                                 to=sids, namespace=namespace)
+            else:
+                for i in indices:
+                    self.server_emit(messages[i][0], messages[i][1], to=sids, namespace=namespace)
@@ -1,36 +1,226 @@
+import hashlib
+import json
+import logging
+import os
 import random
-import re
+import threading
+import time
+import weakref
 
-def extract_number(text):
-    match = re.search(r'(\d+)', text)
-    return int(match.group(1)) if match else 0
+logger = logging.getLogger('pgame.engine')
 
-class Player:
-    def __init__(self, player_id, name):
-        self.id = player_id
-        self.name = name
-        self.position = 0
-        self.popularity = 50
-        self.influence = 10
-        self.budget = 100000
-        self.cards = []
-        
-    def serialize(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'position': self.position,
-            'popularity': self.popularity,
-            'influence': self.influence,
-            'budget': self.budget
+# Kolejność statystyk w krotkach efektów
+STATS = ('popularity', 'influence', 'budget')
+
+# Granice statystyk (minimum, maksimum); None oznacza brak ograniczenia
+STAT_LIMITS = {
+    'popularity': (0, 100),
+    'influence': (0, None),
+    'budget': (None, None),
+}
+
+# Efekty akcji pól: opis i zmiany statystyk. Tekst dla graczy generujemy z tych danych.
+ACTION_EFFECTS = {
+    "vote_for": [("Twoja partia jest zadowolona.", {'influence': 10})],
+    "vote_against": [("Masz odwagę, ale nie wszystkim się to podoba.", {'popularity': 5, 'influence': -5})],
+    "smart_speech": [("Twoje argumenty przekonały wyborców.", {'popularity': 15})],
+    "attack_opponent": [("Zyskujesz wpływy, ale media krytykują.", {'influence': 10, 'popularity': -5})],
+    "grant_money": [("Dotacja zatwierdzona!", {'budget': 20000})],
+    "deny_scandal": [("Próbujesz się bronić.", {'popularity': -10})],
+    "admit_scandal": [("Ludzie doceniają twoją szczerość.", {'budget': -10000, 'popularity': 5})],
+    "blame_assistant": [("Unikasz kary, ale ludzie ci nie ufają.", {'influence': -10})],
+    "support_protesters": [("Pokazujesz, że słuchasz wyborców.", {'popularity': 10})],
+    "call_police": [("Używasz siły.", {'influence': 10, 'popularity': -5})],
+    "publish_article": [("Media idą za twoją narracją.", {'budget': -5000, 'popularity': 10})],
+    "whistleblower": [("Zdobywasz sympatię wyborców, ale tracisz kontakty.", {'popularity': 20, 'influence': -20})],
+    "post_tweet": [("Twoje konto wybucha popularnością!", {'popularity': 15})],
+    "twitter_fight": [("Media się tobą interesują.", {'influence': 10, 'popularity': -5})],
+    "election_campaign": [("Inwestujesz w kampanię.", {'budget': -10000, 'popularity': 20})],
+    "buy_coffee": [("Kofeina działa!", {'budget': -200, 'popularity': 2})],
+    "receive_diet": [("Pobierasz dietę poselską", {'budget': 20000})],
+}
+
+SCANDAL_CARDS = [
+    ("Ujawniono tajne spotkania!", {'popularity': -15}),
+    ("Fałszywe oświadczenie majątkowe!", {'budget': -30000}),
+    ("Konflikt interesów!", {'influence': -10}),
+    ("Hulanka w rządzie!", {'popularity': 20}),
+]
+
+# Efekty wejścia na pole, według typu pola
+FIELD_EFFECTS = {
+    'Start': [("", {'budget': 10000})],
+    'Afera': SCANDAL_CARDS,
+    'Media': [("", {'popularity': 10})],
+}
+
+def format_change(stat, delta):
+    sign = '+' if delta > 0 else '-'
+    value = abs(delta)
+    if stat == 'popularity':
+        return f"{sign}{value}% popularności"
+    if stat == 'influence':
+        return f"{sign}{value} wpływów"
+    amount = f"{value:,}".replace(',', ' ') if value >= 10000 else str(value)
+    return f"{sign}{amount} zł"
+
+def apply_effect_deltas(stats, deltas):
+    # Czysta funkcja: (popularność, wpływy, budżet) + zmiany -> nowe wartości po przycięciu do granic
+    result = []
+    for stat, value, delta in zip(STATS, stats, deltas):
+        if delta:
+            value += delta
+            low, high = STAT_LIMITS[stat]
+            if low is not None and value < low:
+                value = low
+            elif high is not None and value > high:
+                value = high
+        result.append(value)
+    return tuple(result)
+
+class Effect:
+    __slots__ = ('summary', 'text', 'changes', 'deltas')
+
+    def __init__(self, summary, changes):
+        self.summary = summary
+        self.changes = tuple(changes.items())
+        self.deltas = tuple(changes.get(stat, 0) for stat in STATS)
+        parts = ", ".join(format_change(stat, delta) for stat, delta in self.changes)
+        self.text = f"{summary} {parts}".strip()
+
+    def apply(self, player):
+        player.popularity, player.influence, player.budget = apply_effect_deltas(
+            (player.popularity, player.influence, player.budget), self.deltas
+        )
+
+def compile_effects(definitions):
+    return {
+        key: tuple(Effect(summary, changes) for summary, changes in variants)
+        for key, variants in definitions.items()
+    }
+
+NO_EFFECT = Effect("Brak efektu", {})
+
+# Konfrontacja: wynik to rzut + popularność + wpływy; najwyższy wygrywa, najniższy przegrywa
+CONFRONTATION_WIN = Effect("Wygrywasz konfrontację!", {'popularity': 10, 'influence': 5})
+CONFRONTATION_LOSS = Effect("Przegrywasz konfrontację.", {'popularity': -10, 'influence': -5})
+
+ITEMS = {
+    "📓 Notatnik": {
+        "price": 5000,
+        "effects": {
+            "influence": 5,
+            "description": "Zwiększa wpływy o 5"
+        }
+    },
+    "📱 Telefon służbowy": {
+        "price": 10000,
+        "effects": {
+            "popularity": 10,
+            "description": "Zwiększa popularność o 10"
+        }
+    },
+    "🙋 Doradca PR": {
+        "price": 20000,
+        "effects": {
+            "popularity": 15,
+            "influence": 10,
+            "description": "Zwiększa popularność o 15 i wpływy o 10"
+        }
+    },
+    "📊 Badanie opinii": {
+        "price": 15000,
+        "effects": {
+            "popularity": 20,
+            "description": "Zwiększa popularność o 20"
         }
+    }
+}
+
+# Plansza: (typ pola, opis, ((nazwa akcji, opis, typ efektu), ...))
+BOARD = (
+    ("Start", "Rozpoczynasz kadencję w Sejmie!", (
+        ("Odbierz mandat", "Twoja polityczna przygoda się zaczyna. Otrzymujesz 5000 zł budżetu.", "receive_diet"),
+    )),
+    ("Głosowanie", "Czas na ważne głosowanie w Sejmie!", (
+        ("Głosuj Za", "Twoja partia jest zadowolona. +10 wpływów", "vote_for"),
+        ("Głosuj Przeciw", "Ryzykujesz konflikt, ale zyskujesz niezależność. +5 popularności", "vote_against"),
+        ("Wstrzymaj się", "Bezpieczna decyzja, ale bez efektów.", "vote_abstain"),
+    )),
+    ("Ministerstwo Finansów", "Masz okazję zdobyć dodatkowe fundusze!", (
+        ("Złóż wniosek o dotację", "Otrzymujesz 20 000 zł na swoją kampanię!", "grant_money"),
+        ("Zignoruj dotację", "Twoja reputacja pozostaje czysta, ale nic nie zyskujesz.", "ignore_grant"),
+    )),
+    ("Debata Telewizyjna", "Zmierzasz się w debacie politycznej!", (
+        ("Mów mądrze", "Twoje argumenty przekonują wyborców. +15% popularności", "smart_speech"),
+        ("Atakuj przeciwnika", "Twoja partia zyskuje, ale media są przeciw tobie. +10 wpływów, -5% popularności", "attack_opponent"),
+        ("Unikaj tematu", "Ludzie uznają cię za nudnego. -5% popularności", "dodge_question"),
+    )),
+    ("Afera Korupcyjna", "Dziennikarze śledczy znaleźli podejrzane powiązania!", (
+        ("Zaprzeczaj wszystkiemu", "Niektórzy ci wierzą, ale ryzyko pozostaje. -10% popularności", "deny_scandal"),
+        ("Przyznaj się i przeproś", "Ludzie cenią szczerość. -10 000 zł, ale +5% popularności", "admit_scandal"),
+        ("Zrzuć winę na asystenta", "Tracisz wpływy, ale unikasz kary. -10 wpływów", "blame_assistant"),
+    )),
+    ("Protest Wyborców", "Ludzie niezadowoleni z twoich decyzji zbierają się pod Sejmem!", (
+        ("Wyjdź do protestujących", "Pokazujesz ludzką twarz. +10% popularności", "support_protesters"),
+        ("Ignoruj protest", "Ludzie są wściekli. -15% popularności", "ignore_protest"),
+        ("Wezwij policję", "Opozycja oskarża cię o brutalność. -5% popularności, ale +10 wpływów", "call_police"),
+    )),
+    ("Dziennikarze Śledczy", "Media badają twoją przeszłość!", (
+        ("Opublikuj własny artykuł", "Kontrolujesz narrację, ale kosztuje to 5000 zł", "publish_article"),
+        ("Nie komentuj", "Ryzykujesz, że sprawa urośnie w skandal.", "silent_mode"),
+        ("Zatrudnij doradcę PR", "Za 15 000 zł ratujesz swoją reputację. +10% popularności", "hire_PR"),
+    )),
+    ("Komisja Śledcza", "Jesteś wezwany przed komisję sejmową!", (
+        ("Współpracuj", "Zyskujesz sympatię wyborców. +5% popularności", "cooperate"),
+        ("Matacz", "Nie dają ci spokoju. -5% popularności, ale +10 wpływów", "manipulate"),
+        ("Zostań świadkiem koronnym", "Zdradzasz kolegów z partii! +20% popularności, -20 wpływów", "whistleblower"),
+    )),
+    ("Lobbyści", "Wpływowe osoby oferują wsparcie...", (
+        ("Przyjmij ofertę", "Zyskujesz 50 000 zł, ale ryzykujesz skandal.", "accept_lobby"),
+        ("Odrzuć propozycję", "Zachowujesz honor, ale nic nie zyskujesz.", "reject_lobby"),
+    )),
+    ("Media Społecznościowe", "Twoje konto na Twitterze eksplodowało!", (
+        ("Zamieść błyskotliwy tweet", "Zyskujesz 15% popularności", "post_tweet"),
+        ("Wejdź w konflikt", "Zwiększasz wpływy, ale tracisz fanów. +10 wpływów, -5% popularności", "twitter_fight"),
+    )),
+    ("Wybory", "Czas na sprawdzian twoich rządów!", (
+        ("Prowadź kampanię", "Kosztuje 10 000 zł, ale daje 20% popularności", "election_campaign"),
+        ("Zaufaj wyborcom", "Brak kosztów, ale ryzykujesz przegraną.", "trust_people"),
+    )),
+    ("Kantyna", "Możesz kupić przydatne przedmioty", (
+        ("Kup przedmiot", "Wydaj budżet na pomocne narzędzia", "buy_item"),
+    )),
+)
+
+def item_bits(items):
+    # Katalog przedmiotów w stałej kolejności; posiadane przedmioty gracza to maska bitowa względem niego
+    return {name: 1 << i for i, name in enumerate(items)}
+
+ITEM_NAMES = tuple(ITEMS)
+ITEM_BITS = item_bits(ITEMS)
+
+DICE_SIDES = 6
+
+def reachability_table(board_size, max_steps=DICE_SIDES):
+    # table[pozycja][oczka] -> pola osiągalne po rzucie: do przodu i do tyłu (plansza jest pętlą)
+    return tuple(
+        tuple(
+            tuple(dict.fromkeys(((position + steps) % board_size, (position - steps) % board_size)))
+            for steps in range(max_steps + 1)
+        )
+        for position in range(board_size)
+    )
 
 class FieldAction:
+    __slots__ = ('name', 'description', 'effect_type')
+
     def __init__(self, name, description, effect_type):
         self.name = name
         self.description = description
         self.effect_type = effect_type
-        
+
+
     def serialize(self):
         return {
             'name': self.name,
@@ -39,11 +229,14 @@ class FieldAction:
         }
 
 class Field:
+    __slots__ = ('type', 'description', 'actions')
+
     def __init__(self, type_name, description, actions):
         self.type = type_name
         self.description = description
-        self.actions = actions
-        
+        self.actions = tuple(actions)
+
+
     def serialize(self):
         return {
             'type': self.type,
@@ -53,71 +246,478 @@ class Field:
         }
 
 class Player:
+    __slots__ = ('name', 'avatar', 'item_mask', 'item_bits', '_id', '_position', '_popularity', '_influence', '_budget', '_serialized')
+
     def __init__(self, player_id, name, avatar):
-        self.id = player_id
+        self._id = player_id
         self.name = name
         self.avatar = avatar
-        self.position = 0
-        self.popularity = 50
-        self.influence = 10
-        self.budget = 100000
-        self.items = []  # Lista posiadanych przedmiotów
-        
+        self._position = 0
+        self._popularity = 50
+        self._influence = 10
+        self._budget = 100000
+        self.item_mask = 0  # Posiadane przedmioty, bity według katalogu item_bits
+        self.item_bits = ITEM_BITS  # Silnik podmienia na katalog swoich zasad
+        self._serialized = None
+
+    # Każda zmiana pola wysyłanego klientom unieważnia zapamiętaną serializację
+
+    @property
+    def id(self):
+        return self._id
+
+    @id.setter
+    def id(self, value):
+        self._id = value
+        self._serialized = None
+
+    @property
+    def position(self):
+        return self._position
+
+    @position.setter
+    def position(self, value):
+        self._position = value
+        self._serialized = None
+
+    @property
+    def popularity(self):
+        return self._popularity
+
+    @popularity.setter
+    def popularity(self, value):
+        self._popularity = value
+        self._serialized = None
+
+    @property
+    def influence(self):
+        return self._influence
+
+    @influence.setter
+    def influence(self, value):
+        self._influence = value
+        self._serialized = None
+
+    @property
+    def budget(self):
+        return self._budget
+
+    @budget.setter
+    def budget(self, value):
+        self._budget = value
+        self._serialized = None
+
+    @property
+    def items(self):
+        return [name for name, bit in self.item_bits.items() if self.item_mask & bit]
+
+    def has_item(self, item_name):
+        return bool(self.item_mask & self.item_bits[item_name])
+
+    def add_item(self, item_name):
+        self.item_mask |= self.item_bits[item_name]
+        self._serialized = None
+
     def serialize(self):
+        # Zwracany słownik jest współdzielony do następnej zmiany - nie modyfikować
+        if self._serialized is None:
+            self._serialized = {
+                'id': self._id,
+                'name': self.name,
+                'avatar': self.avatar,
+                'position': self._position,
+                'popularity': self._popularity,
+                'influence': self._influence,
+                'budget': self._budget,
+                'items': self.items
+            }
+        return self._serialized
+
+    def to_dict(self):
         return {
-            'id': self.id,
+            'id': self._id,
             'name': self.name,
             'avatar': self.avatar,
-            'position': self.position,
-            'popularity': self.popularity,
-            'influence': self.influence,
-            'budget': self.budget,
-            'items': self.items  # Dodajemy przedmioty do serializacji
+            'position': self._position,
+            'popularity': self._popularity,
+            'influence': self._influence,
+            'budget': self._budget,
+            'item_mask': self.item_mask
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        player = cls(data['id'], data['name'], data['avatar'])
+        player._position = data['position']
+        player._popularity = data['popularity']
+        player._influence = data['influence']
+        player._budget = data['budget']
+        player.item_mask = data['item_mask']
+        return player
+
+class TurnRing:
+    # Kolejność tur jako pierścień: następny i poprzedni gracz w słownikach, więc przejście tury,
+    # dołączenie, usunięcie i podmiana sid gracza kosztują O(1). Jedyne źródło bieżącej tury.
+    __slots__ = ('next', 'prev', 'head', 'current')
+
+    def __init__(self, order=(), current=None):
+        self.next = {}
+        self.prev = {}
+        self.head = None
+        self.current = None
+        for player_id in order:
+            self.add(player_id)
+        if current in self.next:
+            self.current = current
+
+    def __len__(self):
+        return len(self.next)
+
+    def __contains__(self, player_id):
+        return player_id in self.next
+
+    def __iter__(self):
+        # Kolejność siedzenia od pierwszego gracza
+        player_id = self.head
+        for _ in range(len(self.next)):
+            yield player_id
+            player_id = self.next[player_id]
+
+    def add(self, player_id):
+        if player_id in self.next:
+            return
+        if self.head is None:
+            self.next[player_id] = self.prev[player_id] = player_id
+            self.head = self.current = player_id
+            return
+        # Nowy gracz siada na końcu, tuż przed pierwszym
+        tail = self.prev[self.head]
+        self.next[tail] = player_id
+        self.prev[player_id] = tail
+        self.next[player_id] = self.head
+        self.prev[self.head] = player_id
+
+    def remove(self, player_id):
+        if player_id not in self.next:
+            return
+        following = self.next.pop(player_id)
+        preceding = self.prev.pop(player_id)
+        if following == player_id:
+            self.head = self.current = None
+            return
+        self.next[preceding] = following
+        self.prev[following] = preceding
+        if self.head == player_id:
+            self.head = following
+        # Tura usuniętego gracza przechodzi na następnego
+        if self.current == player_id:
+            self.current = following
+
+    def replace(self, old_id, new_id):
+        if old_id not in self.next:
+            return
+        following = self.next.pop(old_id)
+        preceding = self.prev.pop(old_id)
+        if following == old_id:
+            self.next[new_id] = self.prev[new_id] = new_id
+        else:
+            self.next[new_id] = following
+            self.prev[new_id] = preceding
+            self.next[preceding] = new_id
+            self.prev[following] = new_id
+        if self.head == old_id:
+            self.head = new_id
+        if self.current == old_id:
+            self.current = new_id
+
+    def start(self, player_id=None):
+        self.current = player_id if player_id in self.next else self.head
+        return self.current
+
+    def advance(self, skip=()):
+        # Następny gracz spoza skip (np. rozłączeni); gdy wszyscy są pomijani, tura zostaje
+        player_id = self.current
+        if player_id is None:
+            return None
+        for _ in range(len(self.next)):
+            player_id = self.next[player_id]
+            if player_id not in skip:
+                self.current = player_id
+                break
+        return self.current
+
+
+class StaticPayload:
+    # Niezmienna treść wspólna dla wszystkich pokoi: dane, zakodowany raz JSON i ETag
+    __slots__ = ('data', 'body', 'etag')
+
+    def __init__(self, data):
+        self.data = data
+        self.body = json.dumps(data, ensure_ascii=False, sort_keys=True).encode('utf-8')
+        self.etag = hashlib.sha1(self.body).hexdigest()[:16]
+
+
+class GameRules:
+    # Plansza, katalog przedmiotów i skompilowane efekty - budowane raz i współdzielone przez wszystkie
+    # silniki (pokoje). Nie modyfikować; nowa wersja zasad to nowy obiekt GameRules.
+
+    def __init__(self, version='builtin', board=BOARD, items=ITEMS, action_effects=ACTION_EFFECTS,
+                 field_effects=FIELD_EFFECTS, scandal_cards=SCANDAL_CARDS):
+        self.version = version
+        self.board = tuple(
+            Field(type_name, description, [FieldAction(*action) for action in actions])
+            for type_name, description, actions in board
+        )
+        self.items = items
+        self.item_bits = ITEM_BITS if tuple(items) == ITEM_NAMES else item_bits(items)
+        self.item_names = list(self.item_bits)  # kolejność bitów maski przedmiotów
+        self.effects = compile_effects(action_effects)
+        self.field_effects = compile_effects(field_effects)
+        self.scandal_cards = tuple(Effect(summary, changes) for summary, changes in scandal_cards)
+        self.reachable = reachability_table(len(self.board))
+        self.item_effects = {
+            name: Effect(item["effects"]["description"], {
+                stat: item["effects"][stat] for stat in STATS if stat in item["effects"]
+            })
+            for name, item in items.items()
         }
+        # Plansza nie zmienia się w trakcie gry; klienci pobierają ją raz (HTTP z ETagiem) i porównują hash
+        self.board_static = StaticPayload([field.serialize() for field in self.board])
+        self.items_static = StaticPayload(items)
+
+    @classmethod
+    def from_dict(cls, data):
+        # Format pliku zasad (JSON); brakujące sekcje biorą wartości wbudowane
+        return cls(
+            version=str(data['version']),
+            board=[
+                (field['type'], field['description'],
+                 [(action['name'], action['description'], action['effect_type']) for action in field['actions']])
+                for field in data['board']
+            ] if 'board' in data else BOARD,
+            items=data.get('items', ITEMS),
+            action_effects=data.get('action_effects', ACTION_EFFECTS),
+            field_effects=data.get('field_effects', FIELD_EFFECTS),
+            scandal_cards=data.get('scandal_cards', SCANDAL_CARDS),
+        )
+
+    def to_dict(self):
+        return {
+            'version': self.version,
+            'board': self.board_static.data,
+            'items': self.items,
+            'action_effects': {key: [[e.summary, dict(e.changes)] for e in variants] for key, variants in self.effects.items()},
+            'field_effects': {key: [[e.summary, dict(e.changes)] for e in variants] for key, variants in self.field_effects.items()},
+            'scandal_cards': [[e.summary, dict(e.changes)] for e in self.scandal_cards],
+        }
+
+
+def load_rules(path):
+    with open(path, encoding='utf-8') as f:
+        return GameRules.from_dict(json.load(f))
+
+
+# Wersje zasad znane w procesie; pokoje zapisane w magazynie wracają do swojej wersji. Słownik trzyma
+# wersje słabo: po przeładowaniu stara wersja znika, gdy nie używa jej już żaden pokój w pamięci
+_rules_lock = threading.Lock()
+_rules_by_version = weakref.WeakValueDictionary()
+_current_rules = None
+
+
+def register_rules(rules):
+    with _rules_lock:
+        _rules_by_version.setdefault(rules.version, rules)
+        return _rules_by_version[rules.version]
+
+
+def set_current_rules(rules):
+    global _current_rules
+    _current_rules = register_rules(rules)
+    return _current_rules
+
+
+def current_rules():
+    return _current_rules
+
+
+def rules_for_version(version):
+    return _rules_by_version.get(version) or _current_rules
+
+
+def rules_for_payload(name, etag):
+    # Zasady, których plansza ('board_static') lub katalog ('items_static') ma podany ETag
+    for rules in list(_rules_by_version.values()):
+        if getattr(rules, name).etag == etag:
+            return rules
+    return None
+
+
+set_current_rules(GameRules())
+
+
+class RulesFile:
+    # Przeładowanie zasad z pliku bez restartu: nowe pokoje dostają nową wersję, trwające gry - swoją.
+    # Plik sprawdzamy (os.stat) najwyżej raz na check_interval sekund.
+
+    def __init__(self, path, check_interval=5):
+        self.path = path
+        self.check_interval = check_interval
+        self.mtime = None
+        self.checked = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        path = os.environ.get('PGAME_RULES')
+        return cls(path) if path else None
+
+    def current(self):
+        now = time.monotonic()
+        if now - self.checked >= self.check_interval:
+            with self.lock:
+                if now - self.checked >= self.check_interval:
+                    self.checked = now
+                    self.reload_if_changed()
+        return current_rules()
+
+    def reload_if_changed(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+            if mtime == self.mtime:
+                return
+            rules = load_rules(self.path)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.error("Nie udało się wczytać zasad z %s: %s", self.path, e)
+            return
+        self.mtime = mtime
+        if rules.version != current_rules().version:
+            set_current_rules(rules)
+            logger.info("Wczytano zasady w wersji %s", rules.version)
+
 
 class GameEngine:
-    def __init__(self):
+    def __init__(self, rng=None, rules=None):
+        # Źródło losowości można podmienić, np. na random.Random(seed) w symulacjach
+        self.rng = rng if rng is not None else random
         self.players = {}
-        self.board = []
-        self.items = {
-            "📓 Notatnik": {
-                "price": 5000,
-                "effects": {
-                    "influence": 5,
-                    "description": "Zwiększa wpływy o 5"
-                }
-            },
-            "📱 Telefon służbowy": {
-                "price": 10000,
-                "effects": {
-                    "popularity": 10,
-                    "description": "Zwiększa popularność o 10"
-                }
-            },
-            "🙋 Doradca PR": {
-                "price": 20000,
-                "effects": {
-                    "popularity": 15,
-                    "influence": 10,
-                    "description": "Zwiększa popularność o 15 i wpływy o 10"
-                }
-            },
-            "📊 Badanie opinii": {
-                "price": 15000,
-                "effects": {
-                    "popularity": 20,
-                    "description": "Zwiększa popularność o 20"
-                }
-            }
-        }
-        self.current_turn = 0
+        self.turns = TurnRing()
         self.voting = None
-        self.initialize_board()
+        # Rzut gracza z turą czekający na ruch (liczba oczek) i czy w tej turze już rzucał
+        self.pending_roll = None
+        self.turn_rolled = False
+        # Trwająca konfrontacja: uczestnicy (inicjator pierwszy), ich rzuty i termin na rzuty
+        self.confrontation = None
+        self.use_rules(rules or current_rules())
+
+    @property
+    def current_turn(self):
+        return self.turns.current
 
-    def next_turn(self):
-        player_ids = list(self.players.keys())
-        self.current_turn = (self.current_turn + 1) % len(player_ids)
-        return player_ids[self.current_turn]
+    @current_turn.setter
+    def current_turn(self, player_id):
+        self.turns.start(player_id)
+
+    def use_rules(self, rules):
+        # Silnik trzyma tylko referencje do współdzielonych zasad
+        self.rules = rules
+        self.board = rules.board
+        self.items = rules.items
+        self.items_static = rules.items_static
+        self.effects = rules.effects
+        self.field_effects = rules.field_effects
+        self.scandal_cards = rules.scandal_cards
+        self.item_effects = rules.item_effects
+        self.board_static = rules.board_static
+        self.board_payload = rules.board_static.data
+        self.board_hash = rules.board_static.etag
+        self.reachable = rules.reachable
+
+    def next_turn(self, skip=()):
+        self.reset_roll()
+        player_id = self.turns.advance(skip)
+        if player_id is not None:
+            logger.debug("Tura gracza: %s", self.players[player_id].name)
+        return player_id
+
+    def reset_roll(self):
+        self.pending_roll = None
+        self.turn_rolled = False
+
+    def roll_dice(self, player_id):
+        # Jeden rzut na turę; ponowne wywołanie przed ruchem zwraca ten sam rzut. None - już po ruchu
+        if self.pending_roll is None:
+            if self.turn_rolled:
+                return None
+            self.pending_roll = self.rng.randint(1, DICE_SIDES)
+            self.turn_rolled = True
+        player = self.players[player_id]
+        return self.pending_roll, self.reachable[player.position][self.pending_roll]
+
+    def move_to(self, player_id, new_position):
+        # Ruch tylko na pole osiągalne z oczekującego rzutu; False dla każdego innego
+        player = self.players[player_id]
+        if self.pending_roll is None or new_position not in self.reachable[player.position][self.pending_roll]:
+            return False
+        self.pending_roll = None
+        player.position = new_position
+        return True
+
+    def start_confrontation(self, player_id, deadline):
+        # Gracz z turą po ruchu wyzywa graczy ze swojego pola; jedna konfrontacja naraz
+        if self.confrontation or player_id != self.current_turn or not self.turn_rolled or self.pending_roll is not None:
+            return None
+        position = self.players[player_id].position
+        opponents = [p.id for p in self.players.values() if p.position == position and p.id != player_id]
+        if not opponents:
+            return None
+        self.confrontation = {'players': [player_id, *opponents], 'rolls': {}, 'deadline': deadline}
+        return self.confrontation['players']
+
+    def confrontation_roll(self, player_id):
+        # Jeden rzut na uczestnika; None dla pozostałych i po rzucie
+        duel = self.confrontation
+        if not duel or player_id not in duel['players'] or player_id in duel['rolls']:
+            return None
+        roll = self.rng.randint(1, DICE_SIDES)
+        duel['rolls'][player_id] = roll
+        return roll
+
+    def confrontation_ready(self):
+        duel = self.confrontation
+        return duel is not None and all(player_id in duel['rolls'] for player_id in duel['players'])
+
+    def resolve_confrontation(self):
+        # Brakujące rzuty (np. po terminie) wykonuje serwer. Przy remisie wszystkich nikt nie wygrywa,
+        # przy remisie na czele - wcześniejszy uczestnik (inicjator pierwszy)
+        duel = self.confrontation
+        self.confrontation = None
+        results = []
+        for player_id in duel['players']:
+            player = self.players.get(player_id)
+            if player is None:
+                continue
+            roll = duel['rolls'].get(player_id) or self.rng.randint(1, DICE_SIDES)
+            results.append({
+                'id': player_id,
+                'name': player.name,
+                'roll': roll,
+                'popularity': player.popularity,
+                'influence': player.influence,
+                'score': roll + player.popularity + player.influence
+            })
+        ranked = sorted(results, key=lambda result: -result['score'])
+        winner = loser = None
+        if len(ranked) >= 2 and ranked[0]['score'] > ranked[-1]['score']:
+            winner, loser = ranked[0], ranked[-1]
+            CONFRONTATION_WIN.apply(self.players[winner['id']])
+            CONFRONTATION_LOSS.apply(self.players[loser['id']])
+        return {
+            'players': results,
+            'winner': winner and winner['name'],
+            'loser': loser and loser['name'],
+            'winner_id': winner and winner['id'],
+            'loser_id': loser and loser['id']
+        }
 
     def buy_item(self, player_id, item_name):
         if player_id not in self.players:
@@ -132,84 +732,22 @@ class GameEngine:
         if player.budget < item["price"]:
             return "Nie masz wystarczająco środków!"
 
-        if item_name in player.items:
+        if player.has_item(item_name):
             return "Już posiadasz ten przedmiot!"
 
         # Pobierz opłatę
         player.budget -= item["price"]
 
         # Dodaj przedmiot do ekwipunku
-        if not hasattr(player, 'items'):
-            player.items = []
-        player.items.append(item_name)
+        player.add_item(item_name)
 
         # Zastosuj efekty przedmiotu
-        effects = item["effects"]
-        if "popularity" in effects:
-            player.popularity = min(100, player.popularity + effects["popularity"])
-        if "influence" in effects:
-            player.influence += effects["influence"]
+        self.item_effects[item_name].apply(player)
 
-        return f"Kupiłeś {item_name}! {effects['description']}"
+        return f"Kupiłeś {item_name}! {item['effects']['description']}"
 
 
         
-    def initialize_board(self):
-        self.board = [
-            Field("Start", "Rozpoczynasz kadencję w Sejmie!", [
-                FieldAction("Odbierz mandat", "Twoja polityczna przygoda się zaczyna. Otrzymujesz 5000 zł budżetu.", "receive_diet")
-            ]),
-            Field("Głosowanie", "Czas na ważne głosowanie w Sejmie!", [
-                FieldAction("Głosuj Za", "Twoja partia jest zadowolona. +10 wpływów", "vote_for"),
-                FieldAction("Głosuj Przeciw", "Ryzykujesz konflikt, ale zyskujesz niezależność. +5 popularności", "vote_against"),
-                FieldAction("Wstrzymaj się", "Bezpieczna decyzja, ale bez efektów.", "vote_abstain")
-            ]),
-            Field("Ministerstwo Finansów", "Masz okazję zdobyć dodatkowe fundusze!", [
-                FieldAction("Złóż wniosek o dotację", "Otrzymujesz 20 000 zł na swoją kampanię!", "grant_money"),
-                FieldAction("Zignoruj dotację", "Twoja reputacja pozostaje czysta, ale nic nie zyskujesz.", "ignore_grant")
-            ]),
-            Field("Debata Telewizyjna", "Zmierzasz się w debacie politycznej!", [
-                FieldAction("Mów mądrze", "Twoje argumenty przekonują wyborców. +15% popularności", "smart_speech"),
-                FieldAction("Atakuj przeciwnika", "Twoja partia zyskuje, ale media są przeciw tobie. +10 wpływów, -5% popularności", "attack_opponent"),
-                FieldAction("Unikaj tematu", "Ludzie uznają cię za nudnego. -5% popularności", "dodge_question")
-            ]),
-            Field("Afera Korupcyjna", "Dziennikarze śledczy znaleźli podejrzane powiązania!", [
-                FieldAction("Zaprzeczaj wszystkiemu", "Niektórzy ci wierzą, ale ryzyko pozostaje. -10% popularności", "deny_scandal"),
-                FieldAction("Przyznaj się i przeproś", "Ludzie cenią szczerość. -10 000 zł, ale +5% popularności", "admit_scandal"),
-                FieldAction("Zrzuć winę na asystenta", "Tracisz wpływy, ale unikasz kary. -10 wpływów", "blame_assistant")
-            ]),
-            Field("Protest Wyborców", "Ludzie niezadowoleni z twoich decyzji zbierają się pod Sejmem!", [
-                FieldAction("Wyjdź do protestujących", "Pokazujesz ludzką twarz. +10% popularności", "support_protesters"),
-                FieldAction("Ignoruj protest", "Ludzie są wściekli. -15% popularności", "ignore_protest"),
-                FieldAction("Wezwij policję", "Opozycja oskarża cię o brutalność. -5% popularności, ale +10 wpływów", "call_police")
-            ]),
-            Field("Dziennikarze Śledczy", "Media badają twoją przeszłość!", [
-                FieldAction("Opublikuj własny artykuł", "Kontrolujesz narrację, ale kosztuje to 5000 zł", "publish_article"),
-                FieldAction("Nie komentuj", "Ryzykujesz, że sprawa urośnie w skandal.", "silent_mode"),
-                FieldAction("Zatrudnij doradcę PR", "Za 15 000 zł ratujesz swoją reputację. +10% popularności", "hire_PR")
-            ]),
-            Field("Komisja Śledcza", "Jesteś wezwany przed komisję sejmową!", [
-                FieldAction("Współpracuj", "Zyskujesz sympatię wyborców. +5% popularności", "cooperate"),
-                FieldAction("Matacz", "Nie dają ci spokoju. -5% popularności, ale +10 wpływów", "manipulate"),
-                FieldAction("Zostań świadkiem koronnym", "Zdradzasz kolegów z partii! +20% popularności, -20 wpływów", "whistleblower")
-            ]),
-            Field("Lobbyści", "Wpływowe osoby oferują wsparcie...", [
-                FieldAction("Przyjmij ofertę", "Zyskujesz 50 000 zł, ale ryzykujesz skandal.", "accept_lobby"),
-                FieldAction("Odrzuć propozycję", "Zachowujesz honor, ale nic nie zyskujesz.", "reject_lobby"),
-            ]),
-            Field("Media Społecznościowe", "Twoje konto na Twitterze eksplodowało!", [
-                FieldAction("Zamieść błyskotliwy tweet", "Zyskujesz 15% popularności", "post_tweet"),
-                FieldAction("Wejdź w konflikt", "Zwiększasz wpływy, ale tracisz fanów. +10 wpływów, -5% popularności", "twitter_fight")
-            ]),
-            Field("Wybory", "Czas na sprawdzian twoich rządów!", [
-                FieldAction("Prowadź kampanię", "Kosztuje 10 000 zł, ale daje 20% popularności", "election_campaign"),
-                FieldAction("Zaufaj wyborcom", "Brak kosztów, ale ryzykujesz przegraną.", "trust_people")
-            ]),
-            Field("Kantyna", "Możesz kupić przydatne przedmioty", [
-                FieldAction("Kup przedmiot", "Wydaj budżet na pomocne narzędzia", "buy_item")
-            ]),
-        ]
-        
     def handle_field_action(self, player, action_type):
         field = self.board[player.position]
         for action in field.actions:
@@ -219,51 +757,77 @@ class GameEngine:
         return "Brak efektu"
 
     def apply_action_effect(self, player, action_type):
-        effects = {
-            "vote_for": ["Twoja partia jest zadowolona. +10 wpływów"],
-            "vote_against": ["Masz odwagę, ale nie wszystkim się to podoba. +5% popularności, -5 wpływów"],
-            "smart_speech": ["Twoje argumenty przekonały wyborców. +15% popularności"],
-            "attack_opponent": ["Zyskujesz wpływy, ale media krytykują. +10 wpływów, -5% popularności"],
-            "grant_money": ["Dotacja zatwierdzona! +20 000 zł"],
-            "deny_scandal": ["Próbujesz się bronić. -10% popularności"],
-            "admit_scandal": ["Ludzie doceniają twoją szczerość. -10 000 zł, ale +5% popularności"],
-            "blame_assistant": ["Unikasz kary, ale ludzie ci nie ufają. -10 wpływów"],
-            "support_protesters": ["Pokazujesz, że słuchasz wyborców. +10% popularności"],
-            "call_police": ["Używasz siły. +10 wpływów, -5% popularności"],
-            "publish_article": ["Media idą za twoją narracją. -5000 zł, ale +10% popularności"],
-            "whistleblower": ["Zdobywasz sympatię wyborców, ale tracisz kontakty. +20% popularności, -20 wpływów"],
-            "post_tweet": ["Twoje konto wybucha popularnością! +15% popularności"],
-            "twitter_fight": ["Media się tobą interesują. +10 wpływów, -5% popularności"],
-            "election_campaign": ["Inwestujesz w kampanię. -10 000 zł, ale +20% popularności"],
-            "buy_coffee": ["Kofeina działa! -200 zł, +2% popularności"],
-            "receive_diet": ["Pobierasz dietę poselską +20 000 zł"]
-        }
-        effect = random.choice(effects.get(action_type, ["Brak efektu"]))
+        variants = self.effects.get(action_type)
+        effect = self.rng.choice(variants) if variants else NO_EFFECT
         self.apply_effect(player, effect)
-        return effect
-      
-    
+        return effect.text
+
     def apply_effect(self, player, effect):
-        effects = effect.split(", ")
-        for single_effect in effects:
-            value = extract_number(single_effect)
-            
-            if "popularności" in single_effect:
-                player.popularity = min(100, player.popularity + value if "+" in single_effect else player.popularity - value)
-            elif "zł" in single_effect:
-                player.budget += value * 1000 if "+" in single_effect else -value * 1000
-            elif "wpływów" in single_effect:
-                player.influence += value if "+" in single_effect else -value
-            else:
-                print(f"Nieobsłużony efekt: {effect}")  # Debugging
+        effect.apply(player)
 
     def add_player(self, player):
+        player.item_bits = self.rules.item_bits
         self.players[player.id] = player
+        self.turns.add(player.id)
+
+    def remove_player(self, player_id):
+        if player_id == self.current_turn:
+            self.reset_roll()
+        self.turns.remove(player_id)
+        if self.confrontation and player_id in self.confrontation['players']:
+            self.confrontation['players'].remove(player_id)
+            self.confrontation['rolls'].pop(player_id, None)
+        return self.players.pop(player_id, None)
+
+    def rebind_player(self, old_id, new_id):
+        player = self.players.pop(old_id)
+        player.id = new_id
+        self.players[new_id] = player
+        self.turns.replace(old_id, new_id)
+        duel = self.confrontation
+        if duel and old_id in duel['players']:
+            duel['players'][duel['players'].index(old_id)] = new_id
+            if old_id in duel['rolls']:
+                duel['rolls'][new_id] = duel['rolls'].pop(old_id)
+        return player
+
+    def clear_players(self):
+        self.players = {}
+        self.turns = TurnRing()
+
+    # Zapis stanu do trwałego magazynu; plansza i katalog są wspólne, więc zapisujemy tylko wersję zasad
+    def to_dict(self):
+        return {
+            'rules_version': self.rules.version,
+            'players': [player.to_dict() for player in self.players.values()],
+            'turn_order': list(self.turns),
+            'current_turn': self.current_turn,
+            'pending_roll': self.pending_roll,
+            'turn_rolled': self.turn_rolled,
+            'confrontation': self.confrontation,
+            'voting': self.voting
+        }
+
+    @classmethod
+    def from_dict(cls, data, rng=None):
+        engine = cls(rng=rng, rules=rules_for_version(data.get('rules_version')))
+        for player_data in data['players']:
+            engine.add_player(Player.from_dict(player_data))
+        if 'turn_order' in data:
+            engine.turns = TurnRing(data['turn_order'], data['current_turn'])
+        else:
+            engine.current_turn = data['current_turn']
+        engine.voting = data['voting']
+        engine.pending_roll = data.get('pending_roll')
+        engine.turn_rolled = data.get('turn_rolled', False)
+        engine.confrontation = data.get('confrontation')
+        return engine
         
     def initialize_game(self):
-        # self.current_turn = 0
-        self.current_turn = list(self.players.keys())[0]
-        print(f"DEBUG: Dostępne przedmioty w kantynie: {self.items}")
+        self.reset_roll()
+        self.confrontation = None
+        self.turns.start()
+        logger.debug("Dostępne przedmioty w kantynie: %s", self.items)
 
         
     def move_player(self, player_id, steps):
@@ -274,56 +838,17 @@ class GameEngine:
         self.next_turn()
         return effect
     
-    def next_turn(self):
-        player_ids = list(self.players.keys())  # Pobieramy listę ID graczy
-        current_index = player_ids.index(self.current_turn)  # Znajdujemy obecnego gracza
-
-        # Zmiana tury na następnego gracza (z pętlą cykliczną)
-        next_index = (current_index + 1) % len(player_ids)
-        self.current_turn = player_ids[next_index]
-
-        print(f"Tura gracza: {self.players[self.current_turn].name}")  # Debugowanie
-
     def handle_field_effect(self, player):
         field = self.board[player.position]
-        effect = None
-
-        if field.type == 'Start':  # ✅ Poprawione
-            player.budget += 10000
-            effect = "+10 000 zł"
-        elif field.type == 'Afera':
-            effect = self.draw_scandal_card(player)
-        elif field.type == 'Media':
-            player.popularity = min(100, player.popularity + 10)
-            effect = "+10% popularności"
-        # elif field.type == 'Komisja':
-        #     player.position = (player.position + 3) % len(self.board)
-        #     effect = "Przesunięcie o 3 pola"
-        #     subsequent_effect = self.handle_field_effect(player)
-        #     if subsequent_effect:
-        #         effect += " oraz " + subsequent_effect
-        return effect
+        variants = self.field_effects.get(field.type)
+        if not variants:
+            return None
 
-    def draw_scandal_card(self, player):
-        scandals = [
-            "Ujawniono tajne spotkania! -15% popularności",
-            "Fałszywe oświadczenie majątkowe! -30k zł",
-            "Konflikt interesów! -10 wpływów",
-            "Hulanka w rządzie! +20% popularności"
-        ]
-        effect = random.choice(scandals)
-
-        if "-%" in effect:
-            value = extract_number(effect)
-            player.popularity = max(0, player.popularity - value)
-        elif "k zł" in effect:
-            value = extract_number(effect)
-            player.budget -= value * 1000
-        elif "wpływów" in effect:
-            value = extract_number(effect)
-            player.influence = max(0, player.influence - value)
-        elif "+%" in effect:
-            value = extract_number(effect)
-            player.popularity = min(100, player.popularity + value)
+        effect = self.rng.choice(variants)
+        effect.apply(player)
+        return effect.text
 
-        return effect
+    def draw_scandal_card(self, player):
+        effect = self.rng.choice(self.scandal_cards)
+        effect.apply(player)
+        return effect.text
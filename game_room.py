@@ -0,0 +1,385 @@
+import random
+import secrets
+import time
+from collections import deque
+
+from game_logic import GameEngine, Player, rules_for_version
+
+RECENT_UPDATES = 32
+
+class GameRoom:  
+    def __init__(self, code, host_name, rules=None, seed=None, turn_timeout=None, confrontation_timeout=None):  
+        self.code = code  
+        # Dziennik przyjętych akcji [rodzaj, *argumenty]; gracze po numerach miejsc (seats).
+        # Każde zdarzenie losuje z generatora ustawionego na ziarno pokoju + numer zdarzenia, więc
+        # stanu generatora nie trzeba zapisywać, a replay() od dowolnego miejsca daje te same wyniki.
+        self.seed = secrets.randbits(64) if seed is None else seed
+        self.events = []
+        # W magazynie współdzielonym dziennik jest dopisywany przyrostowo (storage.py): pokój odczytany ze stanu
+        # trzyma tylko zdarzenia od numeru event_base, wcześniejsze doczytuje event_source(kod, liczba) dopiero
+        # wtedy, gdy potrzebny jest cały dziennik (event_log); events_saved - ile zdarzeń jest już w magazynie
+        self.event_base = 0
+        self.event_source = None
+        self.events_saved = 0
+        self.rng = random.Random()
+        self.game_engine = GameEngine(rng=self.rng, rules=rules)  
+        self.status = "lobby"  
+        self.host_name = host_name  
+        self.host_id = None  
+        # Wersjonowany stan: klienci dostają tylko zmienione pola graczy
+        self.state_version = 0
+        self.player_snapshots = {}
+        self.last_activity = time.time()
+        # Ostatnie zmiany (wersja, zmienieni gracze, usunięci) - do wznowienia po utracie połączenia
+        self.recent_updates = deque(maxlen=RECENT_UPDATES)
+        # Klucz sesji (z podpisanego tokenu) -> sid gracza oraz sid -> klucz
+        self.sessions = {}
+        self.session_keys = {}
+        # sid rozłączonych graczy -> czas, do którego trzymamy ich miejsce i turę
+        self.disconnected = {}
+        # sid -> stały numer miejsca gracza (zwarty format game_update); po przepięciu stare sid zostaje
+        self.seats = {}
+        # Limity czasu pokoju w sekundach (None - domyślne serwera, 0 - bez limitu) i licznik zmian tury,
+        # po którym terminy tury rozpoznają, czy tura się jeszcze nie zmieniła
+        self.turn_timeout = turn_timeout
+        self.confrontation_timeout = confrontation_timeout
+        self.turn_number = 0
+        # Tury zakończone z rzędu przez upływ czasu, bez żadnej akcji graczy
+        self.timed_out_turns = 0
+        # Wersja pokoju w magazynie współdzielonym, w której go odczytano (storage.py, zapis warunkowy)
+        self.store_version = 0
+
+    def touch(self):
+        self.last_activity = time.time()
+
+    @property
+    def event_count(self):
+        return self.event_base + len(self.events)
+
+    def record(self, kind, *args):
+        self.rng.seed(self.seed | (self.event_count << 64))
+        self.events.append([kind, *args])
+
+    def event_log(self):
+        if self.event_base:
+            self.events = self.event_source(self.code, self.event_base) + self.events
+            self.event_base = 0
+        return self.events
+
+    def unsaved_events(self):
+        return self.events[self.events_saved - self.event_base:]
+
+    def seat_player(self, seat):
+        # Obecne sid gracza na danym miejscu (po przepięciu stare sid też wskazuje to miejsce)
+        return next(player_id for player_id, player_seat in self.seats.items()
+                    if player_seat == seat and player_id in self.game_engine.players)
+
+    @property
+    def players(self):
+        # Gracze w kolejności tur; kolejka tur silnika jest jedynym źródłem prawdy
+        return self.game_engine.turns
+
+    @property
+    def current_player(self):
+        return self.game_engine.current_turn
+
+    def next_turn(self):
+        # Rozłączeni gracze nie dostają nowych tur, dopóki nie wrócą
+        self.record('next')
+        self.turn_number += 1
+        return self.game_engine.next_turn(skip=self.disconnected)
+
+    def start_game(self):
+        self.record('start')
+        self.turn_number += 1
+        self.status = "in_progress"
+        self.game_engine.initialize_game()
+
+    def roll_dice(self, player_id):
+        engine = self.game_engine
+        if engine.pending_roll is None:
+            if engine.turn_rolled:
+                return None
+            self.record('roll', self.seats[player_id])
+        return engine.roll_dice(player_id)
+
+    def move_player(self, player_id, position):
+        # (czy ruch przyjęty, efekt pola)
+        if not self.game_engine.move_to(player_id, position):
+            return False, None
+        self.record('move', self.seats[player_id], position)
+        return True, self.game_engine.handle_field_effect(self.game_engine.players[player_id])
+
+    def field_action(self, player_id, action_type):
+        self.record('act', self.seats[player_id], action_type)
+        return self.game_engine.handle_field_action(self.game_engine.players[player_id], action_type)
+
+    def buy_item(self, player_id, item_name):
+        self.record('buy', self.seats[player_id], item_name)
+        return self.game_engine.buy_item(player_id, item_name)
+
+    def start_confrontation(self, player_id, deadline):
+        # Bez losowania, więc zdarzenie zapisujemy dopiero, gdy konfrontacja się zaczęła
+        players = self.game_engine.start_confrontation(player_id, deadline)
+        if players:
+            self.record('dstart', self.seats[player_id], deadline)
+        return players
+
+    def confrontation_roll(self, player_id):
+        duel = self.game_engine.confrontation
+        if not duel or player_id not in duel['players'] or player_id in duel['rolls']:
+            return None
+        self.record('droll', self.seats[player_id])
+        return self.game_engine.confrontation_roll(player_id)
+
+    def resolve_confrontation(self):
+        # Wynik konfrontacji; jej inicjator (gracz z turą) kończy na tym turę
+        duel = self.game_engine.confrontation
+        if not duel:
+            return None
+        self.record('duel')
+        result = self.game_engine.resolve_confrontation()
+        if duel['players'] and duel['players'][0] == self.current_player:
+            self.turn_number += 1
+            self.game_engine.next_turn(skip=self.disconnected)
+        return result
+
+    def mark_disconnected(self, player_id, deadline):
+        self.record('away', self.seats[player_id], deadline)
+        self.disconnected[player_id] = deadline
+
+    def add_player(self, player_id, name, avatar, key=None):  
+        key = key or secrets.token_urlsafe(12)
+        # Klucz sesji nie trafia do dziennika (archiwum, replay.py) - zapisy pokoju niosą go w 'sessions'
+        self.record('join', player_id, name, avatar)
+        player = Player(player_id, name, avatar)  
+        self.game_engine.add_player(player)  
+
+        if name == self.host_name and not self.host_id:  
+            self.host_id = player_id  
+
+        self.sessions[key] = player_id
+        self.session_keys[player_id] = key
+        self.seats[player_id] = len(self.seats)
+        return player
+
+    def remove_player(self, player_id):
+        if player_id in self.seats:
+            self.record('leave', self.seats[player_id])
+        self.game_engine.remove_player(player_id)
+        key = self.session_keys.pop(player_id, None)
+        self.sessions.pop(key, None)
+        self.disconnected.pop(player_id, None)
+
+    def player_for_session(self, key):
+        return self.sessions.get(key)
+
+    def rebind_player(self, old_id, new_id):
+        # Gracz wrócił z nowym połączeniem - przepinamy go na nowe sid
+        self.record('rebind', self.seats[old_id], new_id)
+        player = self.game_engine.rebind_player(old_id, new_id)
+        if player.name == self.host_name:
+            self.host_id = new_id
+        key = self.session_keys.pop(old_id, None)
+        if key:
+            self.sessions[key] = new_id
+            self.session_keys[new_id] = key
+        self.disconnected.pop(old_id, None)
+        if old_id in self.seats:
+            self.seats[new_id] = self.seats[old_id]
+        return player
+
+    def serialize_player(self, player):
+        return {
+            **player.serialize(),
+            'is_host': (player.name == self.host_name),
+            'connected': player.id not in self.disconnected
+        }
+
+    def serialize_players(self):
+        return [self.serialize_player(p) for p in self.game_engine.players.values()]
+
+    def players_delta(self):
+        changed = {}
+        snapshots = {}
+        for p in self.game_engine.players.values():
+            current = self.serialize_player(p)
+            previous = self.player_snapshots.get(p.id)
+            if previous is None:
+                changed[p.id] = current
+            else:
+                diff = {key: value for key, value in current.items() if previous.get(key) != value}
+                if diff:
+                    changed[p.id] = diff
+            snapshots[p.id] = current
+
+        removed = [player_id for player_id in self.player_snapshots if player_id not in snapshots]
+        self.player_snapshots = snapshots
+        self.state_version += 1
+        self.recent_updates.append((self.state_version, changed, removed))
+        return changed, removed
+
+    def delta_since(self, version):
+        # Połączone zmiany od wersji klienta; None, gdy nie mamy już tej historii
+        if version == self.state_version:
+            return {}, []
+        if not self.recent_updates or version is None or not self.recent_updates[0][0] <= version + 1 <= self.state_version:
+            return None
+        changed, removed = {}, set()
+        for update_version, update_changed, update_removed in self.recent_updates:
+            if update_version <= version:
+                continue
+            for player_id in update_removed:
+                changed.pop(player_id, None)
+                removed.add(player_id)
+            for player_id, fields in update_changed.items():
+                removed.discard(player_id)
+                changed.setdefault(player_id, {}).update(fields)
+        return changed, sorted(removed)
+
+    def game_update(self, **extra):
+        self.record('update')
+        changed, removed = self.players_delta()
+        return {
+            'version': self.state_version,
+            'players': changed,
+            'removed': removed,
+            'current_player': self.current_player,
+            **extra
+        }
+
+    def seat_map(self):
+        return {player_id: self.seats[player_id] for player_id in self.players if player_id in self.seats}
+
+    def full_state(self, include_board=False):
+        state = {
+            'status': self.status,
+            'version': self.state_version,
+            'players': self.serialize_players(),
+            'current_player': self.current_player,
+            'board_hash': self.game_engine.board_hash,
+            'items_hash': self.game_engine.items_static.etag,
+            'game_code': self.code,
+            'seats': self.seat_map(),
+            'item_names': self.game_engine.rules.item_names
+        }
+        if include_board:
+            state['board'] = self.game_engine.board_payload
+        return state
+
+    def to_dict(self):
+        return {
+            'code': self.code,
+            'host_name': self.host_name,
+            'host_id': self.host_id,
+            'status': self.status,
+            'state_version': self.state_version,
+            'player_snapshots': self.player_snapshots,
+            'last_activity': self.last_activity,
+            'recent_updates': list(self.recent_updates),
+            'sessions': self.sessions,
+            'disconnected': self.disconnected,
+            'seats': self.seats,
+            'seed': self.seed,
+            'event_count': self.event_count,
+            'turn_timeout': self.turn_timeout,
+            'confrontation_timeout': self.confrontation_timeout,
+            'turn_number': self.turn_number,
+            'timed_out_turns': self.timed_out_turns,
+            'engine': self.game_engine.to_dict()
+        }
+
+    def log_dict(self, events=True):
+        # Sam dziennik: stan pokoju odtwarza replay(); events=False - nagłówek bez zdarzeń (storage.py)
+        data = {
+            'code': self.code,
+            'host_name': self.host_name,
+            'rules_version': self.game_engine.rules.version,
+            'seed': self.seed,
+            'event_count': self.event_count,
+            'sessions': self.sessions,
+            'turn_timeout': self.turn_timeout,
+            'confrontation_timeout': self.confrontation_timeout,
+            'timed_out_turns': self.timed_out_turns,
+            'last_activity': self.last_activity
+        }
+        if events:
+            data['events'] = self.event_log()
+        return data
+
+    def apply_event(self, event):
+        kind, args = event[0], event[1:]
+        if kind == 'join':
+            self.add_player(*args)
+        elif kind == 'start':
+            self.start_game()
+        elif kind == 'next':
+            self.next_turn()
+        elif kind == 'update':
+            self.game_update()
+        elif kind == 'rebind':
+            self.rebind_player(self.seat_player(args[0]), args[1])
+        elif kind == 'duel':
+            self.resolve_confrontation()
+        else:
+            player_id = self.seat_player(args[0])
+            if kind == 'leave':
+                self.remove_player(player_id)
+            elif kind == 'away':
+                self.mark_disconnected(player_id, args[1])
+            elif kind == 'roll':
+                self.roll_dice(player_id)
+            elif kind == 'move':
+                self.move_player(player_id, args[1])
+            elif kind == 'act':
+                self.field_action(player_id, args[1])
+            elif kind == 'buy':
+                self.buy_item(player_id, args[1])
+            elif kind == 'dstart':
+                self.start_confrontation(player_id, args[1])
+            elif kind == 'droll':
+                self.confrontation_roll(player_id)
+            else:
+                raise ValueError(f"Nieznane zdarzenie w dzienniku: {kind}")
+
+    @classmethod
+    def replay(cls, data, upto=None):
+        # Odtwarza pokój z ziarna i dziennika; upto - liczba zdarzeń do odtworzenia (migawka z przeszłości)
+        room = cls(data['code'], data['host_name'], rules_for_version(data.get('rules_version')), data['seed'],
+                   data.get('turn_timeout'), data.get('confrontation_timeout'))
+        room.fast_forward(data['events'][:upto])
+        room.last_activity = data.get('last_activity', room.last_activity)
+        room.timed_out_turns = data.get('timed_out_turns', 0) if upto is None else 0
+        if 'sessions' in data and upto is None:
+            room.sessions = dict(data['sessions'])
+            room.session_keys = {player_id: key for key, player_id in room.sessions.items()}
+        return room
+
+    def fast_forward(self, events):
+        for event in events:
+            self.apply_event(event)
+
+    @classmethod
+    def from_dict(cls, data):
+        if 'engine' not in data:
+            return cls.replay(data)
+        room = cls(data['code'], data['host_name'], seed=data.get('seed'), turn_timeout=data.get('turn_timeout'),
+                   confrontation_timeout=data.get('confrontation_timeout'))
+        room.turn_number = data.get('turn_number', 0)
+        room.timed_out_turns = data.get('timed_out_turns', 0)
+        room.game_engine = GameEngine.from_dict(data['engine'], rng=room.rng)
+        if 'events' in data:
+            room.events = list(data['events'])
+        else:
+            room.event_base = data.get('event_count', 0)
+        room.host_id = data['host_id']
+        room.status = data['status']
+        room.state_version = data['state_version']
+        room.player_snapshots = data['player_snapshots']
+        room.last_activity = data.get('last_activity', room.last_activity)
+        room.recent_updates.extend(tuple(update) for update in data.get('recent_updates', ()))
+        room.sessions = dict(data.get('sessions', {}))
+        room.session_keys = {player_id: key for key, player_id in room.sessions.items()}
+        room.disconnected = dict(data.get('disconnected', {}))
+        room.seats = dict(data.get('seats') or {player_id: seat for seat, player_id in enumerate(room.players)})
+        return room
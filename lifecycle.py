@@ -0,0 +1,230 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+
+from log_setup import log_context
+from wire import PROTOCOLS, protocol_room
+
+logger = logging.getLogger('pgame.lifecycle')
+
+# Cykl życia pokoi. Zmienne środowiskowe (w sekundach):
+#   PGAME_ROOM_EMPTY_GRACE   po tylu sekundach bez graczy pokój jest usuwany (domyślnie 60)
+#   PGAME_ROOM_IDLE_TIMEOUT  pokój bez żadnej aktywności jest zamykany (domyślnie 2 h)
+#   PGAME_LOBBY_IDLE         lobby nieaktywne dłużej może zostać wyparte przy limicie pokoi (domyślnie 300)
+#   PGAME_MAX_ROOMS          limit pokoi w procesie (domyślnie 1000)
+#   PGAME_ARCHIVE            plik JSON Lines na wyniki zamkniętych gier (bez niego tylko ostatnie w pamięci)
+
+RECENT_ARCHIVE = 100
+
+
+def current_rss():
+    # Bieżąca pamięć rezydentna procesu w bajtach (Linux); None, gdy niedostępna
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class RoomLifecycle:
+    def __init__(self, store, queues, socketio, lobby_index, empty_grace=60, idle_timeout=7200,
+                 lobby_idle=300, max_rooms=1000, sweep_interval=15, archive_path=None):
+        self.store = store
+        self.queues = queues
+        self.socketio = socketio
+        self.lobby_index = lobby_index
+        self.empty_grace = empty_grace
+        self.idle_timeout = idle_timeout
+        self.lobby_idle = lobby_idle
+        self.max_rooms = max_rooms
+        self.sweep_interval = sweep_interval
+        self.archive_path = archive_path
+        self.lock = threading.Lock()
+        # kod -> (ostatnia aktywność, status, liczba graczy), od najdawniej aktywnego
+        self.activity = OrderedDict()
+        self.evicted = Counter()
+        self.archived = 0
+        self.recent = deque(maxlen=RECENT_ARCHIVE)
+        self.started = False
+
+    @classmethod
+    def from_env(cls, store, queues, socketio, lobby_index):
+        return cls(
+            store, queues, socketio, lobby_index,
+            empty_grace=float(os.environ.get('PGAME_ROOM_EMPTY_GRACE', 60)),
+            idle_timeout=float(os.environ.get('PGAME_ROOM_IDLE_TIMEOUT', 7200)),
+            lobby_idle=float(os.environ.get('PGAME_LOBBY_IDLE', 300)),
+            max_rooms=int(os.environ.get('PGAME_MAX_ROOMS', 1000)),
+            archive_path=os.environ.get('PGAME_ARCHIVE'),
+        )
+
+    def load(self, rooms):
+        with self.lock:
+            for room in sorted(rooms, key=lambda room: room.last_activity):
+                self.activity[room.code] = (room.last_activity, room.status, len(room.players))
+
+    def touch(self, room, active=True):
+        # active=False - zapis bez udziału graczy (terminy z koła czasowego) nie odracza zamknięcia pokoju
+        if active:
+            room.touch()
+        with self.lock:
+            self.activity[room.code] = (room.last_activity, room.status, len(room.players))
+            if active:
+                self.activity.move_to_end(room.code)
+
+    def forget(self, code):
+        with self.lock:
+            self.activity.pop(code, None)
+
+    def sweep_candidates(self, now):
+        # Zajęte pokoje sprawdzamy dopiero po idle_timeout; puste i zakończone już po empty_grace.
+        # Wybór z samego indeksu, bez odczytu pokoi z magazynu
+        empty_before, idle_before = now - self.empty_grace, now - self.idle_timeout
+        with self.lock:
+            codes = []
+            for code, (last_activity, status, players) in self.activity.items():
+                if last_activity > max(empty_before, idle_before):
+                    break
+                if last_activity <= idle_before or not players or status == 'finished':
+                    codes.append(code)
+            return codes
+
+    def oldest(self, before):
+        with self.lock:
+            codes = []
+            for code, (last_activity, status, players) in self.activity.items():
+                if last_activity > before:
+                    break
+                codes.append(code)
+            return codes
+
+    def start(self):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        if self.socketio.async_mode == 'threading':
+            # Wątek demona, żeby nie blokował zamknięcia procesu
+            threading.Thread(target=self.run, name='room-lifecycle', daemon=True).start()
+        else:
+            self.socketio.start_background_task(self.run)
+
+    def run(self):
+        while True:
+            self.socketio.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Błąd porządkowania pokoi")
+
+    def sweep(self, now=None):
+        now = now or time.time()
+        # Pokoje są uporządkowane od najdawniej aktywnego, więc sprawdzamy tylko początek listy
+        for code in self.sweep_candidates(now):
+            with self.queues.serialized(code):
+                room = self.store.get_room(code)
+                if room is None:
+                    self.forget(code)
+                    continue
+                idle = now - room.last_activity
+                if room.status == 'finished':
+                    self.evict(room, 'finished')
+                elif not room.players and idle >= self.empty_grace:
+                    self.evict(room, 'empty')
+                elif idle >= self.idle_timeout:
+                    self.evict(room, 'idle')
+
+    def ensure_capacity(self, now=None):
+        # Przy limicie wypieramy najdawniej aktywne, bezczynne lobby; False - brak miejsca
+        now = now or time.time()
+        if len(self.activity) < self.max_rooms:
+            return True
+        for code in self.oldest(now - self.lobby_idle):
+            with self.queues.serialized(code):
+                room = self.store.get_room(code)
+                if room is None:
+                    self.forget(code)
+                elif room.status == 'lobby':
+                    self.evict(room, 'capacity')
+            if len(self.activity) < self.max_rooms:
+                return True
+        return False
+
+    def evict(self, room, reason):
+        if room.status != 'lobby' and room.game_engine.players:
+            self.archive(room, reason)
+        self.socketio.emit('room_closed', {'game_code': room.code, 'reason': reason}, to=room.code)
+        self.socketio.close_room(room.code)
+        for protocol in PROTOCOLS:
+            self.socketio.close_room(protocol_room(room.code, protocol))
+        for sid in room.players:
+            self.store.delete_player(sid)
+        self.store.delete_room(room.code)
+        self.lobby_index.remove(room.code)
+        self.forget(room.code)
+        with self.lock:
+            self.evicted[reason] += 1
+        logger.info("Usunięto pokój (%s)", reason, extra=log_context('evict', room.code))
+
+    def archive(self, room, reason):
+        record = {
+            'code': room.code,
+            'status': room.status,
+            'reason': reason,
+            'archived_at': time.time(),
+            'last_activity': room.last_activity,
+            'version': room.state_version,
+            'players': [
+                {
+                    'name': p.name,
+                    'popularity': p.popularity,
+                    'influence': p.influence,
+                    'budget': p.budget,
+                    'items': p.items,
+                }
+                for p in room.game_engine.players.values()
+            ],
+            # Z ziarna i dziennika GameRoom.replay() odtworzy całą rozgrywkę (replay.py)
+            'rules_version': room.game_engine.rules.version,
+            'host_name': room.host_name,
+            'seed': room.seed,
+            'events': room.event_log(),
+        }
+        with self.lock:
+            self.recent.append(record)
+            self.archived += 1
+            if self.archive_path:
+                with open(self.archive_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def stats(self):
+        with self.lock:
+            statuses = Counter(status for _, status, _ in self.activity.values())
+            players = sum(count for _, _, count in self.activity.values())
+            return {
+                'rooms': len(self.activity),
+                'max_rooms': self.max_rooms,
+                'rooms_by_status': dict(statuses),
+                'players': players,
+                'evicted': dict(self.evicted),
+                'archived': self.archived,
+                'rss_bytes': current_rss(),
+            }
+
+    def prometheus(self):
+        stats = self.stats()
+        lines = ['# TYPE pgame_rooms gauge']
+        lines.extend(f'pgame_rooms{{status="{status}"}} {count}' for status, count in sorted(stats['rooms_by_status'].items()))
+        lines.append('# TYPE pgame_room_players gauge')
+        lines.append(f"pgame_room_players {stats['players']}")
+        lines.append('# TYPE pgame_rooms_evicted_total counter')
+        lines.extend(f'pgame_rooms_evicted_total{{reason="{reason}"}} {count}' for reason, count in sorted(stats['evicted'].items()))
+        lines.append('# TYPE pgame_rooms_archived_total counter')
+        lines.append(f"pgame_rooms_archived_total {stats['archived']}")
+        if stats['rss_bytes'] is not None:
+            lines.append('# TYPE pgame_process_resident_memory_bytes gauge')
+            lines.append(f"pgame_process_resident_memory_bytes {stats['rss_bytes']}")
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,377 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# Klienci testowi grają bez przerw między zdarzeniami - limity zdarzeń (admission.py) wyłączamy,
+# chyba że ustawiono je jawnie
+os.environ.setdefault('PGAME_RATE_LIMIT', '0')
+
+from app import app, room_rules, socketio
+from batching import BATCH_EVENT
+from wire import PROTOCOLS, decode_game_update
+
+# Test obciążeniowy: wiele pokoi z klientami testowymi Socket.IO przechodzi pełny przebieg gry
+# w jednym procesie, bez sieci. Wynik: zdarzenia/s, p50/p99 opóźnienia per typ zdarzenia
+# i liczba bajtów rozesłanych do klientów. --protocol msgpack: klienci odbierają zwarty game_update,
+# --batch: wiadomości z jednego zdarzenia przychodzą w jednej kopercie 'batch'.
+# --idle N --url http://host:port: N bezczynnych połączeń WebSocket (lista gier w lobby) do działającego
+# serwera i przyrost jego pamięci (z /metrics) na połączenie; wymaga pakietu aiohttp.
+
+FULL_STATE_EVENTS = ('room_state', 'game_started', 'game_state', 'game_resumed')
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.received_bytes = defaultdict(int)
+        self.received_count = defaultdict(int)
+        self.errors = defaultdict(int)
+
+    def latency(self, label, seconds):
+        with self.lock:
+            self.latencies[label].append(seconds)
+
+    def received(self, packets):
+        with self.lock:
+            for packet in packets:
+                args = packet['args']
+                if packet['name'] == BATCH_EVENT:
+                    # Liczymy dane jak w osobnych wiadomościach, żeby wyniki z --batch i bez dało się porównać
+                    size = sum(len(data) if isinstance(data, bytes) else payload_size([data]) for _, data in args[0])
+                elif args and isinstance(args[0], bytes):
+                    size = len(args[0])
+                else:
+                    size = payload_size(args)
+                self.received_bytes[packet['name']] += size
+                self.received_count[packet['name']] += 1
+                if packet['name'] == 'error':
+                    self.errors[packet['args'][0].get('message', '?')] += 1
+
+
+def payload_size(args):
+    # JSON plus załączniki binarne (game_update w MessagePack wewnątrz koperty)
+    attachments = []
+
+    def attach(value):
+        if isinstance(value, bytes):
+            attachments.append(len(value))
+            return None
+        raise TypeError(f"{type(value).__name__} nie jest serializowalny")
+    return len(json.dumps(args, ensure_ascii=False, default=attach).encode('utf-8')) + sum(attachments)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class SimulatedPlayer:
+    def __init__(self, name, recorder, protocol='json', batch=False):
+        self.name = name
+        self.recorder = recorder
+        self.client = socketio.test_client(app)
+        self.id = None
+        self.seat_ids = {}
+        self.item_names = []
+        if protocol != 'json' or batch:
+            self.client.emit('set_protocol', {'protocol': protocol, 'batch': batch}, callback=True)
+
+    def emit(self, label, event, *args):
+        started = time.perf_counter()
+        self.client.emit(event, *args)
+        self.recorder.latency(label, time.perf_counter() - started)
+
+    def receive(self):
+        received = self.client.get_received()
+        self.recorder.received(received)
+        packets = []
+        for packet in received:
+            if packet['name'] == BATCH_EVENT:
+                packets.extend({'name': event, 'args': [data], 'namespace': packet.get('namespace')}
+                               for event, data in packet['args'][0])
+            else:
+                packets.append(packet)
+        for packet in packets:
+            self.decode(packet)
+        return packets
+
+    def decode(self, packet):
+        # Zwarte wiadomości zamieniamy z powrotem na postać JSON, żeby przebieg gry był ten sam
+        args = packet['args']
+        if packet['name'] in FULL_STATE_EVENTS and 'seats' in args[0]:
+            self.seat_ids.update({seat: player_id for player_id, seat in args[0]['seats'].items()})
+            self.item_names = args[0].get('item_names', self.item_names)
+        elif packet['name'] == 'game_update' and isinstance(args[0], bytes):
+            args[0] = decode_game_update(args[0], self.seat_ids, self.item_names)
+        elif packet['name'] == 'field_actions' and 'position' in args[0]:
+            field = room_rules().board_static.data[args[0]['position']]
+            args[0] = {'fieldType': field['type'], 'actions': field['actions']}
+
+    def disconnect(self):
+        started = time.perf_counter()
+        self.client.disconnect()
+        self.recorder.latency('disconnect', time.perf_counter() - started)
+
+
+def last_args(packets, name):
+    found = [packet['args'][0] for packet in packets if packet['name'] == name]
+    return found[-1] if found else None
+
+
+def play_room(index, players_per_room, turns, recorder, rng, protocol='json', batch=False):
+    clients = [SimulatedPlayer(f"Gracz{index}_{i}", recorder, protocol, batch) for i in range(players_per_room)]
+    host = clients[0]
+
+    host.emit('create_game', 'create_game', {'name': host.name, 'avatar': '1'})
+    game_code = last_args(host.receive(), 'game_created')['game_code']
+    for client in clients[1:]:
+        client.emit('join_game', 'join_game', {'game_code': game_code, 'name': client.name, 'avatar': '2'})
+        client.receive()
+
+    host.emit('start_game', 'start_game')
+    started = last_args(host.receive(), 'game_started')
+    for client in clients[1:]:
+        client.receive()
+    by_id = {}
+    for player in started['players']:
+        client = next(c for c in clients if c.name == player['name'])
+        client.id = player['id']
+        by_id[player['id']] = client
+
+    current = started['current_player']
+    for _ in range(turns * players_per_room):
+        actor = by_id[current]
+        actor.emit('player_action:roll_dice', 'player_action', {'type': 'roll_dice'})
+        choice = last_args(actor.receive(), 'choose_move')
+        position = rng.choice(choice['possible_positions'])
+
+        actor.emit('player_action:move', 'player_action', {'type': 'move', 'new_position': position})
+        packets = actor.receive()
+        field = last_args(packets, 'field_actions')
+
+        if last_args(packets, 'confrontation_available'):
+            # Konfrontacja kończy turę gracza
+            current = play_confrontation(actor, by_id) or current
+            continue
+
+        action = rng.choice(field['actions'])['effect_type'] if field and field['actions'] else 'vote_abstain'
+        payload = {'type': 'field_action', 'action_type': action}
+        if action == 'buy_item':
+            payload['item_name'] = rng.choice(['📓 Notatnik', '📱 Telefon służbowy', '🙋 Doradca PR', '📊 Badanie opinii'])
+        actor.emit('player_action:field_action', 'player_action', payload)
+
+        turn_ended = None
+        for client in clients:
+            turn_ended = last_args(client.receive(), 'turn_ended') or turn_ended
+        if turn_ended:
+            current = turn_ended['next_player']
+
+    for client in clients:
+        client.disconnect()
+
+
+def play_confrontation(actor, by_id):
+    # Serwer rozstrzyga konfrontację po ostatnim rzucie: jeden confrontation_result i game_update
+    actor.emit('player_action:start_confrontation', 'player_action', {'type': 'start_confrontation'})
+    participants = last_args(actor.receive(), 'start_confrontation')
+    if not participants:
+        return
+    for participant in participants['players']:
+        by_id[participant['id']].emit('confrontation_roll', 'confrontation_roll')
+    result = None
+    for client in by_id.values():
+        result = last_args(client.receive(), 'confrontation_result') or result
+    return result['next_player'] if result else None
+
+
+def run(rooms, players_per_room, turns, concurrency, seed, protocol='json', batch=False):
+    recorder = Recorder()
+    random.seed(seed)
+    room_indices = iter(range(rooms))
+    indices_lock = threading.Lock()
+
+    def worker():
+        while True:
+            with indices_lock:
+                index = next(room_indices, None)
+            if index is None:
+                return
+            try:
+                play_room(index, players_per_room, turns, recorder, random.Random(seed * 100003 + index),
+                          protocol, batch)
+            except Exception as e:
+                with recorder.lock:
+                    recorder.errors[f"wyjątek klienta: {e!r}"] += 1
+
+    logging.disable(logging.CRITICAL)
+    started = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - started
+    logging.disable(logging.NOTSET)
+    return report(recorder, elapsed, rooms, players_per_room)
+
+
+async def idle_client(session, url, connected, stop):
+    # Minimalny klient Engine.IO 4 / Socket.IO 5: otwarcie, przestrzeń '/', lista gier, odpowiedzi na ping
+    async with session.ws_connect(f"{url}/socket.io/?EIO=4&transport=websocket") as ws:
+        await ws.receive()
+        await ws.send_str('40')
+        await ws.receive()
+        await ws.send_str('42["get_games_list"]')
+        connected.append(ws)
+        while not stop.is_set():
+            message = await ws.receive()
+            if message.type == aiohttp.WSMsgType.TEXT:
+                if message.data == '2':
+                    await ws.send_str('3')
+            elif message.type != aiohttp.WSMsgType.BINARY:
+                break
+        connected.remove(ws)
+
+
+async def server_rss(session, url):
+    async with session.get(f"{url}/metrics") as response:
+        for line in (await response.text()).splitlines():
+            if line.startswith('pgame_process_resident_memory_bytes'):
+                return int(float(line.split()[1]))
+    return None
+
+
+async def run_idle(url, count, hold, batch=500):
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as session:
+        before = await server_rss(session, url)
+        connected, stop, tasks = [], asyncio.Event(), []
+        started = time.perf_counter()
+        for offset in range(0, count, batch):
+            opened = len(connected)
+            size = min(batch, count - offset)
+            tasks.extend(asyncio.create_task(idle_client(session, url, connected, stop)) for _ in range(size))
+            while len(connected) < opened + size and not all(task.done() for task in tasks[-size:]):
+                await asyncio.sleep(0.05)
+        connect_s = time.perf_counter() - started
+        after = await server_rss(session, url)
+        await asyncio.sleep(hold)
+        alive = len(connected)
+        stop.set()
+        for ws in list(connected):
+            await ws.close()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        failed = sum(isinstance(result, Exception) for result in results)
+    return {
+        'connections': count,
+        'connect_s': connect_s,
+        'alive_after_hold': alive,
+        'failed': failed,
+        'rss_before': before,
+        'rss_after': after,
+        'bytes_per_connection': (after - before) / count if before and after else None,
+    }
+
+
+def print_idle_report(result):
+    print(f"{result['connections']} bezczynnych połączeń otwartych w {result['connect_s']:.1f} s, "
+          f"po odczekaniu aktywnych: {result['alive_after_hold']}, błędów: {result['failed']}")
+    if result['bytes_per_connection'] is not None:
+        print(f"Pamięć serwera: {result['rss_before'] / 1048576:.1f} MB -> {result['rss_after'] / 1048576:.1f} MB, "
+              f"{result['bytes_per_connection'] / 1024:.1f} KB na połączenie")
+
+
+def report(recorder, elapsed, rooms, players_per_room):
+    events = sum(len(values) for values in recorder.latencies.values())
+    return {
+        'rooms': rooms,
+        'players_per_room': players_per_room,
+        'elapsed_s': elapsed,
+        'events': events,
+        'events_per_s': events / elapsed if elapsed else 0,
+        'latency_ms': {
+            label: {
+                'count': len(values),
+                'p50': percentile(values, 0.5) * 1000,
+                'p99': percentile(values, 0.99) * 1000,
+            }
+            for label, values in sorted(recorder.latencies.items())
+        },
+        'received_bytes': dict(sorted(recorder.received_bytes.items())),
+        'received_messages': dict(sorted(recorder.received_count.items())),
+        'errors': dict(recorder.errors),
+    }
+
+
+def print_report(result, baseline=None):
+    print(f"{result['rooms']} pokoi x {result['players_per_room']} graczy: {result['events']} zdarzeń "
+          f"w {result['elapsed_s']:.2f} s = {result['events_per_s']:,.0f} zdarzeń/s")
+    if baseline:
+        change = result['events_per_s'] / baseline['events_per_s'] - 1 if baseline['events_per_s'] else 0
+        print(f"  względem bazowego pomiaru: {change:+.1%}")
+
+    print(f"{'zdarzenie':36} {'liczba':>8} {'p50 ms':>9} {'p99 ms':>9}")
+    for label, stats in result['latency_ms'].items():
+        line = f"{label:36} {stats['count']:>8} {stats['p50']:>9.3f} {stats['p99']:>9.3f}"
+        if baseline and label in baseline['latency_ms'] and baseline['latency_ms'][label]['p99']:
+            line += f"  p99 {stats['p99'] / baseline['latency_ms'][label]['p99'] - 1:+.1%}"
+        print(line)
+
+    total = sum(result['received_bytes'].values())
+    frames = sum(result['received_messages'].values())
+    print(f"Odebrane przez klientów: {total:,} B w {frames:,} ramkach")
+    for name, size in sorted(result['received_bytes'].items(), key=lambda item: -item[1]):
+        print(f"  {name:34} {size:>12,} B  ({result['received_messages'][name]} wiadomości)")
+    if result['errors']:
+        print("Błędy:", result['errors'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test obciążeniowy serwera gry na klientach testowych Socket.IO")
+    parser.add_argument('--rooms', type=int, default=50)
+    parser.add_argument('--players', type=int, default=4, help="graczy w pokoju (2-6)")
+    parser.add_argument('--turns', type=int, default=10, help="rund na pokój")
+    parser.add_argument('--concurrency', type=int, default=8, help="pokoje rozgrywane równolegle (wątki)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--protocol', choices=PROTOCOLS, default='json', help="format game_update odbierany przez klientów")
+    parser.add_argument('--batch', action='store_true', help="klienci odbierają wiadomości w kopertach 'batch'")
+    parser.add_argument('--json', dest='json_path', help="zapisz wynik do pliku JSON")
+    parser.add_argument('--baseline', help="porównaj z wcześniej zapisanym wynikiem JSON")
+    parser.add_argument('--idle', type=int, help="zamiast gier: tyle bezczynnych połączeń do --url")
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help="adres serwera dla --idle")
+    parser.add_argument('--hold', type=float, default=30, help="jak długo trzymać bezczynne połączenia (s)")
+    args = parser.parse_args()
+
+    if args.idle:
+        if aiohttp is None:
+            parser.error("--idle wymaga pakietu aiohttp")
+        print_idle_report(asyncio.run(run_idle(args.url.rstrip('/'), args.idle, args.hold)))
+        return
+
+    result = run(args.rooms, args.players, args.turns, args.concurrency, args.seed, args.protocol, args.batch)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import threading
+
+LOBBY_ROOM = 'lobby'
+FLUSH_INTERVAL = 0.25
+
+
+def lobby_entry(room):
+    return {'code': room.code, 'players': len(room.players)}
+
+
+class LobbyIndex:
+    # Indeks gier, do których można dołączyć. Zmiany trafiają do subskrybentów (pokój Socket.IO
+    # 'lobby') jako lobby_added / lobby_updated / lobby_removed, zbierane i wysyłane najwyżej
+    # raz na FLUSH_INTERVAL sekund - koszt zależy od liczby zmian, a nie od liczby pokoi i klientów.
+
+    def __init__(self, socketio, interval=FLUSH_INTERVAL):
+        self.socketio = socketio
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.published = set()
+        self.dirty = set()
+        self.flush_scheduled = False
+
+    def load(self, rooms):
+        with self.lock:
+            for room in rooms:
+                if room.status == 'lobby':
+                    self.entries[room.code] = lobby_entry(room)
+            self.published = set(self.entries)
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.entries.values())
+
+    def update(self, room):
+        if room.status == 'lobby':
+            self.change(room.code, lobby_entry(room))
+        else:
+            self.change(room.code, None)
+
+    def remove(self, code):
+        self.change(code, None)
+
+    def change(self, code, entry):
+        with self.lock:
+            if entry is None:
+                if code not in self.entries:
+                    return
+                del self.entries[code]
+            else:
+                if self.entries.get(code) == entry:
+                    return
+                self.entries[code] = entry
+            self.dirty.add(code)
+            if self.flush_scheduled:
+                return
+            self.flush_scheduled = True
+        self.socketio.start_background_task(self.flush_later)
+
+    def flush_later(self):
+        self.socketio.sleep(self.interval)
+        self.flush()
+
+    def flush(self):
+        with self.lock:
+            self.flush_scheduled = False
+            added, updated, removed = [], [], []
+            for code in sorted(self.dirty):
+                entry = self.entries.get(code)
+                if entry is None:
+                    if code in self.published:
+                        removed.append(code)
+                        self.published.discard(code)
+                elif code in self.published:
+                    updated.append(entry)
+                else:
+                    added.append(entry)
+                    self.published.add(code)
+            self.dirty.clear()
+
+        if added:
+            self.socketio.emit('lobby_added', added, to=LOBBY_ROOM)
+        if updated:
+            self.socketio.emit('lobby_updated', updated, to=LOBBY_ROOM)
+        if removed:
+            self.socketio.emit('lobby_removed', removed, to=LOBBY_ROOM)
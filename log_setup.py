@@ -0,0 +1,129 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+# Konfiguracja logowania ze zmiennych środowiskowych:
+#   PGAME_LOG_MODE    development (domyślnie) | production - w produkcji zapis w osobnym wątku przez kolejkę
+#   PGAME_LOG_FORMAT  text | json (w produkcji domyślnie json)
+#   PGAME_LOG_LEVEL   poziom główny, domyślnie INFO (development: DEBUG)
+#   PGAME_LOG_LEVELS  poziomy podsystemów, np. "pgame.engine=DEBUG,socketio=WARNING,engineio=WARNING"
+# Podsystemy: pgame.app (handlery), pgame.engine (logika gry), pgame.lobby, socketio, engineio.
+
+DEFAULT_LEVELS = {
+    'development': {'socketio': 'INFO', 'engineio': 'WARNING', 'werkzeug': 'INFO'},
+    'production': {'socketio': 'WARNING', 'engineio': 'WARNING', 'werkzeug': 'WARNING'},
+}
+
+_listener = None
+
+
+def log_context(event, room=None):
+    # Pola strukturalne rekordu: logger.info("...", extra=log_context('join_game', kod))
+    return {'event': event, 'room': room}
+
+
+class ContextFilter(logging.Filter):
+    # Rekordy bez kontekstu dostają puste pola, żeby formatery mogły z nich korzystać
+    def filter(self, record):
+        if not hasattr(record, 'event'):
+            record.event = None
+        if not hasattr(record, 'room'):
+            record.room = None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if record.event:
+            data['event'] = record.event
+        if record.room:
+            data['room'] = record.room
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        if record.room or record.event:
+            line += f" [{record.room or '-'} {record.event or '-'}]"
+        return line
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    # QueueHandler.prepare formatuje rekord (razem z tracebackiem) w wątku, który loguje, i gubi exc_info;
+    # tu wstawiamy tylko argumenty do komunikatu, a formatowanie zostaje dla wątku zapisu
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def parse_levels(spec):
+    levels = {}
+    for part in (spec or '').split(','):
+        if '=' in part:
+            name, level = part.split('=', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(mode=None, fmt=None, level=None, levels=None):
+    global _listener
+    mode = mode or os.environ.get('PGAME_LOG_MODE', 'development')
+    if mode not in DEFAULT_LEVELS:
+        raise ValueError(f"Nieznany tryb logowania: {mode}")
+    fmt = fmt or os.environ.get('PGAME_LOG_FORMAT', 'json' if mode == 'production' else 'text')
+    level = level or os.environ.get('PGAME_LOG_LEVEL', 'INFO' if mode == 'production' else 'DEBUG')
+
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+    handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    if _listener:
+        _listener.stop()
+        _listener = None
+
+    if mode == 'production':
+        # Handlery zdarzeń tylko wkładają rekord do kolejki; formatowanie i zapis robi osobny wątek
+        records = queue.SimpleQueue()
+        queued = DeferredQueueHandler(records)
+        queued.addFilter(ContextFilter())
+        root.addHandler(queued)
+        _listener = logging.handlers.QueueListener(records, handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+    else:
+        root.addHandler(handler)
+
+    root.setLevel(level.upper())
+    subsystem_levels = {**DEFAULT_LEVELS[mode], **parse_levels(os.environ.get('PGAME_LOG_LEVELS')), **(levels or {})}
+    for name, subsystem_level in subsystem_levels.items():
+        logging.getLogger(name).setLevel(subsystem_level)
+    return mode
+
+
+def stop_logging():
+    global _listener
+    if _listener:
+        _listener.stop()
+        _listener = None
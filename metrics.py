@@ -0,0 +1,216 @@
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+# Liczniki, histogramy opóźnień i rozmiarów wiadomości dla handlerów Socket.IO i metod silnika.
+# Zmienne środowiskowe:
+#   PGAME_METRICS         0 wyłącza pomiary (domyślnie włączone)
+#   PGAME_METRICS_SAMPLE  ułamek wywołań, dla których mierzymy czas i rozmiar (domyślnie 0.01 - pomiar
+#                         rozmiaru serializuje wiadomość drugi raz); 1.0 w testach wydajności i benchmarkach
+# Liczba wywołań, błędów i wysłanych wiadomości jest liczona zawsze; histogramy tylko z próbki.
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144)
+
+# Rodzaj pomiaru -> (nazwa metryki, etykieta)
+KINDS = {
+    'handler': ('pgame_handler', 'event'),
+    'engine': ('pgame_engine', 'method'),
+}
+
+ENGINE_METHODS = ('handle_field_action', 'buy_item', 'move_player', 'handle_field_effect', 'apply_action_effect')
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, fraction):
+        # Górna granica przedziału, w którym wypada kwantyl
+        if not self.count:
+            return None
+        target, seen = fraction * self.count, 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float('inf')
+
+    def prometheus(self, name, labels):
+        lines, total = [], 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f'{name}_bucket{{{labels},le="{le}"}} {total}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+class Metrics:
+    def __init__(self, enabled=True, sample_rate=0.01):
+        self.enabled = enabled
+        self.every = round(1 / sample_rate) if sample_rate > 0 else 0
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.started = time.time()
+        self.calls = Counter()
+        self.errors = Counter()
+        self.latency = {}
+        self.emitted = Counter()
+        self.payload = {}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            enabled=os.environ.get('PGAME_METRICS', '1') != '0',
+            sample_rate=float(os.environ.get('PGAME_METRICS_SAMPLE', '0.01')),
+        )
+
+    def sampled(self):
+        return self.every and next(self.counter) % self.every == 0
+
+    def timed(self, kind, name, func):
+        key = (kind, name)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            outer = getattr(self.local, 'handler', None)
+            if kind == 'handler':
+                self.local.handler = name
+            started = time.perf_counter() if self.sampled() else None
+            failed = True
+            try:
+                result = func(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                elapsed = time.perf_counter() - started if started is not None else None
+                self.record_call(key, elapsed, failed)
+                if kind == 'handler':
+                    self.local.handler = outer
+        return wrapper
+
+    def record_call(self, key, elapsed, failed):
+        with self.lock:
+            self.calls[key] += 1
+            if failed:
+                self.errors[key] += 1
+            if elapsed is not None:
+                histogram = self.latency.get(key)
+                if histogram is None:
+                    histogram = self.latency[key] = Histogram(LATENCY_BUCKETS)
+                histogram.observe(elapsed)
+
+    def record_emit(self, event, data):
+        size = None
+        if self.sampled():
+            if isinstance(data, bytes):
+                size = len(data)
+            else:
+                size = len(json.dumps(data, ensure_ascii=False, default=str).encode('utf-8'))
+        handler = getattr(self.local, 'handler', None)
+        with self.lock:
+            self.emitted[event] += 1
+            # Handlery łapią wyjątki i odsyłają 'error' - liczymy to jako błąd handlera
+            if event == 'error' and handler:
+                self.errors[('handler', handler)] += 1
+            if size is not None:
+                histogram = self.payload.get(event)
+                if histogram is None:
+                    histogram = self.payload[event] = Histogram(SIZE_BUCKETS)
+                histogram.observe(size)
+
+    def instrument_socketio(self, socketio):
+        # Owija wszystkie zarejestrowane handlery i wysyłkę serwera; wywołać po rejestracji handlerów
+        if not self.enabled:
+            return
+        for namespace_handlers in socketio.server.handlers.values():
+            for event, handler in list(namespace_handlers.items()):
+                namespace_handlers[event] = self.timed('handler', event, handler)
+        self.instrument_emit(socketio.server)
+
+    def instrument_emit(self, server):
+        if not self.enabled:
+            return
+        server_emit = server.emit
+
+        @functools.wraps(server_emit)
+        def emit(event, data=None, *args, **kwargs):
+            self.record_emit(event, data)
+            return server_emit(event, data, *args, **kwargs)
+        server.emit = emit
+
+    def instrument_class(self, cls, methods=ENGINE_METHODS):
+        if not self.enabled:
+            return
+        for name in methods:
+            method = getattr(cls, name)
+            if not getattr(method, 'instrumented', False):
+                wrapper = self.timed('engine', name, method)
+                wrapper.instrumented = True
+                setattr(cls, name, wrapper)
+
+    def prometheus(self):
+        with self.lock:
+            lines = []
+            for kind, (prefix, label) in KINDS.items():
+                keys = sorted(key for key in self.calls if key[0] == kind)
+                lines.append(f'# TYPE {prefix}_calls_total counter')
+                lines.extend(f'{prefix}_calls_total{{{label}="{key[1]}"}} {self.calls[key]}' for key in keys)
+                lines.append(f'# TYPE {prefix}_errors_total counter')
+                lines.extend(f'{prefix}_errors_total{{{label}="{key[1]}"}} {self.errors[key]}' for key in keys)
+                lines.append(f'# TYPE {prefix}_latency_seconds histogram')
+                for key in keys:
+                    if key in self.latency:
+                        lines.extend(self.latency[key].prometheus(f'{prefix}_latency_seconds', f'{label}="{key[1]}"'))
+            lines.append('# TYPE pgame_emitted_messages_total counter')
+            lines.extend(f'pgame_emitted_messages_total{{event="{event}"}} {count}'
+                         for event, count in sorted(self.emitted.items()))
+            lines.append('# TYPE pgame_emit_payload_bytes histogram')
+            for event in sorted(self.payload):
+                lines.extend(self.payload[event].prometheus('pgame_emit_payload_bytes', f'event="{event}"'))
+            return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        # Wiersze dla strony diagnostycznej
+        with self.lock:
+            calls = [
+                {
+                    'kind': kind,
+                    'name': name,
+                    'calls': self.calls[(kind, name)],
+                    'errors': self.errors[(kind, name)],
+                    'p50_ms': self.latency_ms((kind, name), 0.5),
+                    'p99_ms': self.latency_ms((kind, name), 0.99),
+                }
+                for kind, name in sorted(self.calls)
+            ]
+            emitted = [
+                {
+                    'event': event,
+                    'messages': count,
+                    'avg_bytes': round(self.payload[event].sum / self.payload[event].count) if event in self.payload else None,
+                }
+                for event, count in sorted(self.emitted.items(), key=lambda item: -item[1])
+            ]
+        return {'uptime_s': round(time.time() - self.started), 'every': self.every, 'calls': calls, 'emitted': emitted}
+
+    def latency_ms(self, key, fraction):
+        histogram = self.latency.get(key)
+        value = histogram.quantile(fraction) if histogram else None
+        return None if value is None or value == float('inf') else value * 1000
@@ -0,0 +1,92 @@
+import argparse
+import json
+import sys
+
+from game_room import GameRoom
+from storage import create_store
+
+# Odtwarzanie gry z ziarna i dziennika zdarzeń: z archiwum zamkniętych gier (PGAME_ARCHIVE)
+# albo z magazynu stanu (PGAME_STORE). Migawka po dowolnej turze lub zdarzeniu, --check porównuje
+# pełne odtworzenie z zapisanym wynikiem.
+
+
+def load_record(args):
+    if args.store:
+        room = create_store(args.store).get_room(args.code)
+        return room.log_dict() if room else None, room
+    record = None
+    with open(args.archive, encoding='utf-8') as f:
+        for line in f:
+            data = json.loads(line)
+            if data.get('code') == args.code and 'events' in data:
+                record = data
+    return record, None
+
+
+def events_until_turn(events, turn):
+    # Liczba zdarzeń do końca podanej tury (tury kończą się zdarzeniem 'next')
+    finished = 0
+    for index, event in enumerate(events):
+        if event[0] == 'next':
+            finished += 1
+            if finished == turn:
+                return index + 1
+    return len(events)
+
+
+def player_rows(room):
+    return [
+        {
+            'name': p.name,
+            'position': p.position,
+            'popularity': p.popularity,
+            'influence': p.influence,
+            'budget': p.budget,
+            'items': p.items,
+        }
+        for p in room.game_engine.players.values()
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Odtwarzanie gry z dziennika zdarzeń")
+    parser.add_argument('code', help="kod gry")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--archive', help="plik JSON Lines z zamkniętymi grami")
+    source.add_argument('--store', help="magazyn stanu, np. sqlite:///pgame.db")
+    parser.add_argument('--turn', type=int, help="migawka po tej turze")
+    parser.add_argument('--events', type=int, help="migawka po tylu zdarzeniach")
+    parser.add_argument('--check', action='store_true', help="porównaj pełne odtworzenie z zapisanym stanem")
+    args = parser.parse_args()
+
+    record, stored = load_record(args)
+    if record is None:
+        sys.exit(f"Nie znaleziono gry {args.code} z dziennikiem zdarzeń")
+
+    upto = args.events
+    if args.turn is not None:
+        upto = events_until_turn(record['events'], args.turn)
+    room = GameRoom.replay(record, upto)
+
+    turns = sum(1 for event in room.events if event[0] == 'next')
+    print(f"Gra {room.code}: {len(room.events)}/{len(record['events'])} zdarzeń, {turns} tur, "
+          f"status {room.status}, wersja {room.state_version}")
+    for row in player_rows(room):
+        current = '*' if room.game_engine.players.get(room.current_player) and \
+            room.game_engine.players[room.current_player].name == row['name'] else ' '
+        print(f" {current} {row['name']:16} pole {row['position']:>2}  popularność {row['popularity']:>3}  "
+              f"wpływy {row['influence']:>4}  budżet {row['budget']:>8}  {', '.join(row['items'])}")
+
+    if args.check:
+        if upto is not None:
+            room = GameRoom.replay(record)
+        expected = player_rows(stored) if stored else record['players']
+        # Archiwum zapisuje skrócone podsumowanie graczy - porównujemy tylko jego pola
+        replayed = [{key: row[key] for key in summary} for row, summary in zip(player_rows(room), expected)]
+        if len(replayed) != len(expected) or replayed != expected:
+            sys.exit("Odtworzony stan różni się od zapisanego!")
+        print("Odtworzony stan zgadza się z zapisanym.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+import functools
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+
+class RoomQueue:
+    # Kolejka zdarzeń jednego pokoju (styl aktora): w danej chwili wykonuje się jedno zdarzenie,
+    # a kolejne czekają w kolejności przybycia. Różne pokoje nie blokują się nawzajem.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.waiting = deque()
+        self.busy = False
+
+    def __enter__(self):
+        with self.lock:
+            if not self.busy:
+                self.busy = True
+                return self
+            turn = threading.Event()
+            self.waiting.append(turn)
+        turn.wait()
+        return self
+
+    def __exit__(self, *exc_info):
+        with self.lock:
+            if self.waiting:
+                # Przekazujemy pokój następnemu w kolejce bez zwalniania go
+                self.waiting.popleft().set()
+            else:
+                self.busy = False
+        return False
+
+
+class RoomQueues:
+    # Rejestr kolejek pokoi; kolejka istnieje tylko, dopóki ktoś z niej korzysta
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queues = {}
+        self.users = {}
+
+    @contextmanager
+    def serialized(self, code):
+        with self.lock:
+            queue = self.queues.get(code)
+            if queue is None:
+                queue = self.queues[code] = RoomQueue()
+            self.users[code] = self.users.get(code, 0) + 1
+        try:
+            with queue:
+                yield
+        finally:
+            with self.lock:
+                self.users[code] -= 1
+                if not self.users[code]:
+                    del self.users[code]
+                    del self.queues[code]
+
+    def pending(self, code):
+        with self.lock:
+            return self.users.get(code, 0)
+
+
+def serialized_by_room(queues, get_code):
+    # Dekorator handlera: get_code(*args) wskazuje pokój; bez pokoju handler działa bez kolejki
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(*args, **kwargs):
+            code = get_code(*args, **kwargs)
+            if not code:
+                return handler(*args, **kwargs)
+            with queues.serialized(code):
+                return handler(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,201 @@
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import secrets
+import signal
+import subprocess
+import sys
+from http.cookies import CookieError, SimpleCookie
+from urllib.parse import parse_qs, urlsplit
+
+from log_setup import configure_logging, log_context
+from sharding import MAX_SHARDS, session_shard, shard_of
+
+logger = logging.getLogger('pgame.router')
+
+# Router dla wielu procesów-workerów: każdy worker (asgi.py z PGAME_SHARD/PGAME_SHARDS) trzyma pokoje
+# swojego shardu we własnej pamięci, a router po kodzie gry kieruje do niego stronę /game/<kod>
+# i połączenie Socket.IO tej strony (?game=<kod>), razem z join_game i wszystkimi akcjami gry.
+# Kolejne zapytania połączenia Socket.IO idą za shardem zapisanym w jego identyfikatorze sesji (?sid=).
+# Pozostałe żądania (lobby, create_game) trafiają do workera zapisanego w ciasteczku pgame_shard,
+# a bez ciasteczka - do kolejnego po kolei, który je ustawia; gra utworzona w lobby należy więc do
+# tego samego workera. Router przekazuje bajty bez dekodowania (WebSocket w całości, HTTP po jednym
+# żądaniu na połączenie), więc nie wymaga dodatkowych pakietów. Uruchomienie lokalne:
+#   python router.py --workers 4                  router na PGAME_PORT (5000) i 4 workery od --base-port
+#   python router.py --backends http://h1:5101,http://h2:5101   workery uruchomione osobno, w kolejności shardów
+
+SHARD_COOKIE = 'pgame_shard'
+LOOPBACK = ('127.0.0.1', '::1')
+
+
+def parse_backend(url):
+    parts = urlsplit(url if '//' in url else f'http://{url}')
+    return parts.hostname, parts.port or 80
+
+
+def request_code(target):
+    # Kod gry z adresu strony gry albo z parametru game połączenia Socket.IO
+    parts = urlsplit(target)
+    if parts.path.startswith('/game/'):
+        return parts.path[len('/game/'):].strip('/')
+    if parts.path.startswith('/socket.io/'):
+        return parse_qs(parts.query).get('game', [None])[0]
+    return None
+
+
+def request_session(target):
+    # Identyfikator sesji Engine.IO (long-polling i przejście na WebSocket)
+    parts = urlsplit(target)
+    if parts.path.startswith('/socket.io/'):
+        return parse_qs(parts.query).get('sid', [None])[0]
+    return None
+
+
+def cookie_shard(header, shards):
+    try:
+        morsel = SimpleCookie(header).get(SHARD_COOKIE)
+    except CookieError:
+        return None
+    if morsel and morsel.value.isdigit() and int(morsel.value) < shards:
+        return int(morsel.value)
+    return None
+
+
+class Router:
+    def __init__(self, backends):
+        if not 1 <= len(backends) <= MAX_SHARDS:
+            raise ValueError(f"Router obsługuje od 1 do {MAX_SHARDS} workerów")
+        # Adresy (host, port) workerów w kolejności numerów shardów
+        self.backends = backends
+        self.rotation = itertools.cycle(range(len(backends)))
+
+    def route(self, target, headers):
+        # Zwraca (shard, czy ustawić ciasteczko); trwająca sesja zostaje u workera, który ją utworzył
+        shard = session_shard(request_session(target), len(self.backends))
+        if shard is not None:
+            return shard, False
+        shard = shard_of(request_code(target), len(self.backends))
+        if shard is not None:
+            return shard, False
+        shard = cookie_shard(headers.get('cookie', ''), len(self.backends))
+        if shard is not None:
+            return shard, False
+        return next(self.rotation), True
+
+    async def handle(self, reader, writer):
+        backend_writer = None
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+            request_line, *lines = head[:-4].decode('latin-1').split('\r\n')
+            method, target, version = request_line.split(' ')
+            headers = {}
+            for line in lines:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+            writer.close()
+            return
+        try:
+            if urlsplit(target).path.startswith('/debug/') and writer.get_extra_info('peername')[0] not in LOOPBACK:
+                # Workery widzą router jako klienta lokalnego - strony diagnostyczne chroni router
+                await self.respond(writer, '404 Not Found')
+                return
+            shard, set_cookie = self.route(target, headers)
+            upgrade = headers.get('upgrade', '').lower() == 'websocket'
+            try:
+                backend_reader, backend_writer = await asyncio.open_connection(*self.backends[shard])
+            except OSError:
+                logger.warning("Worker %d niedostępny", shard, extra=log_context('route'))
+                await self.respond(writer, '502 Bad Gateway')
+                return
+            if not upgrade:
+                # Jedno żądanie na połączenie - następne może należeć do innego workera
+                lines = [line for line in lines if line.split(':', 1)[0].strip().lower() not in ('connection', 'keep-alive')]
+                lines.append('Connection: close')
+            backend_writer.write(('\r\n'.join([request_line, *lines]) + '\r\n\r\n').encode('latin-1'))
+            cookie = f'Set-Cookie: {SHARD_COOKIE}={shard}; Path=/; SameSite=Lax\r\n'.encode() if set_cookie else b''
+            await self.relay(reader, writer, backend_reader, backend_writer, cookie)
+        finally:
+            for stream in (writer, backend_writer):
+                if stream is not None:
+                    stream.close()
+
+    async def relay(self, reader, writer, backend_reader, backend_writer, cookie):
+        # Przekazywanie w obie strony, aż któraś strona zamknie połączenie
+        tasks = [asyncio.create_task(self.pipe(reader, backend_writer)),
+                 asyncio.create_task(self.pipe(backend_reader, writer, cookie))]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def pipe(self, reader, writer, header=b''):
+        try:
+            if header:
+                # Nagłówek dopisujemy zaraz za linią statusu odpowiedzi
+                writer.write(await reader.readuntil(b'\r\n') + header)
+            while data := await reader.read(65536):
+                writer.write(data)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+
+    async def respond(self, writer, status):
+        writer.write(f'HTTP/1.1 {status}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n'.encode())
+        await writer.drain()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        logger.info("Router na %s:%d, workery: %s", host, port,
+                    ', '.join(f'{h}:{p}' for h, p in self.backends), extra=log_context('start'))
+        async with server:
+            await server.serve_forever()
+
+
+def spawn_workers(count, host, base_port):
+    # Workery asgi.py (jednowątkowe, pokoje w pamięci procesu), po jednym na shard
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'asgi.py')
+    workers = []
+    # Wspólny klucz podpisu dla workerów (sesje, tokeny powrotu), jeśli nie podano go w środowisku
+    secret_key = os.environ.get('PGAME_SECRET_KEY') or secrets.token_hex(32)
+    for shard in range(count):
+        env = {**os.environ, 'PGAME_SECRET_KEY': secret_key, 'PGAME_SHARD': str(shard),
+               'PGAME_SHARDS': str(count), 'PGAME_HOST': host, 'PGAME_PORT': str(base_port + shard)}
+        workers.append(subprocess.Popen([sys.executable, script], env=env))
+    return [(host, base_port + shard) for shard in range(count)], workers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Router gier dla wielu procesów-workerów")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--workers', type=int, help="uruchom tyle workerów asgi.py (shardy 0..N-1)")
+    source.add_argument('--backends', help="adresy działających workerów w kolejności shardów, po przecinku")
+    parser.add_argument('--base-port', type=int, default=5101, help="port pierwszego workera dla --workers")
+    parser.add_argument('--host', default=os.environ.get('PGAME_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PGAME_PORT', 5000)))
+    args = parser.parse_args()
+
+    configure_logging()
+    # SIGTERM kończy router tak jak Ctrl+C - razem z uruchomionymi workerami
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    workers = []
+    if args.workers:
+        backends, workers = spawn_workers(args.workers, '127.0.0.1', args.base_port)
+    else:
+        backends = [parse_backend(url.strip()) for url in args.backends.split(',') if url.strip()]
+    try:
+        asyncio.run(Router(backends).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import os
+import string
+import threading
+
+# Kody gier przypisane do shardów: pokoje można rozłożyć na wiele procesów-workerów bez wspólnego
+# magazynu, a router (router.py) po samym kodzie wie, który proces jest właścicielem gry.
+# Numer shardu to suma liter kodu (A=0 ... Z=25) modulo liczba shardów - ostatnią literę dobieramy tak,
+# żeby suma wskazywała ten proces. Identyfikator sesji Engine.IO workera zaczyna się literą shardu
+# (np. "C.<sid>"), więc router kieruje po nim także zapytania long-polling połączenia bez kodu gry. Zmienne środowiskowe workera:
+#   PGAME_SHARDS  liczba shardów (domyślnie 1, najwyżej 26)
+#   PGAME_SHARD   numer tego procesu, 0..PGAME_SHARDS-1 (domyślnie 0)
+
+ALPHABET = string.ascii_uppercase
+CODE_LENGTH = 6
+MAX_SHARDS = len(ALPHABET)
+
+
+def shard_of(code, shards):
+    # Shard właściciela gry; None dla napisu, który nie jest kodem gry
+    code = (code or '').upper()
+    if len(code) != CODE_LENGTH or any(letter not in ALPHABET for letter in code):
+        return None
+    return sum(ALPHABET.index(letter) for letter in code) % shards
+
+
+def session_id(sid, shard):
+    return f'{ALPHABET[shard]}.{sid}'
+
+
+def session_shard(sid, shards):
+    # Shard z identyfikatora sesji nadanego przez session_id; None dla innego identyfikatora
+    prefix, dot, _ = (sid or '').partition('.')
+    if not dot or len(prefix) != 1 or prefix not in ALPHABET or ALPHABET.index(prefix) >= shards:
+        return None
+    return ALPHABET.index(prefix)
+
+
+class CodeAllocator:
+    def __init__(self, rng, exists, shard=0, shards=1, attempts=100):
+        if not 1 <= shards <= MAX_SHARDS or not 0 <= shard < shards:
+            raise ValueError(f"Nieprawidłowy shard {shard}/{shards}")
+        self.rng = rng
+        # exists(kod) - czy pokój o tym kodzie już istnieje (magazyn tego procesu)
+        self.exists = exists
+        self.shard = shard
+        self.shards = shards
+        self.attempts = attempts
+        self.lock = threading.Lock()
+        # Kody wydane, ale jeszcze niezapisane w magazynie
+        self.reserved = set()
+
+    @classmethod
+    def from_env(cls, rng, exists):
+        return cls(rng, exists, shard=int(os.environ.get('PGAME_SHARD', 0)),
+                   shards=int(os.environ.get('PGAME_SHARDS', 1)))
+
+    def candidate(self):
+        prefix = self.rng.choices(ALPHABET, k=CODE_LENGTH - 1)
+        total = sum(ALPHABET.index(letter) for letter in prefix)
+        last = [letter for index, letter in enumerate(ALPHABET) if (total + index) % self.shards == self.shard]
+        return ''.join(prefix) + self.rng.choice(last)
+
+    def allocate(self):
+        # Nowy, niepowtarzalny kod tego shardu; po zapisaniu pokoju zwolnić rezerwację (release)
+        with self.lock:
+            for _ in range(self.attempts):
+                code = self.candidate()
+                if code not in self.reserved and not self.exists(code):
+                    self.reserved.add(code)
+                    return code
+        raise RuntimeError("Brak wolnych kodów gier")
+
+    def release(self, code):
+        with self.lock:
+            self.reserved.discard(code)
+
+    def owns(self, code):
+        return shard_of(code, self.shards) == self.shard
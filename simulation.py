@@ -0,0 +1,299 @@
+import argparse
+import json
+import math
+import os
+import random
+import time
+from collections import Counter
+from multiprocessing import Pool
+
+from game_logic import GameEngine, Player, STATS
+
+DEFAULT_TURNS = 30
+DEFAULT_CHUNK = 2000
+
+# Szerokość przedziałów histogramów statystyk (budżet liczymy w tysiącach)
+HISTOGRAM_BUCKETS = {'popularity': 1, 'influence': 1, 'budget': 1000}
+
+
+def expected_changes(variants):
+    # Średnia zmiana statystyk po wszystkich wariantach efektu
+    if not variants:
+        return (0,) * len(STATS)
+    return tuple(sum(effect.deltas[i] for effect in variants) / len(variants) for i in range(len(STATS)))
+
+
+class PolicyTables:
+    # Statyczne oceny akcji i pól planszy, liczone raz na silnik
+
+    def __init__(self, engine):
+        self.board_size = len(engine.board)
+        self.action_changes = {
+            action_type: expected_changes(variants)
+            for action_type, variants in engine.effects.items()
+        }
+        self.item_names = tuple(engine.items)
+        self.item_prices = tuple(engine.items[name]["price"] for name in self.item_names)
+        self.item_changes = tuple(engine.item_effects[name].deltas for name in self.item_names)
+        self.field_actions = tuple(
+            tuple(action.effect_type for action in field.actions) for field in engine.board
+        )
+        self.landing_changes = tuple(
+            expected_changes(engine.field_effects.get(field.type)) for field in engine.board
+        )
+
+    def action_score(self, action_type, stat_index):
+        if action_type == 'buy_item':
+            return max((changes[stat_index] for changes in self.item_changes), default=0)
+        return self.action_changes.get(action_type, (0,) * len(STATS))[stat_index]
+
+    def field_score(self, position, stat_index):
+        best_action = max(
+            (self.action_score(action_type, stat_index) for action_type in self.field_actions[position]),
+            default=0
+        )
+        return self.landing_changes[position][stat_index] + best_action
+
+
+class RandomPolicy:
+    name = 'random'
+
+    def __init__(self, tables):
+        self.tables = tables
+
+    def choose_move(self, player, positions, rng):
+        return positions[0] if rng.random() < 0.5 else positions[1]
+
+    def choose_action(self, player, rng):
+        actions = self.tables.field_actions[player.position]
+        if not actions:
+            return None, None
+        action_type = actions[int(rng.random() * len(actions))]
+        if action_type == 'buy_item':
+            return action_type, self.tables.item_names[int(rng.random() * len(self.tables.item_names))]
+        return action_type, None
+
+
+class GreedyPolicy:
+    # Maksymalizuje oczekiwany przyrost jednej statystyki; remisy rozstrzyga na korzyść pierwszej opcji
+    stat = None
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.stat_index = STATS.index(self.stat)
+        self.field_scores = tuple(tables.field_score(position, self.stat_index) for position in range(tables.board_size))
+        self.best_actions = tuple(
+            max(actions, key=lambda action_type: tables.action_score(action_type, self.stat_index)) if actions else None
+            for actions in tables.field_actions
+        )
+        # Przedmioty od najlepszego; przy równym zysku tańszy pierwszy
+        self.items_by_score = sorted(
+            range(len(tables.item_names)),
+            key=lambda i: (-tables.item_changes[i][self.stat_index], tables.item_prices[i])
+        )
+
+    def choose_move(self, player, positions, rng):
+        forward, backward = positions
+        return backward if self.field_scores[backward] > self.field_scores[forward] else forward
+
+    def choose_action(self, player, rng):
+        action_type = self.best_actions[player.position]
+        if action_type != 'buy_item':
+            return action_type, None
+        for i in self.items_by_score:
+            name = self.tables.item_names[i]
+            if self.tables.item_prices[i] <= player.budget and not player.has_item(name):
+                return action_type, name
+        return None, None
+
+
+class GreedyPopularityPolicy(GreedyPolicy):
+    name = 'greedy_popularity'
+    stat = 'popularity'
+
+
+class GreedyBudgetPolicy(GreedyPolicy):
+    name = 'greedy_budget'
+    stat = 'budget'
+
+
+POLICIES = {
+    policy.name: policy
+    for policy in (RandomPolicy, GreedyPopularityPolicy, GreedyBudgetPolicy)
+}
+
+
+class SimulationStats:
+    # Zagregowane wyniki; częściowe wyniki z procesów roboczych łączymy przez merge()
+
+    def __init__(self, seats, board_size):
+        self.seats = list(seats)
+        self.games = 0
+        self.wins = Counter()
+        self.moves = 0
+        self.field_visits = [0] * board_size
+        self.histograms = {seat: {stat: Counter() for stat in STATS} for seat in self.seats}
+        self.sums = {seat: {stat: [0, 0] for stat in STATS} for seat in self.seats}
+
+    def record_game(self, players, winner_seat):
+        self.games += 1
+        self.wins[winner_seat] += 1
+        for seat, player in zip(self.seats, players):
+            for stat in STATS:
+                value = getattr(player, stat)
+                totals = self.sums[seat][stat]
+                totals[0] += value
+                totals[1] += value * value
+                self.histograms[seat][stat][value // HISTOGRAM_BUCKETS[stat]] += 1
+
+    def merge(self, other):
+        self.games += other.games
+        self.wins.update(other.wins)
+        self.moves += other.moves
+        self.field_visits = [a + b for a, b in zip(self.field_visits, other.field_visits)]
+        for seat in self.seats:
+            for stat in STATS:
+                self.histograms[seat][stat].update(other.histograms[seat][stat])
+                totals, other_totals = self.sums[seat][stat], other.sums[seat][stat]
+                totals[0] += other_totals[0]
+                totals[1] += other_totals[1]
+        return self
+
+    def distribution(self, seat, stat):
+        histogram = self.histograms[seat][stat]
+        count = sum(histogram.values())
+        if not count:
+            return {}
+        total, total_squares = self.sums[seat][stat]
+        mean = total / count
+        bucket = HISTOGRAM_BUCKETS[stat]
+        keys = sorted(histogram)
+        summary = {
+            'mean': mean,
+            'std': math.sqrt(max(0.0, total_squares / count - mean * mean)),
+            'min': keys[0] * bucket,
+            'max': keys[-1] * bucket,
+        }
+        for name, fraction in (('p10', 0.1), ('p50', 0.5), ('p90', 0.9)):
+            target, seen = fraction * count, 0
+            for key in keys:
+                seen += histogram[key]
+                if seen >= target:
+                    summary[name] = key * bucket
+                    break
+        return summary
+
+    def report(self):
+        visits = sum(self.field_visits) or 1
+        return {
+            'games': self.games,
+            'win_rates': {seat: self.wins[seat] / self.games for seat in self.seats} if self.games else {},
+            'stats': {seat: {stat: self.distribution(seat, stat) for stat in STATS} for seat in self.seats},
+            'field_visits': [count / visits for count in self.field_visits],
+        }
+
+
+def seat_labels(policy_names):
+    return [f"{i}:{name}" for i, name in enumerate(policy_names)]
+
+
+def play_game(engine, policies, seed, turns, stats):
+    rng = engine.rng
+    rng.seed(seed)
+    engine.clear_players()
+    players = []
+    for i, policy in enumerate(policies):
+        player = Player(i, policy.name, None)
+        engine.add_player(player)
+        players.append(player)
+
+    board_size = len(engine.board)
+    visits = stats.field_visits
+    for _ in range(turns):
+        for player, policy in zip(players, policies):
+            steps = rng.randint(1, 6)
+            positions = ((player.position + steps) % board_size, (player.position - steps) % board_size)
+            player.position = policy.choose_move(player, positions, rng)
+            visits[player.position] += 1
+            engine.handle_field_effect(player)
+
+            action_type, item_name = policy.choose_action(player, rng)
+            if action_type == 'buy_item':
+                engine.buy_item(player.id, item_name)
+            elif action_type:
+                engine.handle_field_action(player, action_type)
+    stats.moves += turns * len(players)
+
+    winner = max(range(len(players)), key=lambda i: (players[i].popularity, players[i].influence, players[i].budget))
+    stats.record_game(players, stats.seats[winner])
+
+
+def run_chunk(task):
+    policy_names, first_seed, games, turns = task
+    engine = GameEngine(rng=random.Random())
+    tables = PolicyTables(engine)
+    policies = [POLICIES[name](tables) for name in policy_names]
+    stats = SimulationStats(seat_labels(policy_names), len(engine.board))
+    for seed in range(first_seed, first_seed + games):
+        play_game(engine, policies, seed, turns, stats)
+    return stats
+
+
+def run_simulation(policy_names, games, turns=DEFAULT_TURNS, seed=0, workers=None, chunk_size=DEFAULT_CHUNK):
+    # Generator: po każdej ukończonej paczce gier zwraca (liczba gier, bieżące statystyki)
+    for name in policy_names:
+        if name not in POLICIES:
+            raise ValueError(f"Nieznana strategia: {name}")
+
+    tasks = [
+        (tuple(policy_names), seed + start, min(chunk_size, games - start), turns)
+        for start in range(0, games, chunk_size)
+    ]
+    total = SimulationStats(seat_labels(policy_names), len(GameEngine().board))
+
+    if workers == 1:
+        for task in tasks:
+            total.merge(run_chunk(task))
+            yield total.games, total
+        return
+
+    with Pool(processes=workers or os.cpu_count()) as pool:
+        for partial in pool.imap_unordered(run_chunk, tasks):
+            total.merge(partial)
+            yield total.games, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Symulacja wielu gier bez serwera")
+    parser.add_argument('--games', type=int, default=10000)
+    parser.add_argument('--policies', nargs='+', default=['random', 'greedy_popularity', 'greedy_budget'],
+                        choices=sorted(POLICIES))
+    parser.add_argument('--turns', type=int, default=DEFAULT_TURNS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=0, help="0 = wszystkie rdzenie")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK)
+    parser.add_argument('--json', dest='json_path', help="zapisz raport do pliku JSON")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    stats = None
+    for done, stats in run_simulation(args.policies, args.games, args.turns, args.seed,
+                                      args.workers or None, args.chunk_size):
+        elapsed = time.perf_counter() - started
+        print(f"\r{done}/{args.games} gier, {done / elapsed:,.0f} gier/s", end='', flush=True)
+    print()
+
+    report = stats.report()
+    for seat in stats.seats:
+        popularity = report['stats'][seat]['popularity']
+        print(f"{seat:24} wygrane {report['win_rates'][seat]:6.1%}  "
+              f"popularność śr. {popularity['mean']:6.1f} (p10 {popularity['p10']}, p90 {popularity['p90']})")
+    print("Odwiedziny pól:", ' '.join(f"{share:.3f}" for share in report['field_visits']))
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+// Dekoder MessagePack dla zwartego formatu game_update (wire.py), serwowany z naszego serwera zamiast
+// biblioteki z zewnętrznego CDN. Tylko odczyt: obsługuje wszystkie typy formatu poza rozszerzeniami (ext).
+(function (global) {
+    const textDecoder = new TextDecoder();
+
+    function decode(bytes) {
+        const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+        let offset = 0;
+
+        function take(length) {
+            const start = offset;
+            offset += length;
+            if (offset > bytes.byteLength) throw new Error('MessagePack: niepełne dane');
+            return start;
+        }
+        const u8 = () => view.getUint8(take(1));
+        const u16 = () => view.getUint16(take(2));
+        const u32 = () => view.getUint32(take(4));
+        const str = length => textDecoder.decode(bytes.subarray(take(length), offset));
+        const bin = length => bytes.slice(take(length), offset);
+        const array = length => {
+            const result = new Array(length);
+            for (let i = 0; i < length; i++) result[i] = value();
+            return result;
+        };
+        const map = length => {
+            const result = {};
+            for (let i = 0; i < length; i++) {
+                const key = value();
+                result[key] = value();
+            }
+            return result;
+        };
+
+        function value() {
+            const type = u8();
+            if (type <= 0x7f) return type;
+            if (type <= 0x8f) return map(type & 0x0f);
+            if (type <= 0x9f) return array(type & 0x0f);
+            if (type <= 0xbf) return str(type & 0x1f);
+            if (type >= 0xe0) return type - 0x100;
+            switch (type) {
+                case 0xc0: return null;
+                case 0xc2: return false;
+                case 0xc3: return true;
+                case 0xc4: return bin(u8());
+                case 0xc5: return bin(u16());
+                case 0xc6: return bin(u32());
+                case 0xca: return view.getFloat32(take(4));
+                case 0xcb: return view.getFloat64(take(8));
+                case 0xcc: return u8();
+                case 0xcd: return u16();
+                case 0xce: return u32();
+                case 0xcf: return Number(view.getBigUint64(take(8)));
+                case 0xd0: return view.getInt8(take(1));
+                case 0xd1: return view.getInt16(take(2));
+                case 0xd2: return view.getInt32(take(4));
+                case 0xd3: return Number(view.getBigInt64(take(8)));
+                case 0xd9: return str(u8());
+                case 0xda: return str(u16());
+                case 0xdb: return str(u32());
+                case 0xdc: return array(u16());
+                case 0xdd: return array(u32());
+                case 0xde: return map(u16());
+                case 0xdf: return map(u32());
+            }
+            throw new Error(`MessagePack: nieobsługiwany typ 0x${type.toString(16)}`);
+        }
+
+        const result = value();
+        if (offset !== bytes.byteLength) throw new Error('MessagePack: nadmiarowe dane');
+        return result;
+    }
+
+    global.MessagePack = { decode };
+})(typeof window !== 'undefined' ? window : globalThis);
@@ -0,0 +1,255 @@
+import json
+import os
+import sqlite3
+import threading
+from urllib.parse import urlparse
+
+from game_room import GameRoom
+
+# Magazyny stanu gier. Każdy udostępnia ten sam interfejs:
+#   get_room(kod) / has_room(kod) / save_room(pokój) / delete_room(kod) / iter_rooms()
+#   get_player(sid) -> kod gry / set_player(sid, kod) / delete_player(sid)
+# Po każdej zmianie pokoju trzeba wywołać save_room - w pamięci to tylko wpis do słownika,
+# w SQLite i Redis stan jest zapisywany jako JSON i dostępny dla innych procesów.
+# Magazyny współdzielone zapisują warunkowo (porównaj-i-zamień): każdy zapis podbija wersję pokoju
+# w magazynie, a zapis pokoju odczytanego w starszej wersji (bo w międzyczasie zmienił go inny
+# proces) kończy się StaleRoomError zamiast nadpisać cudzą zmianę.
+# Dziennik zdarzeń pokoju nie wchodzi do zapisu stanu: magazyn dopisuje przy zapisie tylko nowe zdarzenia
+# (SQLite - tabela room_events, Redis - lista pgame:events:<kod>), więc koszt zapisu nie rośnie z długością gry.
+# PGAME_PERSIST=log zapisuje zamiast pełnego stanu tylko ziarno i dziennik zdarzeń pokoju;
+# odczyt odtwarza wtedy grę od początku (mniejszy zapis na starcie gry, dłuższy odczyt pod jej koniec).
+
+PERSIST_LOG = os.environ.get('PGAME_PERSIST', 'state') == 'log'
+
+
+class StaleRoomError(Exception):
+    pass
+
+
+def dump_room(room):
+    return json.dumps(room.log_dict(events=False) if PERSIST_LOG else room.to_dict(), ensure_ascii=False)
+
+
+def load_room(data, load_events):
+    # load_events(kod, liczba) - pierwsze zdarzenia dziennika pokoju z magazynu
+    data = json.loads(data)
+    # Zapis sprzed dziennika przyrostowego niesie zdarzenia w sobie; przy następnym zapisie trafią do dziennika
+    embedded = 'events' in data
+    if 'engine' not in data and not embedded:
+        data['events'] = load_events(data['code'], data['event_count'])
+    room = GameRoom.from_dict(data)
+    room.event_source = load_events
+    room.events_saved = 0 if embedded else room.event_count
+    return room
+
+
+def versioned(room, version):
+    room.store_version = version
+    return room
+
+
+class MemoryStore:
+    # Dotychczasowe zachowanie: obiekty żyją w słownikach procesu
+
+    def __init__(self):
+        self.rooms = {}
+        self.players = {}
+
+    def get_room(self, code):
+        return self.rooms.get(code)
+
+    def has_room(self, code):
+        return code in self.rooms
+
+    def save_room(self, room):
+        self.rooms[room.code] = room
+
+    def delete_room(self, code):
+        self.rooms.pop(code, None)
+
+    def iter_rooms(self):
+        return list(self.rooms.values())
+
+    def get_player(self, sid):
+        return self.players.get(sid)
+
+    def set_player(self, sid, code):
+        self.players[sid] = code
+
+    def delete_player(self, sid):
+        self.players.pop(sid, None)
+
+
+class SQLiteStore:
+    # Plik SQLite współdzielony przez procesy na jednej maszynie; wyszukiwanie po kluczu głównym
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        with self.connection() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS rooms (code TEXT PRIMARY KEY, status TEXT, data TEXT NOT NULL, "
+                       "version INTEGER NOT NULL DEFAULT 0)")
+            db.execute("CREATE TABLE IF NOT EXISTS room_events (code TEXT NOT NULL, seq INTEGER NOT NULL, "
+                       "data TEXT NOT NULL, PRIMARY KEY (code, seq))")
+            db.execute("CREATE TABLE IF NOT EXISTS players (sid TEXT PRIMARY KEY, code TEXT NOT NULL)")
+            if 'version' not in [column[1] for column in db.execute("PRAGMA table_info(rooms)")]:
+                # Baza sprzed zapisów warunkowych
+                db.execute("ALTER TABLE rooms ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+    def connection(self):
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self.local.db = db
+        return db
+
+    def get_room(self, code):
+        row = self.connection().execute("SELECT data, version FROM rooms WHERE code = ?", (code,)).fetchone()
+        return versioned(load_room(row[0], self.load_events), row[1]) if row else None
+
+    def has_room(self, code):
+        # Sam klucz główny, bez odczytu i deserializacji stanu
+        return self.connection().execute("SELECT 1 FROM rooms WHERE code = ?", (code,)).fetchone() is not None
+
+    def load_events(self, code, count):
+        rows = self.connection().execute("SELECT data FROM room_events WHERE code = ? AND seq < ? ORDER BY seq",
+                                         (code, count))
+        return [json.loads(data) for data, in rows]
+
+    def save_room(self, room):
+        events = room.unsaved_events()
+        with self.connection() as db:
+            if room.store_version:
+                saved = db.execute(
+                    "UPDATE rooms SET status = ?, data = ?, version = version + 1 WHERE code = ? AND version = ?",
+                    (room.status, dump_room(room), room.code, room.store_version)
+                ).rowcount
+            else:
+                saved = db.execute(
+                    "INSERT OR IGNORE INTO rooms (code, status, data, version) VALUES (?, ?, ?, 1)",
+                    (room.code, room.status, dump_room(room))
+                ).rowcount
+            if saved:
+                # REPLACE - wiersze po usuniętym wcześniej pokoju o tym samym kodzie nie blokują zapisu
+                db.executemany("INSERT OR REPLACE INTO room_events (code, seq, data) VALUES (?, ?, ?)",
+                               [(room.code, room.events_saved + index, json.dumps(event, ensure_ascii=False))
+                                for index, event in enumerate(events)])
+        if not saved:
+            raise StaleRoomError(room.code)
+        room.store_version += 1
+        room.events_saved += len(events)
+
+    def delete_room(self, code):
+        with self.connection() as db:
+            db.execute("DELETE FROM rooms WHERE code = ?", (code,))
+            db.execute("DELETE FROM room_events WHERE code = ?", (code,))
+
+    def iter_rooms(self):
+        return [versioned(load_room(data, self.load_events), version)
+                for data, version in self.connection().execute("SELECT data, version FROM rooms")]
+
+    def get_player(self, sid):
+        row = self.connection().execute("SELECT code FROM players WHERE sid = ?", (sid,)).fetchone()
+        return row[0] if row else None
+
+    def set_player(self, sid, code):
+        with self.connection() as db:
+            db.execute("INSERT OR REPLACE INTO players (sid, code) VALUES (?, ?)", (sid, code))
+
+    def delete_player(self, sid):
+        with self.connection() as db:
+            db.execute("DELETE FROM players WHERE sid = ?", (sid,))
+
+
+class RedisStore:
+    # Dowolny serwer mówiący protokołem Redis; klienta można podać wprost (np. zamiennik w testach)
+    prefix = 'pgame'
+
+    def __init__(self, url=None, client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+
+    def key(self, *parts):
+        return ':'.join((self.prefix,) + parts)
+
+    def get_room(self, code):
+        # Stan i wersja jednym poleceniem MGET - spójna para
+        data, version = self.client.mget([self.key('room', code), self.key('version', code)])
+        return versioned(load_room(data, self.load_events), int(version or 0)) if data else None
+
+    def has_room(self, code):
+        return bool(self.client.exists(self.key('room', code)))
+
+    def load_events(self, code, count):
+        return [json.loads(event) for event in self.client.lrange(self.key('events', code), 0, count - 1)] if count else []
+
+    def save_room(self, room):
+        from redis.exceptions import WatchError
+        version_key = self.key('version', room.code)
+        events_key = self.key('events', room.code)
+        data = dump_room(room)
+        events = room.unsaved_events()
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(version_key)
+                if int(pipe.get(version_key) or 0) != room.store_version:
+                    raise StaleRoomError(room.code)
+                pipe.multi()
+                if not room.events_saved:
+                    # Nowy pokój (albo zapis sprzed dziennika przyrostowego) - bez resztek po usuniętym pokoju
+                    pipe.delete(events_key)
+                if events:
+                    pipe.rpush(events_key, *(json.dumps(event, ensure_ascii=False) for event in events))
+                pipe.set(self.key('room', room.code), data)
+                pipe.set(version_key, room.store_version + 1)
+                pipe.sadd(self.key('rooms'), room.code)
+                pipe.execute()
+            except WatchError:
+                raise StaleRoomError(room.code) from None
+        room.store_version += 1
+        room.events_saved += len(events)
+
+    def delete_room(self, code):
+        pipe = self.client.pipeline()
+        pipe.delete(self.key('room', code), self.key('version', code), self.key('events', code))
+        pipe.srem(self.key('rooms'), code)
+        pipe.execute()
+
+    def iter_rooms(self):
+        codes = sorted(code.decode() if isinstance(code, bytes) else code
+                       for code in self.client.smembers(self.key('rooms')))
+        if not codes:
+            return []
+        values = self.client.mget([self.key(kind, code) for code in codes for kind in ('room', 'version')])
+        return [versioned(load_room(data, self.load_events), int(version or 0))
+                for data, version in zip(values[::2], values[1::2]) if data]
+
+    def get_player(self, sid):
+        code = self.client.get(self.key('player', sid))
+        return code.decode() if isinstance(code, bytes) else code
+
+    def set_player(self, sid, code):
+        self.client.set(self.key('player', sid), code)
+
+    def delete_player(self, sid):
+        self.client.delete(self.key('player', sid))
+
+
+def create_store(url=None):
+    # memory:// (domyślnie), sqlite:///ścieżka/do/pliku.db albo redis://host:port/db
+    url = url or os.environ.get('PGAME_STORE', 'memory://')
+    scheme = urlparse(url).scheme
+    if scheme == 'memory':
+        return MemoryStore()
+    if scheme == 'sqlite':
+        path = url[len('sqlite:///'):]
+        if not path:
+            raise ValueError("Podaj ścieżkę pliku bazy, np. sqlite:///pgame.db")
+        return SQLiteStore(path)
+    if scheme in ('redis', 'rediss', 'unix'):
+        return RedisStore(url)
+    raise ValueError(f"Nieobsługiwany magazyn stanu: {url}")
@@ -0,0 +1,11 @@
+import os
+import sys
+
+# Testy importują moduły z katalogu głównego repozytorium (układ płaski, bez pakietu)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# app.py czyta konfigurację przy imporcie, a importuje go pierwszy test, który go potrzebuje - wspólne
+# ustawienia są więc tutaj. Rozłączony gracz, na którego wypadła tura, oddaje ją po upływie czasu na turę
+os.environ.setdefault('PGAME_RATE_LIMIT', '0')
+os.environ.setdefault('PGAME_TURN_TIMEOUT', '0.3')
+os.environ.setdefault('PGAME_LOG_LEVEL', 'WARNING')
@@ -0,0 +1,61 @@
+import threading
+
+from admission import AdmissionControl
+
+
+class Emits:
+    # Zamiast Socket.IO: zapamiętuje wysłane wiadomości
+    def __init__(self):
+        self.sent = []
+
+    def emit(self, event, data, to=None):
+        self.sent.append((to, data))
+
+
+def test_different_actions_pass_while_previous_one_is_running():
+    emits = Emits()
+    control = AdmissionControl(emits, lambda sid: 'ABCDEF')
+    started, release, handled = threading.Event(), threading.Event(), []
+
+    def handler(sid, data):
+        handled.append(data['type'])
+        if data['type'] == 'roll_dice':
+            # Rzut czeka w kolejce pokoju
+            started.set()
+            release.wait(5)
+
+    action = control.admitted('player_action', handler)
+    rolling = threading.Thread(target=action, args=('sid-a', {'type': 'roll_dice'}))
+    rolling.start()
+    assert started.wait(5)
+    action('sid-a', {'type': 'move', 'new_position': 3})
+    action('sid-a', {'type': 'roll_dice'})
+    release.set()
+    rolling.join(5)
+
+    # Ruch po rzucie przechodzi, identyczny rzut jest odrzucony z odpowiedzią
+    assert handled == ['roll_dice', 'move']
+    assert [(to, data['reason']) for to, data in emits.sent] == [('sid-a', 'duplicate')]
+    action('sid-a', {'type': 'roll_dice'})
+    assert handled == ['roll_dice', 'move', 'roll_dice']
+
+
+def test_buckets_shed_load_past_their_rate():
+    emits = Emits()
+    control = AdmissionControl(emits, lambda sid: 'ABCDEF')
+    handled = []
+    action = control.admitted('player_action', lambda sid, data: handled.append(sid))
+
+    # player_action: 10 naraz na połączenie, 40 na pokój
+    for i in range(15):
+        action('sid-0', {'type': 'get_items', 'n': i})
+    assert len(handled) == 10
+    assert control.shed[('player_action', 'sid')] >= 4
+    assert [data['reason'] for to, data in emits.sent] == ['sid']
+
+    for sid in ('sid-1', 'sid-2', 'sid-3', 'sid-4'):
+        for i in range(10):
+            action(sid, {'type': 'get_items', 'n': i})
+    assert len(handled) <= 41
+    assert control.shed[('player_action', 'room')] >= 9
+    assert {data['reason'] for to, data in emits.sent} == {'sid', 'room'}
@@ -0,0 +1,39 @@
+import app as server
+from game_room import GameRoom
+from lifecycle import RoomLifecycle
+from lobby import LobbyIndex
+from room_queue import RoomQueues
+from storage import MemoryStore
+
+
+class CountingStore(MemoryStore):
+    def __init__(self):
+        super().__init__()
+        self.reads = []
+
+    def get_room(self, code):
+        self.reads.append(code)
+        return super().get_room(code)
+
+
+def make_room(store, code, players, last_activity):
+    room = GameRoom(code, 'Ala')
+    for i in range(players):
+        room.add_player(f'{code}-{i}', 'Ala' if i == 0 else f'G{i}', '1')
+    room.last_activity = last_activity
+    store.save_room(room)
+    return room
+
+
+def test_sweep_reads_only_rooms_past_their_cutoff():
+    store = CountingStore()
+    lifecycle = RoomLifecycle(store, RoomQueues(), server.socketio, LobbyIndex(server.socketio),
+                              empty_grace=60, idle_timeout=7200)
+    now = 100000.0
+    lifecycle.load([make_room(store, 'RECENT', 2, now - 10), make_room(store, 'PLAYED', 2, now - 600),
+                    make_room(store, 'EMPTYR', 0, now - 600), make_room(store, 'IDLERM', 2, now - 8000)])
+    lifecycle.sweep(now)
+    # Zajęty pokój po 10 minutach bez ruchu nie jest odczytywany z magazynu
+    assert sorted(store.reads) == ['EMPTYR', 'IDLERM']
+    assert sorted(store.rooms) == ['PLAYED', 'RECENT']
+    assert lifecycle.evicted == {'empty': 1, 'idle': 1}
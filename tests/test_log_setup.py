@@ -0,0 +1,32 @@
+import json
+import logging
+import threading
+
+import log_setup
+
+
+def test_production_logging_formats_on_listener_thread(capsys, monkeypatch):
+    formatted_on = []
+    format_json = log_setup.JsonFormatter.format
+
+    def format(self, record):
+        formatted_on.append(threading.get_ident())
+        return format_json(self, record)
+
+    monkeypatch.setattr(log_setup.JsonFormatter, 'format', format)
+    log_setup.configure_logging(mode='production', fmt='json', level='INFO')
+    try:
+        logger = logging.getLogger('pgame.test')
+        try:
+            raise ValueError("zły ruch")
+        except ValueError:
+            logger.exception("Błąd akcji %s", 'move', extra=log_setup.log_context('player_action', 'ABCDEF'))
+    finally:
+        log_setup.stop_logging()
+        log_setup.configure_logging(mode='development')
+
+    record = json.loads(capsys.readouterr().err.strip().splitlines()[-1])
+    assert record['msg'] == "Błąd akcji move"
+    assert record['event'] == 'player_action' and record['room'] == 'ABCDEF'
+    assert 'ValueError: zły ruch' in record['exc']
+    assert formatted_on and threading.get_ident() not in formatted_on
@@ -0,0 +1,110 @@
+import random
+import threading
+
+import app as server
+from game_room import GameRoom
+
+PLAYERS = 4
+TURNS = 60
+
+
+def successor(order, current, skip):
+    index = order.index(current)
+    for step in range(1, len(order) + 1):
+        candidate = order[(index + step) % len(order)]
+        if candidate not in skip:
+            return candidate
+    return None
+
+
+def start_room():
+    clients = [server.socketio.test_client(server.app) for _ in range(PLAYERS)]
+    clients[0].emit('create_game', {'name': 'P0', 'avatar': '1'})
+    code = next(m for m in clients[0].get_received() if m['name'] == 'game_created')['args'][0]['game_code']
+    for i, client in enumerate(clients[1:], 1):
+        client.emit('join_game', {'game_code': code, 'name': f'P{i}', 'avatar': '2'})
+    clients[0].emit('start_game')
+    for client in clients:
+        client.get_received()
+    room = server.store.get_room(code)
+    order = list(room.game_engine.turns)
+    return code, order, {player_id: clients[int(player.name[1:])] for player_id, player in room.game_engine.players.items()}
+
+
+def play(code, player_id, client, rng, stop, leave_after=None):
+    # Kolejka pokoju i walidacja serwera muszą przyjąć dowolny przeplot; wybór akcji czyta stan bez kolejki
+    actions = 0
+    while not stop.is_set():
+        room = server.store.get_room(code)
+        if room.current_player == player_id:
+            client.emit('player_action', {'type': 'roll_dice'})
+            # Cel ruchu spośród pól osiągalnych z rzutu (jak possible_positions w choose_move)
+            engine = room.game_engine
+            steps, position = engine.pending_roll, engine.players[player_id].position
+            targets = sorted(engine.reachable[position][steps]) if steps is not None else [position]
+            client.emit('player_action', {'type': 'move', 'new_position': rng.choice(targets)})
+            client.emit('player_action', {'type': 'field_action', 'action_type': 'vote_for'})
+            client.emit('player_action', {'type': 'end_turn'})
+        else:
+            kind = rng.choice(('roll_dice', 'end_turn', 'get_items'))
+            client.emit('player_action', {'type': kind})
+        client.emit('confrontation_roll')
+        actions += 1
+        if leave_after is not None and actions == leave_after:
+            client.disconnect()
+            return
+
+
+def check_room(code, order, clients, leaving):
+    room = server.store.get_room(code)
+    assert len(room.game_engine.players) == PLAYERS
+    assert list(room.disconnected) == [leaving]
+
+    turns = None
+    for player_id, client in clients.items():
+        if player_id == leaving:
+            continue
+        received = client.get_received()
+        versions = [m['args'][0]['version'] for m in received if m['name'] == 'game_update']
+        assert versions == sorted(set(versions)) and versions[-1] <= room.state_version
+        ended = [m['args'][0]['next_player'] for m in received if m['name'] == 'turn_ended']
+        # Każdy gracz widzi te same zmiany tury, w tej samej kolejności
+        assert turns is None or ended == turns
+        turns = ended
+
+    assert len(turns) == sum(1 for event in room.events if event[0] == 'next')
+    # Ruchy są wybierane z pól osiągalnych, więc po rzucie ruch zostaje przyjęty (poza ewentualnym ostatnim)
+    kinds = [event[0] for event in room.events]
+    assert kinds.count('move') >= kinds.count('roll') - 1 > 0
+    assert turns[-1] == room.current_player
+    current = order[0]
+    for following in turns:
+        assert following in (successor(order, current, ()), successor(order, current, {leaving}))
+        current = following
+
+    # Dziennik zdarzeń zapisany w kolejce odtwarza dokładnie ten sam stan
+    replayed = GameRoom.replay(room.log_dict())
+    assert replayed.to_dict()['engine'] == room.to_dict()['engine']
+
+
+def test_concurrent_actions_keep_room_consistent():
+    code, order, clients = start_room()
+    leaving = order[2]
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=play, args=(code, player_id, client, random.Random(i), stop,
+                                            25 if player_id == leaving else None))
+        for i, (player_id, client) in enumerate(clients.items())
+    ]
+    for thread in threads:
+        thread.start()
+    while sum(1 for event in server.store.get_room(code).events if event[0] == 'next') < TURNS:
+        threading.Event().wait(0.01)
+    stop.set()
+    for thread in threads:
+        thread.join(10)
+        assert not thread.is_alive()
+    with server.room_queues.serialized(code):
+        # Stan pokoju i odebrane wiadomości porównujemy w kolejce pokoju, bez dalszych tur z timera
+        server.turn_timers.pop(code)[1].cancel()
+        check_room(code, order, clients, leaving)
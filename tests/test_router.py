@@ -0,0 +1,108 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+pytest.importorskip('uvicorn')
+pytest.importorskip('asgiref')
+aiohttp = pytest.importorskip('aiohttp')
+import socketio
+
+from sharding import shard_of
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKERS = 3
+
+
+def free_ports(count):
+    # Kolejne wolne porty: router i workery od base-port
+    for base in range(20000, 40000, 10):
+        try:
+            sockets = []
+            for port in range(base, base + count):
+                sock = socket.socket()
+                sockets.append(sock)
+                sock.bind(('127.0.0.1', port))
+            return list(range(base, base + count))
+        except OSError:
+            continue
+        finally:
+            for sock in sockets:
+                sock.close()
+    raise RuntimeError("Brak wolnych portów")
+
+
+@pytest.fixture(scope='module')
+def router():
+    port, *worker_ports = free_ports(WORKERS + 1)
+    env = {**os.environ, 'PGAME_RATE_LIMIT': '0', 'PGAME_LOG_LEVEL': 'WARNING', 'PGAME_PORT': str(port)}
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'router.py'), '--workers', str(WORKERS),
+                                '--base-port', str(worker_ports[0])], env=env, cwd=ROOT)
+    deadline = time.monotonic() + 30
+    for target in (port, *worker_ports):
+        while True:
+            assert process.poll() is None and time.monotonic() < deadline
+            try:
+                socket.create_connection(('127.0.0.1', target), 0.2).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+    yield f'http://127.0.0.1:{port}'
+    process.terminate()
+    process.wait(10)
+
+
+async def connect(url, transports, cookies=True):
+    # Bez ciasteczek router nie zna shardu z pgame_shard - zostaje identyfikator sesji
+    jar = aiohttp.CookieJar(unsafe=True) if cookies else aiohttp.DummyCookieJar()
+    session = aiohttp.ClientSession(cookie_jar=jar)
+    client = socketio.AsyncClient(http_session=session)
+    inbox = asyncio.Queue()
+    for name in ('game_created', 'room_state', 'error'):
+        client.on(name, (lambda name: lambda data=None: inbox.put_nowait((name, data)))(name))
+    await client.connect(url, transports=transports)
+    return client, session, inbox
+
+
+async def close(client, session):
+    # Sesję HTTP podaną klientowi zamykamy sami
+    await client.disconnect()
+    await client.wait()
+    await session.close()
+
+
+async def receive(inbox, name):
+    while True:
+        received, data = await asyncio.wait_for(inbox.get(), 5)
+        if received in (name, 'error'):
+            return received, data
+
+
+async def create_and_join(url):
+    clients, codes = [], []
+    for i in range(WORKERS * 2):
+        host, session, inbox = await connect(url, ['polling'], cookies=False)
+        await host.emit('create_game', {'name': f'H{i}', 'avatar': '1'})
+        received, data = await receive(inbox, 'game_created')
+        assert received == 'game_created', data
+        clients.append((host, session))
+        codes.append(data['game_code'])
+    joined = []
+    for code in codes:
+        guest, session, inbox = await connect(f'{url}?game={code}', ['polling', 'websocket'])
+        await guest.emit('join_game', {'game_code': code, 'name': 'Gość', 'avatar': '2'})
+        joined.append(await receive(inbox, 'room_state'))
+        clients.append((guest, session))
+    await asyncio.gather(*(close(client, session) for client, session in clients))
+    return codes, joined
+
+
+def test_room_is_reachable_through_router_from_fresh_client(router):
+    codes, joined = asyncio.run(create_and_join(router))
+    # Gry powstają na wszystkich workerach, a nowy klient trafia do właściciela każdej z nich
+    assert {shard_of(code, WORKERS) for code in codes} == set(range(WORKERS))
+    assert [(received, data['game_code']) for received, data in joined] == [('room_state', code) for code in codes]
@@ -0,0 +1,21 @@
+import gc
+
+from game_logic import GameEngine, GameRules, current_rules, rules_for_version, set_current_rules
+
+
+def test_reloaded_rules_are_kept_only_while_a_game_uses_them():
+    original = current_rules()
+    try:
+        set_current_rules(GameRules(version='stara'))
+        engine = GameEngine()
+        set_current_rules(GameRules(version='pominięta'))
+        set_current_rules(GameRules(version='nowa'))
+        gc.collect()
+        # Trwająca gra zachowuje swoją wersję, nieużywana znika z rejestru
+        assert rules_for_version('stara') is engine.rules
+        assert rules_for_version('pominięta').version == 'nowa'
+        del engine
+        gc.collect()
+        assert rules_for_version('stara').version == 'nowa'
+    finally:
+        set_current_rules(original)
@@ -0,0 +1,62 @@
+import pytest
+
+import app as server
+
+
+@pytest.fixture
+def game(monkeypatch):
+    # Bez terminu tury - stan gry zmieniają tylko akcje testu
+    monkeypatch.setattr(server, 'TURN_TIMEOUT', 0)
+    host, guest = server.socketio.test_client(server.app), server.socketio.test_client(server.app)
+    host.emit('create_game', {'name': 'Ala', 'avatar': '1'})
+    code = next(m for m in host.get_received() if m['name'] == 'game_created')['args'][0]['game_code']
+    guest.emit('join_game', {'game_code': code, 'name': 'Bob', 'avatar': '2'})
+    host.emit('start_game')
+    room = server.store.get_room(code)
+    clients = {room.host_id: host, next(sid for sid in room.players if sid != room.host_id): guest}
+    for client in clients.values():
+        client.get_received()
+    yield room, host, clients
+    server.lifecycle.evict(room, 'finished')
+
+
+def errors(client):
+    return [m['args'][0]['message'] for m in client.get_received() if m['name'] == 'error']
+
+
+def roll_and_move(room, client):
+    client.emit('player_action', {'type': 'roll_dice'})
+    engine = room.game_engine
+    position = engine.players[room.current_player].position
+    client.emit('player_action', {'type': 'move',
+                                  'new_position': min(engine.reachable[position][engine.pending_roll])})
+
+
+def test_start_game_is_rejected_during_game(game):
+    room, host, clients = game
+    current = room.current_player
+    roll_and_move(room, clients[current])
+    clients[current].emit('player_action', {'type': 'roll_dice'})
+    assert errors(clients[current]) == ['Już rzucałeś kością w tej turze!']
+
+    host.emit('start_game')
+    assert errors(host) == ['Gra już się rozpoczęła!']
+    # Ponowny start nie oddaje rzutu i nie przestawia kolejki tur
+    assert room.game_engine.pending_roll is None and room.game_engine.turn_rolled
+    assert room.current_player == current
+
+
+def test_start_game_keeps_pending_confrontation(game):
+    room, host, clients = game
+    current = room.current_player
+    roll_and_move(room, clients[current])
+    for player in room.game_engine.players.values():
+        player.position = room.game_engine.players[current].position
+    clients[current].emit('player_action', {'type': 'start_confrontation'})
+    duel = room.game_engine.confrontation
+    assert duel and duel['players'][0] == current
+
+    host.emit('start_game')
+    assert 'Gra już się rozpoczęła!' in errors(host)
+    # Konfrontacja trzymana przez serwer zostaje do rzutów albo do swojego terminu
+    assert room.game_engine.confrontation is duel
@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+import storage
+from game_room import GameRoom
+from storage import RedisStore, SQLiteStore, StaleRoomError
+
+
+def make_room(code='ABCDEF'):
+    room = GameRoom(code, 'Ala', seed=1)
+    room.add_player('sid-a', 'Ala', '1')
+    room.add_player('sid-b', 'Bob', '2')
+    return room
+
+
+@pytest.fixture(params=['sqlite', 'redis'])
+def store(request, tmp_path):
+    if request.param == 'sqlite':
+        return SQLiteStore(str(tmp_path / 'pgame.db'))
+    fakeredis = pytest.importorskip('fakeredis')
+    return RedisStore(client=fakeredis.FakeRedis())
+
+
+def test_round_trip(store):
+    room = make_room()
+    room.start_game()
+    assert not store.has_room(room.code)
+    store.save_room(room)
+    assert store.has_room(room.code)
+    loaded = store.get_room(room.code)
+    assert loaded.to_dict()['engine'] == room.to_dict()['engine']
+    assert [r.code for r in store.iter_rooms()] == [room.code]
+    store.set_player('sid-a', room.code)
+    assert store.get_player('sid-a') == room.code
+    store.delete_room(room.code)
+    assert store.get_room(room.code) is None and not store.has_room(room.code)
+
+
+def test_concurrent_writers_do_not_overwrite_each_other(store):
+    store.save_room(make_room())
+    # Dwa workery odczytały tę samą wersję pokoju
+    first, second = store.get_room('ABCDEF'), store.get_room('ABCDEF')
+    first.start_game()
+    store.save_room(first)
+    second.remove_player('sid-b')
+    with pytest.raises(StaleRoomError):
+        store.save_room(second)
+    loaded = store.get_room('ABCDEF')
+    assert loaded.status == 'in_progress' and len(loaded.players) == 2
+    # Kolejne zapisy tego samego obiektu i ponowny odczyt działają dalej
+    loaded.next_turn()
+    store.save_room(loaded)
+    loaded.next_turn()
+    store.save_room(loaded)
+    assert store.get_room('ABCDEF').store_version == loaded.store_version
+
+
+def test_new_room_does_not_replace_existing_code(store):
+    store.save_room(make_room())
+    with pytest.raises(StaleRoomError):
+        store.save_room(make_room())
+
+
+@pytest.mark.parametrize('persist_log', [False, True])
+def test_event_log_is_appended_not_rewritten(store, monkeypatch, persist_log):
+    monkeypatch.setattr(storage, 'PERSIST_LOG', persist_log)
+    room = make_room()
+    room.start_game()
+    store.save_room(room)
+    for _ in range(5):
+        room = store.get_room('ABCDEF')
+        room.next_turn()
+        store.save_room(room)
+    expected = make_room()
+    expected.start_game()
+    for _ in range(5):
+        expected.next_turn()
+
+    loaded = store.get_room('ABCDEF')
+    # Zapis pokoju nie niesie dziennika; cały dziennik składa się z dopisanych zdarzeń
+    assert 'events' not in json.loads(storage.dump_room(loaded))
+    assert loaded.event_log() == expected.events
+    assert loaded.to_dict()['engine'] == expected.to_dict()['engine']
+    # Klucze sesji zostają w zapisie pokoju, ale nie w dzienniku (archiwum)
+    assert loaded.player_for_session(room.session_keys['sid-a']) == 'sid-a'
+    assert not any(key in json.dumps(loaded.event_log()) for key in room.sessions)
@@ -0,0 +1,59 @@
+import time
+
+import app as server
+from game_room import GameRoom
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+
+
+def test_timed_out_turns_do_not_keep_room_alive(monkeypatch):
+    monkeypatch.setattr(server, 'TURN_TIMEOUT', 0.2)
+    monkeypatch.setattr(server, 'MAX_TURN_TIMEOUTS', 3)
+    host, guest = server.socketio.test_client(server.app), server.socketio.test_client(server.app)
+    host.emit('create_game', {'name': 'Ala', 'avatar': '1'})
+    code = next(m for m in host.get_received() if m['name'] == 'game_created')['args'][0]['game_code']
+    guest.emit('join_game', {'game_code': code, 'name': 'Bob', 'avatar': '2'})
+    host.emit('start_game')
+    room = server.store.get_room(code)
+    active = room.last_activity
+
+    # Tury kończone przez serwer nie są aktywnością pokoju
+    wait_for(lambda: room.timed_out_turns == 1)
+    assert room.last_activity == active
+    assert server.lifecycle.activity[code][0] == active
+
+    # Po MAX_TURN_TIMEOUTS turach bez graczy gra jest zamykana jako porzucona
+    wait_for(lambda: server.store.get_room(code) is None)
+    closed = [m['args'][0] for m in guest.get_received() if m['name'] == 'room_closed']
+    assert closed == [{'game_code': code, 'reason': 'abandoned'}]
+    assert server.lifecycle.recent[-1]['code'] == code
+    assert server.lifecycle.recent[-1]['reason'] == 'abandoned'
+
+
+def test_restart_rearms_confrontation_and_reconnect_deadlines():
+    # Pokój zapisany przez poprzedni proces: trwa konfrontacja, jeden gracz czeka na powrót
+    room = GameRoom('QWERTY', 'Ala', seed=3, turn_timeout=0)
+    for sid, name in (('sid-a', 'Ala'), ('sid-b', 'Bob'), ('sid-c', 'Cyd')):
+        room.add_player(sid, name, '1')
+    room.start_game()
+    initiator = room.current_player
+    steps, positions = room.roll_dice(initiator)
+    room.move_player(initiator, positions[0])
+    for player in room.game_engine.players.values():
+        player.position = positions[0]
+    now = time.time()
+    assert room.start_confrontation(initiator, now + 0.2)
+    away = next(sid for sid in room.players if sid != initiator)
+    room.mark_disconnected(away, now + 0.3)
+    server.store.save_room(room)
+
+    server.rearm_timers(room)
+    wait_for(lambda: server.store.get_room('QWERTY').game_engine.confrontation is None)
+    assert server.store.get_room('QWERTY').current_player != initiator
+    wait_for(lambda: away not in server.store.get_room('QWERTY').game_engine.players)
+    server.lifecycle.evict(server.store.get_room('QWERTY'), 'finished')
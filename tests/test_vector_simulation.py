@@ -0,0 +1,11 @@
+import pytest
+
+pytest.importorskip('numpy')
+
+from vector_simulation import VECTOR_POLICIES, cross_check
+
+
+def test_vector_backend_matches_scalar_engine():
+    # Ten sam rozkład wygranych, statystyk i odwiedzin pól co GameEngine (w granicach błędu statystycznego)
+    problems = cross_check(sorted(VECTOR_POLICIES)[:3], games=3000, seed=7)
+    assert problems == []
@@ -0,0 +1,129 @@
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger('pgame.timers')
+
+# Hierarchiczne koło czasowe (jak w jądrze Linuksa): jeden wątek na cały proces obsługuje terminy
+# wszystkich pokoi. Poziom 0 ma SLOTS przegródek po jednym tyknięciu, każdy kolejny - przegródki
+# SLOTS razy dłuższe; terminy z wyższych poziomów zsuwają się niżej, gdy zbliża się ich czas.
+# Dodanie i anulowanie terminu to O(1) niezależnie od ich liczby; dokładność - jedno tyknięcie.
+
+
+class Timer:
+    __slots__ = ('wheel', 'tick', 'func', 'args', 'slot', 'cancelled')
+
+    def __init__(self, wheel, tick, func, args):
+        self.wheel = wheel
+        self.tick = tick
+        self.func = func
+        self.args = args
+        self.slot = None
+        self.cancelled = False
+
+    def cancel(self):
+        self.wheel.cancel(self)
+
+
+class TimerWheel:
+    def __init__(self, tick=0.1, slots=64, levels=4, socketio=None):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        # Przegródki to słowniki timer -> None: kolejność dodania i usuwanie w O(1)
+        self.wheels = [[{} for _ in range(slots)] for _ in range(levels)]
+        self.socketio = socketio
+        self.lock = threading.Lock()
+        self.origin = time.monotonic()
+        self.current = 0
+        self.pending = 0
+        self.fired = 0
+        self.started = False
+
+    def schedule(self, delay, func, *args):
+        # Wywołuje func(*args) w wątku koła nie wcześniej niż po delay sekundach; zwraca Timer do anulowania
+        with self.lock:
+            tick = max(math.ceil((time.monotonic() - self.origin + delay) / self.tick), self.current + 1)
+            timer = Timer(self, tick, func, args)
+            self.place(timer)
+            self.pending += 1
+        self.start()
+        return timer
+
+    def cancel(self, timer):
+        # Także timer już zebrany do wywołania, ale jeszcze nie wywołany
+        with self.lock:
+            timer.cancelled = True
+            if timer.slot is not None:
+                timer.slot.pop(timer, None)
+                timer.slot = None
+                self.pending -= 1
+
+    def elapsed_ticks(self):
+        return int((time.monotonic() - self.origin) / self.tick)
+
+    def place(self, timer):
+        delta = max(timer.tick - self.current, 0)
+        level, span = 0, 1
+        while level < self.levels - 1 and delta >= span * self.slots:
+            level += 1
+            span *= self.slots
+        slot = self.wheels[level][(max(timer.tick, self.current) // span) % self.slots]
+        slot[timer] = None
+        timer.slot = slot
+
+    def advance(self, until):
+        # Przesuwa koło do tyknięcia until; zwraca wygasłe timery w kolejności terminów
+        expired = []
+        with self.lock:
+            while self.current < until:
+                self.current += 1
+                # Najpierw zsuwamy wyższe poziomy, których przegródka właśnie się zaczyna
+                for level in range(self.levels - 1, 0, -1):
+                    span = self.slots ** level
+                    if self.current % span == 0:
+                        slot = self.wheels[level][(self.current // span) % self.slots]
+                        timers = list(slot)
+                        slot.clear()
+                        for timer in timers:
+                            self.place(timer)
+                slot = self.wheels[0][self.current % self.slots]
+                for timer in list(slot):
+                    if timer.tick <= self.current:
+                        del slot[timer]
+                        timer.slot = None
+                        self.pending -= 1
+                        expired.append(timer)
+        return expired
+
+    def start(self):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        if self.socketio is None or self.socketio.async_mode == 'threading':
+            threading.Thread(target=self.run, name='timer-wheel', daemon=True).start()
+        else:
+            self.socketio.start_background_task(self.run)
+
+    def run(self):
+        sleep = self.socketio.sleep if self.socketio is not None else time.sleep
+        while True:
+            for timer in self.advance(self.elapsed_ticks()):
+                if timer.cancelled:
+                    continue
+                self.fired += 1
+                try:
+                    timer.func(*timer.args)
+                except Exception:
+                    logger.exception("Błąd obsługi terminu %s", getattr(timer.func, '__name__', timer.func))
+            sleep(self.tick - (time.monotonic() - self.origin) % self.tick)
+
+    def stats(self):
+        return {'pending': self.pending, 'fired': self.fired, 'tick': self.tick}
+
+    def prometheus(self):
+        lines = ['# TYPE pgame_timers_pending gauge', f'pgame_timers_pending {self.pending}',
+                 '# TYPE pgame_timers_fired_total counter', f'pgame_timers_fired_total {self.fired}']
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,333 @@
+import argparse
+import math
+import os
+import time
+from collections import Counter
+from multiprocessing import Pool
+
+import numpy as np
+
+from game_logic import GameEngine, Player, STATS, STAT_LIMITS
+from simulation import (
+    DEFAULT_TURNS, HISTOGRAM_BUCKETS, POLICIES, PolicyTables, SimulationStats, run_simulation, seat_labels
+)
+
+DEFAULT_BATCH = 100000
+
+# Wartości początkowe nowego gracza, w kolejności STATS
+START_STATS = tuple(getattr(Player(None, '', None), stat) for stat in STATS)
+
+
+class EffectTable:
+    # Warianty efektów jako płaskie tablice zmian osobno dla każdej statystyki.
+    # Wiersz `none` (ostatni) nie zmienia niczego - trafiają do niego brak akcji i zakupy.
+
+    def __init__(self, variant_lists):
+        self.width = max((len(variants) for variants in variant_lists), default=1) or 1
+        rows = len(variant_lists) + 1
+        self.none = rows - 1
+        deltas = np.zeros((len(STATS), rows, self.width), dtype=np.int32)
+        self.counts = np.ones(rows, dtype=np.int32)
+        for i, variants in enumerate(variant_lists):
+            for j, effect in enumerate(variants):
+                deltas[:, i, j] = effect.deltas
+            self.counts[i] = max(1, len(variants))
+        self.deltas = [deltas[s].ravel() for s in range(len(STATS))]
+        self.changed_stats = [s for s in range(len(STATS)) if deltas[s].any()]
+        self.single_variant = bool((self.counts == 1).all())
+
+    def indices(self, rows, rng):
+        if self.single_variant:
+            return rows * self.width
+        variant = (rng.random(rows.shape[0]) * self.counts[rows]).astype(np.int32)
+        return rows * self.width + variant
+
+
+class BoardKernel:
+    # Plansza, efekty i katalog przedmiotów jako tablice NumPy
+
+    def __init__(self, engine):
+        self.tables = PolicyTables(engine)
+        self.board_size = size = len(engine.board)
+
+        # Cele ruchu: indeks płaski pozycja * 12 + rzut, gdzie rzut 0..11 koduje oczka (rzut // 2 + 1)
+        # oraz kierunek (rzut % 2: 0 naprzód, 1 wstecz). Jedno losowanie daje i oczka, i rzut monetą.
+        self.forward = np.array([(p + r // 2 + 1) % size for p in range(size) for r in range(12)], dtype=np.int32)
+        self.backward = np.array([(p - r // 2 - 1) % size for p in range(size) for r in range(12)], dtype=np.int32)
+        self.coin_moves = np.where(np.arange(size * 12) % 2 == 0, self.forward, self.backward)
+
+        self.action_types = sorted({action for actions in self.tables.field_actions for action in actions})
+        self.action_ids = {action_type: i for i, action_type in enumerate(self.action_types)}
+        self.actions = EffectTable([engine.effects.get(action_type, ()) for action_type in self.action_types])
+        self.buy_action = self.action_ids.get('buy_item', -1)
+        self.landing = EffectTable([engine.field_effects.get(field.type, ()) for field in engine.board])
+
+        self.field_actions_width = width = max(len(actions) for actions in self.tables.field_actions)
+        field_actions = np.full((size, width), self.actions.none, dtype=np.int32)
+        self.field_action_counts = np.zeros(size, dtype=np.int32)
+        for position, actions in enumerate(self.tables.field_actions):
+            field_actions[position, :len(actions)] = [self.action_ids[a] for a in actions]
+            self.field_action_counts[position] = len(actions)
+        self.field_actions = field_actions.ravel()
+
+        self.item_prices = np.array(self.tables.item_prices, dtype=np.int32)
+        self.item_deltas = np.array(self.tables.item_changes, dtype=np.int32).reshape(-1, len(STATS)).T.copy()
+        self.limits = [STAT_LIMITS[stat] for stat in STATS]
+
+
+class VectorRandomPolicy:
+    name = 'random'
+
+    def __init__(self, kernel):
+        self.kernel = kernel
+
+    def choose_move(self, moves, rng):
+        return self.kernel.coin_moves.take(moves)
+
+    def choose_action(self, positions, rng):
+        counts = self.kernel.field_action_counts.take(positions)
+        index = (rng.random(positions.shape[0]) * counts).astype(np.int32)
+        return self.kernel.field_actions.take(positions * self.kernel.field_actions_width + index)
+
+    def choose_item(self, budget, owned, rng):
+        items = len(self.kernel.item_prices)
+        return (rng.random(budget.shape[0]) * items).astype(np.int32)
+
+
+class VectorGreedyPolicy:
+    def __init__(self, kernel):
+        self.kernel = kernel
+        scalar = POLICIES[self.name](kernel.tables)
+        scores = np.array(scalar.field_scores, dtype=np.float64)
+        # Decyzja o ruchu zależy tylko od (pozycja, oczka), więc liczymy ją z góry
+        self.moves = np.where(scores[kernel.backward] > scores[kernel.forward], kernel.backward, kernel.forward)
+        self.best_actions = np.array(
+            [kernel.action_ids[a] if a is not None else kernel.actions.none for a in scalar.best_actions],
+            dtype=np.int32
+        )
+        self.items_by_score = scalar.items_by_score
+
+    def choose_move(self, moves, rng):
+        return self.moves.take(moves)
+
+    def choose_action(self, positions, rng):
+        return self.best_actions.take(positions)
+
+    def choose_item(self, budget, owned, rng):
+        # Pierwszy przedmiot z rankingu, na który gracza stać i którego jeszcze nie ma; -1 gdy brak
+        chosen = np.full(budget.shape[0], -1, dtype=np.int32)
+        for i in self.items_by_score:
+            available = (chosen < 0) & (budget >= self.kernel.item_prices[i]) & ((owned & (1 << i)) == 0)
+            chosen[available] = i
+        return chosen
+
+
+class VectorGreedyPopularityPolicy(VectorGreedyPolicy):
+    name = 'greedy_popularity'
+
+
+class VectorGreedyBudgetPolicy(VectorGreedyPolicy):
+    name = 'greedy_budget'
+
+
+VECTOR_POLICIES = {
+    policy.name: policy
+    for policy in (VectorRandomPolicy, VectorGreedyPopularityPolicy, VectorGreedyBudgetPolicy)
+}
+
+
+def clamp(kernel, values, stat):
+    low, high = kernel.limits[stat]
+    if low is not None:
+        np.maximum(values, low, out=values)
+    if high is not None:
+        np.minimum(values, high, out=values)
+
+
+def apply_table(kernel, stats, table, indices):
+    # Odpowiednik apply_effect_deltas dla całej paczki gier naraz
+    for stat in table.changed_stats:
+        values = stats[stat]
+        values += table.deltas[stat].take(indices)
+        clamp(kernel, values, stat)
+
+
+def play_batch(kernel, policies, games, turns, rng):
+    players = len(policies)
+    positions = np.zeros((players, games), dtype=np.int32)
+    stats = np.empty((players, len(STATS), games), dtype=np.int32)
+    stats[:] = np.array(START_STATS, dtype=np.int32)[None, :, None]
+    owned = np.zeros((players, games), dtype=np.int32)
+    visits = np.zeros(kernel.board_size, dtype=np.int64)
+    size = kernel.board_size
+
+    for _ in range(turns):
+        for p, policy in enumerate(policies):
+            player_stats = stats[p]
+            throw = rng.integers(0, 12, size=games, dtype=np.int32)
+            position = policy.choose_move(positions[p] * 12 + throw, rng)
+            positions[p] = position
+            visits += np.bincount(position, minlength=size)
+
+            # Efekt wejścia na pole
+            apply_table(kernel, player_stats, kernel.landing, kernel.landing.indices(position, rng))
+
+            # Akcja pola; zakup liczymy osobno tylko dla gier, w których gracz stoi w kantynie
+            action = policy.choose_action(position, rng)
+            buying = np.flatnonzero(action == kernel.buy_action)
+            apply_table(kernel, player_stats, kernel.actions, kernel.actions.indices(action, rng))
+
+            if buying.size:
+                budget = player_stats[2].take(buying)
+                player_owned = owned[p].take(buying)
+                item = policy.choose_item(budget, player_owned, rng)
+                safe_item = np.maximum(item, 0)
+                price = kernel.item_prices.take(safe_item)
+                bit = np.left_shift(1, safe_item).astype(np.int32)
+                success = (item >= 0) & (budget >= price) & ((player_owned & bit) == 0)
+                bought = buying[success]
+                if bought.size:
+                    bought_item = safe_item[success]
+                    player_stats[2, bought] -= price[success]
+                    owned[p, bought] |= bit[success]
+                    for stat in range(len(STATS)):
+                        deltas = kernel.item_deltas[stat]
+                        if deltas.any():
+                            values = player_stats[stat, bought] + deltas.take(bought_item)
+                            clamp(kernel, values, stat)
+                            player_stats[stat, bought] = values
+
+    # Zwycięzca: najwyższa (popularność, wpływy, budżet), przy remisie pierwszy gracz
+    winner = np.zeros(games, dtype=np.int32)
+    for p in range(1, players):
+        best = stats[winner, :, np.arange(games)].T
+        current = stats[p]
+        better = (current[0] > best[0]) | ((current[0] == best[0]) & (
+            (current[1] > best[1]) | ((current[1] == best[1]) & (current[2] > best[2]))))
+        winner[better] = p
+    return stats, winner, visits
+
+
+def batch_stats(policy_names, kernel, stats, winner, visits, turns):
+    result = SimulationStats(seat_labels(policy_names), kernel.board_size)
+    games = winner.shape[0]
+    result.games = games
+    result.moves = games * turns * len(policy_names)
+    result.field_visits = [int(v) for v in visits]
+    for p, seat in enumerate(result.seats):
+        result.wins[seat] = int(np.count_nonzero(winner == p))
+        for i, stat in enumerate(STATS):
+            values = stats[p, i].astype(np.int64)
+            buckets = values // HISTOGRAM_BUCKETS[stat]
+            offset = int(buckets.min())
+            counts = np.bincount(buckets - offset)
+            present = np.flatnonzero(counts)
+            result.histograms[seat][stat] = Counter(dict(zip((present + offset).tolist(), counts[present].tolist())))
+            result.sums[seat][stat] = [int(values.sum()), float(np.square(values, dtype=np.float64).sum())]
+    return result
+
+
+def run_batch(task):
+    policy_names, seed, games, turns = task
+    kernel = BoardKernel(GameEngine())
+    policies = [VECTOR_POLICIES[name](kernel) for name in policy_names]
+    rng = np.random.default_rng(seed)
+    stats, winner, visits = play_batch(kernel, policies, games, turns, rng)
+    return batch_stats(policy_names, kernel, stats, winner, visits, turns)
+
+
+def run_vector_simulation(policy_names, games, turns=DEFAULT_TURNS, seed=0, workers=None, batch_size=DEFAULT_BATCH):
+    # Jak simulation.run_simulation, ale każda paczka gier liczona jest naraz na tablicach
+    for name in policy_names:
+        if name not in VECTOR_POLICIES:
+            raise ValueError(f"Nieznana strategia: {name}")
+
+    tasks = [
+        (tuple(policy_names), (seed, start), min(batch_size, games - start), turns)
+        for start in range(0, games, batch_size)
+    ]
+    total = SimulationStats(seat_labels(policy_names), len(GameEngine().board))
+
+    if workers == 1:
+        for task in tasks:
+            total.merge(run_batch(task))
+            yield total.games, total
+        return
+
+    with Pool(processes=workers or os.cpu_count()) as pool:
+        for partial in pool.imap_unordered(run_batch, tasks):
+            total.merge(partial)
+            yield total.games, total
+
+
+def last(results):
+    stats = None
+    for _, stats in results:
+        pass
+    return stats
+
+
+def cross_check(policy_names, games=20000, turns=DEFAULT_TURNS, seed=0, sigmas=5.0):
+    # Porównuje wyniki obu silników; zwraca listę rozbieżności większych niż `sigmas` błędów standardowych
+    scalar = last(run_simulation(policy_names, games, turns, seed, workers=1))
+    vector = last(run_vector_simulation(policy_names, games, turns, seed, workers=1))
+    scalar_report, vector_report = scalar.report(), vector.report()
+    problems = []
+
+    for seat in scalar.seats:
+        a, b = scalar_report['win_rates'][seat], vector_report['win_rates'][seat]
+        error = math.sqrt(max(a * (1 - a), 1.0 / games) * 2 / games)
+        if abs(a - b) > sigmas * error:
+            problems.append(f"{seat} wygrane: {a:.4f} vs {b:.4f}")
+
+        for stat in STATS:
+            a, b = scalar_report['stats'][seat][stat], vector_report['stats'][seat][stat]
+            error = math.sqrt((a['std'] ** 2 + b['std'] ** 2) / games) or HISTOGRAM_BUCKETS[stat]
+            if abs(a['mean'] - b['mean']) > sigmas * error:
+                problems.append(f"{seat} {stat}: średnia {a['mean']:.2f} vs {b['mean']:.2f}")
+
+    moves = sum(scalar.field_visits)
+    for position, (a, b) in enumerate(zip(scalar_report['field_visits'], vector_report['field_visits'])):
+        error = math.sqrt(max(a * (1 - a), 1.0 / moves) * 2 / moves)
+        if abs(a - b) > sigmas * error:
+            problems.append(f"pole {position}: {a:.4f} vs {b:.4f}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Wektorowa symulacja wielu gier (NumPy)")
+    parser.add_argument('--games', type=int, default=1000000)
+    parser.add_argument('--policies', nargs='+', default=['random', 'greedy_popularity', 'greedy_budget'],
+                        choices=sorted(VECTOR_POLICIES))
+    parser.add_argument('--turns', type=int, default=DEFAULT_TURNS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=0, help="0 = wszystkie rdzenie")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH)
+    parser.add_argument('--check', action='store_true', help="porównaj z silnikiem skalarnym zamiast symulować")
+    args = parser.parse_args()
+
+    if args.check:
+        problems = cross_check(args.policies, min(args.games, 20000), args.turns, args.seed)
+        for problem in problems:
+            print("Rozbieżność:", problem)
+        print("OK" if not problems else f"{len(problems)} rozbieżności")
+        raise SystemExit(1 if problems else 0)
+
+    started = time.perf_counter()
+    stats = None
+    for done, stats in run_vector_simulation(args.policies, args.games, args.turns, args.seed,
+                                             args.workers or None, args.batch_size):
+        elapsed = time.perf_counter() - started
+        print(f"\r{done}/{args.games} gier, {done / elapsed:,.0f} gier/s", end='', flush=True)
+    print()
+
+    report = stats.report()
+    for seat in stats.seats:
+        popularity = report['stats'][seat]['popularity']
+        print(f"{seat:24} wygrane {report['win_rates'][seat]:6.1%}  "
+              f"popularność śr. {popularity['mean']:6.1f} (p10 {popularity['p10']}, p90 {popularity['p90']})")
+    print("Odwiedziny pól:", ' '.join(f"{share:.3f}" for share in report['field_visits']))
+
+
+if __name__ == '__main__':
+    main()
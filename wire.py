@@ -0,0 +1,80 @@
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Zwarty format game_update (MessagePack) dla klientów, które poproszą o niego przez set_protocol;
+# pozostali dostają JSON jak dotąd. Zamiast nazw pól i sid graczy wysyłamy liczby:
+#   [wersja, {miejsce: {nr pola: wartość}}, [usunięte miejsca], miejsce gracza z turą, {nr dodatku: wartość}]
+# Miejsce to stały numer gracza w pokoju (GameRoom.seats), przedmioty - maska bitowa według
+# katalogu zasad (kolejność jak w full_state['item_names']).
+
+PROTOCOLS = ('json', 'msgpack')
+
+PLAYER_FIELDS = ('id', 'name', 'avatar', 'position', 'popularity', 'influence', 'budget', 'items', 'is_host', 'connected')
+EXTRA_FIELDS = ('effect', 'just_moved', 'can_perform_action')
+
+PLAYER_FIELD_IDS = {name: i for i, name in enumerate(PLAYER_FIELDS)}
+EXTRA_FIELD_IDS = {name: i for i, name in enumerate(EXTRA_FIELDS)}
+UPDATE_KEYS = ('version', 'players', 'removed', 'current_player')
+
+
+def protocol_available(protocol):
+    return protocol == 'json' or (protocol == 'msgpack' and msgpack is not None)
+
+
+def protocol_room(code, protocol):
+    # Podpokój Socket.IO z klientami danego formatu; wszyscy są też w pokoju o samym kodzie gry
+    return f'{code}#{protocol}'
+
+
+def encode_player(fields, item_bits):
+    encoded = {}
+    for key, value in fields.items():
+        if key == 'items':
+            value = sum(item_bits.get(name, 0) for name in value)
+        encoded[PLAYER_FIELD_IDS.get(key, key)] = value
+    return encoded
+
+
+def compact_update(room, update):
+    seats = room.seats
+    item_bits = room.game_engine.rules.item_bits
+    return [
+        update['version'],
+        {seats[player_id]: encode_player(fields, item_bits) for player_id, fields in update['players'].items()},
+        [seats[player_id] for player_id in update['removed'] if player_id in seats],
+        seats.get(update['current_player']),
+        {EXTRA_FIELD_IDS.get(key, key): value for key, value in update.items() if key not in UPDATE_KEYS},
+    ]
+
+
+def encode_game_update(room, update):
+    return msgpack.packb(compact_update(room, update), use_bin_type=True)
+
+
+def decode_game_update(data, seat_ids, item_names):
+    # Odwrotność encode_game_update (dla klientów w Pythonie); seat_ids: miejsce -> sid, uzupełniane w locie
+    version, changed, removed, current_seat, extras = msgpack.unpackb(data, strict_map_key=False)
+    # Usunięci najpierw: po przepięciu gracza to samo miejsce dostaje nowe sid
+    removed = [seat_ids[seat] for seat in removed]
+    players = {}
+    for seat, fields in changed.items():
+        decoded = {}
+        for key, value in fields.items():
+            name = PLAYER_FIELDS[key] if isinstance(key, int) else key
+            if name == 'items':
+                value = [item for i, item in enumerate(item_names) if value & (1 << i)]
+            decoded[name] = value
+        if 'id' in decoded:
+            seat_ids[seat] = decoded['id']
+        players[seat_ids[seat]] = decoded
+    update = {
+        'version': version,
+        'players': players,
+        'removed': removed,
+        'current_player': seat_ids.get(current_seat),
+    }
+    for key, value in extras.items():
+        update[EXTRA_FIELDS[key] if isinstance(key, int) else key] = value
+    return update
@@ -0,0 +1,95 @@
+import argparse
+import random
+import time
+
+from socketio import packet
+
+from game_room import GameRoom
+from wire import decode_game_update, encode_game_update, protocol_available
+
+# Porównanie formatów game_update: bajty na wiadomość (razem z ramką Socket.IO) i czas kodowania
+# jednej rozgłaszanej aktualizacji. Aktualizacje pochodzą z symulowanych tur, jak w handlerach app.py.
+
+
+def record_updates(players, turns, seed):
+    rng = random.Random(seed)
+    room = GameRoom('BENCH1', 'Gracz0')
+    for i in range(players):
+        room.add_player(f'sid{i:02d}{rng.getrandbits(64):016x}', f'Gracz{i}', str(i + 1))
+    room.status = 'in_progress'
+    room.game_engine.initialize_game()
+    engine = room.game_engine
+    updates = [room.game_update()]
+    for _ in range(turns * players):
+        player = engine.players[room.current_player]
+        player.position = (player.position + rng.choice((1, -1)) * rng.randint(1, 6)) % len(engine.board)
+        effect = engine.handle_field_effect(player)
+        updates.append(room.game_update(
+            effect=f"Ruszyłeś się na pole {player.position + 1}. {effect}",
+            just_moved=True,
+            can_perform_action=True
+        ))
+        actions = engine.board[player.position].actions
+        action = rng.choice(actions).effect_type
+        if action == 'buy_item':
+            response = engine.buy_item(player.id, rng.choice(engine.rules.item_names))
+        else:
+            response = engine.handle_field_action(player, action)
+        updates.append(room.game_update(effect=response, just_moved=False, can_perform_action=False))
+        room.next_turn()
+    return room, updates
+
+
+def frame_size(data):
+    # Ramka tak, jak wysyła ją serwer: tekst Socket.IO plus ewentualne załączniki binarne
+    encoded = packet.Packet(packet.EVENT, data=['game_update', data]).encode()
+    parts = encoded if isinstance(encoded, list) else [encoded]
+    return sum(len(part) if isinstance(part, bytes) else len(part.encode('utf-8')) for part in parts)
+
+
+def timed(encode, updates, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for update in updates:
+            encode(update)
+    return (time.perf_counter() - started) / (repeat * len(updates))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Porównanie formatów JSON i MessagePack dla game_update")
+    parser.add_argument('--players', type=int, default=4)
+    parser.add_argument('--turns', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if not protocol_available('msgpack'):
+        parser.error("brak pakietu msgpack (pip install msgpack)")
+
+    room, updates = record_updates(args.players, args.turns, args.seed)
+
+    # Zwarty format musi dać po zdekodowaniu dokładnie to samo
+    seat_ids = {seat: player_id for player_id, seat in room.seats.items()}
+    for update in updates:
+        assert decode_game_update(encode_game_update(room, update), seat_ids, room.game_engine.rules.item_names) == update
+
+    formats = {
+        'json': lambda update: packet.Packet(packet.EVENT, data=['game_update', update]).encode(),
+        'msgpack': lambda update: packet.Packet(packet.EVENT, data=['game_update', encode_game_update(room, update)]).encode(),
+    }
+    sizes = {
+        'json': sum(frame_size(update) for update in updates),
+        'msgpack': sum(frame_size(encode_game_update(room, update)) for update in updates),
+    }
+    print(f"{len(updates)} aktualizacji, {args.players} graczy")
+    print(f"{'format':10} {'B/wiadomość':>12} {'µs/kodowanie':>14}")
+    results = {name: (sizes[name] / len(updates), timed(encode, updates, args.repeat) * 1e6) for name, encode in formats.items()}
+    for name, (size, micros) in results.items():
+        print(f"{name:10} {size:>12.1f} {micros:>14.2f}")
+    json_size, json_time = results['json']
+    mp_size, mp_time = results['msgpack']
+    print(f"msgpack względem json: {mp_size / json_size - 1:+.1%} bajtów, {mp_time / json_time - 1:+.1%} czasu kodowania")
+
+
+if __name__ == '__main__':
+    main()